@@ -0,0 +1,336 @@
+"""
+ingress-nginx load test, renders the controller ConfigMap of every performance profile and serves it with a local nginx
+
+The `ingress_nginx` factory runs against the Pulumi runtime mocks, the ConfigMap settings with a plain
+nginx equivalent are translated into an nginx.conf proxying to a Python echo backend, and a threaded
+load generator reports requests per second, p50/p99 latency and the CPU time used by nginx. The backend
+is also measured on its own, as a baseline. Settings only the controller understands ( Lua global rate
+limiting, proxy protocol, TLS ) are listed as ignored.
+
+    python benchmarks/ingress_nginx_load.py --duration 10 --connections 32
+    python benchmarks/ingress_nginx_load.py high-throughput --set rate_limit_mode='"local"' --set local_rate_limit_rps=1000
+"""
+
+import argparse
+import http.client
+import http.server
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import mocks
+from python_pulumi_helm import releases
+from python_pulumi_helm.helpers import ingress_nginx as ingress_nginx_values
+
+# ingress-nginx defaults of the translated settings
+# https://kubernetes.github.io/ingress-nginx/user-guide/nginx-configuration/configmap/
+DEFAULTS = {
+    "worker-processes": "auto",
+    "max-worker-connections": "16384",
+    "max-worker-open-files": "0",
+    "reuse-port": "true",
+    "keep-alive": "75",
+    "keep-alive-requests": "1000",
+    "upstream-keepalive-connections": "320",
+    "upstream-keepalive-requests": "10000",
+    "upstream-keepalive-timeout": "60",
+    "proxy-buffering": "off",
+    "proxy-buffer-size": "4k",
+    "proxy-buffers-number": "4",
+    "limit-req-status-code": "503",
+}
+
+# Settings translated into the nginx.conf
+TRANSLATED = set(DEFAULTS) | {
+    "disable-access-log",
+    "access-log-params",
+    "skip-access-log-urls",
+    "log-format-upstream",
+    "log-format-escape-json",
+    "use-gzip",
+    "gzip-level",
+    "gzip-min-length",
+    "gzip-types",
+    "http-snippet",
+    "location-snippet",
+}
+
+# Variables set by the controller template, referenced by the log format and snippets
+TEMPLATE_VARIABLES = {
+    "proxy_upstream_name": "default-backend-80",
+    "proxy_alternative_upstream_name": "",
+    "req_id": "$request_id",
+}
+
+def _str(value)->str:
+    # Numbers come back from the mocked engine as floats
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def render_config(profile: str, arguments: dict = {})->dict:
+    """
+    Controller ConfigMap settings rendered by `ingress_nginx` with `profile`
+    """
+    recorded = mocks.set_mocks()
+    mocks.run(lambda: releases.ingress_nginx(provider=None, name="load-test", performance_profile=profile, **arguments))
+    return { k: _str(v) for k, v in recorded.resources["load-test"]["values"]["controller"]["config"].items() }
+
+def nginx_conf(config: dict, prefix: str, port: int, backend: tuple)->str:
+    """
+    nginx.conf equivalent of the translated ConfigMap `config`, listening on `port` and proxying to `backend`
+    """
+    settings = { **DEFAULTS, **config }
+    true = lambda key: settings.get(key, "false").lower() == "true"
+
+    lines = [
+        f"worker_processes {settings['worker-processes']};",
+        f"pid {prefix}/nginx.pid;",
+        f"error_log {prefix}/error.log warn;",
+    ]
+    if settings["max-worker-open-files"] != "0":
+        lines.append(f"worker_rlimit_nofile {settings['max-worker-open-files']};")
+    lines += [
+        f"events {{ worker_connections {settings['max-worker-connections']}; multi_accept on; }}",
+        "http {",
+        f"  client_body_temp_path {prefix}/client_body;",
+        f"  proxy_temp_path {prefix}/proxy;",
+        f"  fastcgi_temp_path {prefix}/fastcgi;",
+        f"  uwsgi_temp_path {prefix}/uwsgi;",
+        f"  scgi_temp_path {prefix}/scgi;",
+        f"  keepalive_timeout {settings['keep-alive']}s;",
+        f"  keepalive_requests {settings['keep-alive-requests']};",
+        f"  limit_req_status {settings['limit-req-status-code']};",
+        f"  map $request_uri $loggable {{ {' '.join(f'{u} 0;' for u in settings.get('skip-access-log-urls', '').split(',') if u)} default 1; }}",
+    ]
+
+    if true("disable-access-log"):
+        lines.append("  access_log off;")
+    else:
+        escape = "escape=json " if true("log-format-escape-json") else ""
+        log_format = settings.get("log-format-upstream", "$remote_addr $request $status").replace("'", "\\'")
+        lines += [
+            f"  log_format upstreaminfo {escape}'{log_format}';",
+            f"  access_log {prefix}/access.log upstreaminfo {settings.get('access-log-params', '')} if=$loggable;",
+        ]
+
+    if true("use-gzip"):
+        lines += [
+            "  gzip on;",
+            f"  gzip_comp_level {settings.get('gzip-level', '1')};",
+            f"  gzip_min_length {settings.get('gzip-min-length', '256')};",
+            f"  gzip_types {settings.get('gzip-types', 'application/json')};",
+        ]
+
+    lines += [
+        f"  proxy_buffering {settings['proxy-buffering']};",
+        f"  proxy_buffer_size {settings['proxy-buffer-size']};",
+        f"  proxy_buffers {settings['proxy-buffers-number']} {settings['proxy-buffer-size']};",
+        "  upstream backend {",
+        f"    server {backend[0]}:{backend[1]};",
+        f"    keepalive {settings['upstream-keepalive-connections']};",
+        f"    keepalive_requests {settings['upstream-keepalive-requests']};",
+        f"    keepalive_timeout {settings['upstream-keepalive-timeout']}s;",
+        "  }",
+    ]
+
+    # Paths of the controller image used by snippets
+    local_paths = lambda snippet: snippet.replace(ingress_nginx_values.PROXY_CACHE_PATH, f"{prefix}/cache").replace(ingress_nginx_values.ACCESS_LOG_PATH, f"{prefix}/access.log")
+
+    if settings.get("http-snippet"):
+        lines.append(local_paths(settings["http-snippet"]))
+
+    lines += [
+        "  server {",
+        f"    listen 127.0.0.1:{port}{' reuseport' if true('reuse-port') else ''};",
+    ] + [ f"    set ${k} \"{v}\";" for k, v in TEMPLATE_VARIABLES.items() ] + [
+        "    location / {",
+        "      proxy_http_version 1.1;",
+        "      proxy_set_header Connection \"\";",
+        "      proxy_pass http://backend;",
+        local_paths(settings.get("location-snippet", "")),
+        # Ingresses opt in to the local rate limit declared by the ConfigMap
+        ingress_nginx_values.local_rate_limit_annotations()["nginx.ingress.kubernetes.io/configuration-snippet"]
+            if f"zone={ingress_nginx_values.LOCAL_RATE_LIMIT_ZONE}:" in settings.get("http-snippet", "") else "",
+        "    }",
+        "  }",
+        "}",
+    ]
+
+    return "\n".join(lines) + "\n"
+
+class EchoHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    body = json.dumps({ "status": "ok", "padding": "x" * 512 }).encode()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+class EchoBackend(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+def _cpu_seconds(pid: int)->float:
+    """
+    User and system CPU time of `pid` and its children ( the nginx workers ), from /proc
+    """
+    ticks = os.sysconf("SC_CLK_TCK")
+    total = 0
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # Fields after the command name start at the state ( 3rd ), ppid is the 4th, utime and stime the 14th and 15th
+        if int(entry) == pid or int(fields[1]) == pid:
+            total += int(fields[11]) + int(fields[12])
+    return total / ticks
+
+def _wait_for_port(port: int, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"Nothing listening on port {port} after {timeout}s")
+
+def load(port: int, connections: int, duration: float, path: str = "/")->dict:
+    """
+    Send requests over `connections` persistent connections for `duration` seconds
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        samples = []
+        codes = {}
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                connection.request("GET", path, headers={ "Accept-Encoding": "gzip" })
+                response = connection.getresponse()
+                response.read()
+                code = response.status
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection("127.0.0.1", port)
+                code = "error"
+            samples.append(time.perf_counter() - start)
+            codes[code] = codes.get(code, 0) + 1
+        connection.close()
+        with lock:
+            latencies.extend(samples)
+            for code, count in codes.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(connections)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "requests_per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+        "statuses": { str(k): v for k, v in sorted(statuses.items(), key=str) },
+    }
+
+def run_nginx(nginx: str, config: dict, backend: tuple, connections: int, duration: float)->dict:
+    with tempfile.TemporaryDirectory(prefix="ingress-nginx-load-") as prefix:
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+
+        with open(f"{prefix}/nginx.conf", "w") as f:
+            f.write(nginx_conf(config, prefix, port, backend))
+
+        process = subprocess.Popen([nginx, "-p", prefix, "-c", f"{prefix}/nginx.conf", "-g", "daemon off;"], stderr=subprocess.PIPE)
+        try:
+            _wait_for_port(port)
+            cpu = _cpu_seconds(process.pid)
+            result = load(port, connections, duration)
+            cpu = _cpu_seconds(process.pid) - cpu
+        except TimeoutError:
+            process.kill()
+            raise RuntimeError(f"nginx failed to start: {process.communicate()[1].decode().strip()}")
+        finally:
+            process.terminate()
+            process.wait()
+
+    result["nginx_cpu_seconds"] = cpu
+    result["nginx_cpu_ms_per_1k_requests"] = cpu * 1000 / result["requests"] * 1000 if result["requests"] > 0 else None
+    return result
+
+if __name__ == "__main__":
+    profiles = list(ingress_nginx_values.PERFORMANCE_PROFILES)
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("profiles", nargs="*", default=profiles, help=", ".join(profiles))
+    parser.add_argument("--set", action="append", default=[], metavar="ARGUMENT=JSON", help="Extra ingress_nginx argument, e.g. gzip_level=5")
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5, help="Seconds of load per profile")
+    parser.add_argument("--nginx", default=shutil.which("nginx"), help="nginx binary, looked up in PATH by default")
+    parser.add_argument("--output", default="-", help="JSON output file, stdout by default")
+    args = parser.parse_args()
+
+    arguments = {}
+    for item in args.set:
+        key, _, value = item.partition("=")
+        arguments[key] = json.loads(value)
+
+    backend = EchoBackend(("127.0.0.1", 0), EchoHandler)
+    threading.Thread(target=backend.serve_forever, daemon=True).start()
+
+    results = [{ "target": "backend", **load(backend.server_address[1], args.connections, args.duration) }]
+    try:
+        if args.nginx is None:
+            print("nginx not found, only the backend baseline was measured ( see --nginx )", file=sys.stderr)
+        for profile in args.profiles if args.nginx is not None else []:
+            config = render_config(profile, arguments)
+            results.append({
+                "target": "nginx",
+                "profile": profile,
+                "ignored_settings": sorted(set(config) - TRANSLATED),
+                **run_nginx(args.nginx, config, backend.server_address, args.connections, args.duration),
+            })
+    finally:
+        backend.shutdown()
+
+    payload = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
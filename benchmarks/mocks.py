@@ -0,0 +1,36 @@
+"""
+Pulumi runtime mocks shared by the benchmarks, they record the inputs of every registered resource
+"""
+
+import pulumi
+
+class RecordingMocks(pulumi.runtime.Mocks):
+
+    def __init__(self):
+        self.resources = {}
+
+    def new_resource(self, args: pulumi.runtime.MockResourceArgs):
+        self.resources[args.name] = args.inputs
+        return [f"{args.name}-id", args.inputs]
+
+    def call(self, args: pulumi.runtime.MockCallArgs):
+        return {}
+
+def set_mocks() -> RecordingMocks:
+    mocks = RecordingMocks()
+    pulumi.runtime.set_mocks(mocks, project="python-pulumi-helm", stack="benchmark", preview=False)
+    return mocks
+
+def run(fn):
+    """
+    Run `fn` inside the mocked Pulumi runtime and wait until every registered resource has resolved
+    """
+    result = {}
+
+    @pulumi.runtime.test
+    def program():
+        result["value"] = fn()
+        return pulumi.Output.from_input(None)
+
+    program()
+    return result["value"]
@@ -0,0 +1,151 @@
+"""
+Global rate-limit lookup latency benchmark, against an in-process memcached stand-in
+
+Every lookup follows the sliding window of the ingress-nginx global rate limiter: a `get` of the
+previous window counter and an `incr` ( `add` when missing ) of the current one. Lookups run
+with pooled connections, as configured by `global-rate-limit-memcached-pool-size`, and with a new
+connection per lookup.
+
+    python benchmarks/rate_limit.py --clients 32 --lookups 2000 --rtt-ms 0.5
+"""
+
+import argparse
+import json
+import socket
+import socketserver
+import statistics
+import threading
+import time
+
+class MemcachedStandIn(socketserver.ThreadingTCPServer):
+    """
+    Minimal memcached text protocol server ( get, set, add, incr )
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, address, rtt: float = 0):
+        super().__init__(address, MemcachedHandler)
+        self.rtt = rtt
+        self.lock = threading.Lock()
+        self.data = {}
+
+class MemcachedHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def handle(self):
+        server = self.server
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            parts = line.decode().split()
+            if not parts:
+                continue
+            command = parts[0]
+            if server.rtt > 0:
+                time.sleep(server.rtt)
+
+            if command == "get":
+                with server.lock:
+                    value = server.data.get(parts[1])
+                response = f"VALUE {parts[1]} 0 {len(value)}\r\n{value}\r\nEND\r\n" if value is not None else "END\r\n"
+            elif command in ("set", "add"):
+                value = self.rfile.read(int(parts[4]) + 2)[:-2].decode()
+                with server.lock:
+                    stored = command == "set" or parts[1] not in server.data
+                    if stored:
+                        server.data[parts[1]] = value
+                response = "STORED\r\n" if stored else "NOT_STORED\r\n"
+            elif command == "incr":
+                with server.lock:
+                    if parts[1] in server.data:
+                        server.data[parts[1]] = str(int(server.data[parts[1]]) + int(parts[2]))
+                        response = f"{server.data[parts[1]]}\r\n"
+                    else:
+                        response = "NOT_FOUND\r\n"
+            else:
+                response = "ERROR\r\n"
+
+            self.wfile.write(response.encode())
+
+class Client:
+
+    def __init__(self, address):
+        self.sock = socket.create_connection(address)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile("rb")
+
+    def command(self, payload: str)->str:
+        self.sock.sendall(payload.encode())
+        line = self.file.readline().decode()
+        if line.startswith("VALUE"):
+            value = self.file.readline().decode().strip()
+            self.file.readline()
+            return value
+        return line.strip()
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def lookup(client: Client, key: str, window: int):
+    client.command(f"get {key}:{window - 1}\r\n")
+    if client.command(f"incr {key}:{window} 1\r\n") == "NOT_FOUND":
+        client.command(f"add {key}:{window} 0 2 1\r\n1\r\n")
+
+def run(address, clients: int, lookups: int, pooled: bool)->dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(index):
+        client = Client(address) if pooled else None
+        samples = []
+        for i in range(lookups):
+            start = time.perf_counter()
+            if not pooled:
+                client = Client(address)
+            lookup(client, f"client-{index % 8}", int(time.time()))
+            if not pooled:
+                client.close()
+            samples.append(time.perf_counter() - start)
+        if pooled:
+            client.close()
+        with lock:
+            latencies.extend(samples)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "mode": "pooled" if pooled else "connect-per-lookup",
+        "clients": clients,
+        "lookups": len(latencies),
+        "lookups_per_second": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent nginx workers")
+    parser.add_argument("--lookups", type=int, default=1000, help="Lookups per client")
+    parser.add_argument("--rtt-ms", type=float, default=0, help="Simulated network round trip per memcached command")
+    args = parser.parse_args()
+
+    server = MemcachedStandIn(("127.0.0.1", 0), rtt=args.rtt_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        results = [run(server.server_address, args.clients, args.lookups, pooled) for pooled in (True, False)]
+    finally:
+        server.shutdown()
+
+    print(json.dumps(results, indent=2))
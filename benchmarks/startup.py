@@ -0,0 +1,73 @@
+"""
+Program startup benchmark, measures import time and RSS of python_pulumi_helm modules
+
+Every sample runs in a fresh interpreter so module caches don't hide the import cost.
+
+    python benchmarks/startup.py --runs 10 python_pulumi_helm python_pulumi_helm.releases
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, sys, time
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+start = time.perf_counter()
+import importlib
+module = importlib.import_module(sys.argv[1])
+for attr in sys.argv[2:]:
+    getattr(module, attr)
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+heavy = sorted(m for m in ("pulumi", "pulumi_kubernetes", "yaml") if m in sys.modules)
+print(json.dumps({"seconds": elapsed, "rss_kb": after, "rss_delta_kb": after - before, "loaded": heavy}))
+"""
+
+def sample(module: str, attrs: list) -> dict:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH", "")])))
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, module] + attrs,
+        check=True,
+        capture_output=True,
+        text=True,
+        env=env,
+    ).stdout
+    return json.loads(output)
+
+def measure(target: str, runs: int) -> dict:
+    module, _, attrs = target.partition(":")
+    samples = [sample(module, [a for a in attrs.split(",") if a]) for _ in range(runs)]
+    seconds = [s["seconds"] for s in samples]
+
+    return {
+        "target": target,
+        "runs": runs,
+        "seconds_median": statistics.median(seconds),
+        "seconds_min": min(seconds),
+        "rss_kb_median": statistics.median(s["rss_kb"] for s in samples),
+        "rss_delta_kb_median": statistics.median(s["rss_delta_kb"] for s in samples),
+        "loaded": samples[-1]["loaded"],
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("targets", nargs="*", default=["python_pulumi_helm", "python_pulumi_helm:loki", "python_pulumi_helm.helpers.resources"],
+        help="module[:attr,attr] to import, attributes are accessed after the import")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", default="-", help="JSON output file, stdout by default")
+    args = parser.parse_args()
+
+    results = [measure(target, args.runs) for target in args.targets]
+    payload = json.dumps(results, indent=2)
+
+    if args.output == "-":
+        print(payload)
+    else:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
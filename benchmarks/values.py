@@ -0,0 +1,131 @@
+"""
+Values-building benchmark, calls every release factory against the Pulumi runtime mocks
+
+For each factory it records the wall time per call, the memory allocated while building the
+release ( tracemalloc ) and the size of the serialized values sent to the engine.
+
+    python benchmarks/values.py --calls 50 --output values.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import mocks
+from python_pulumi_helm import releases
+
+AWS = {
+    "aws_region": "eu-west-1",
+    "eks_sa_role_arn": "arn:aws:iam::000000000000:role/benchmark",
+    "eks_cluster_name": "benchmark",
+}
+
+INGRESS = {
+    "ingress_domain": "example.com",
+    "ingress_class_name": "nginx-default",
+    "storage_class_name": "ebs",
+}
+
+CASES = {
+    "cilium": (releases.cilium, {"eks_cluster_name": "benchmark"}),
+    "metrics_server": (releases.metrics_server, {}),
+    "cluster_autoscaler": (releases.cluster_autoscaler, AWS),
+    "aws_load_balancer_controller": (releases.aws_load_balancer_controller, {**AWS, "aws_vpc_id": "vpc-00000000"}),
+    "external_dns": (releases.external_dns, {"eks_sa_role_arn": AWS["eks_sa_role_arn"]}),
+    "aws_ebs_csi_driver": (releases.aws_ebs_csi_driver, {"eks_sa_role_arn": AWS["eks_sa_role_arn"]}),
+    "karpenter": (releases.karpenter, {
+        "eks_sa_role_arn": AWS["eks_sa_role_arn"],
+        "eks_cluster_name": AWS["eks_cluster_name"],
+        "eks_cluster_endpoint": "https://benchmark.eks.amazonaws.com",
+        "default_instance_profile_name": "benchmark",
+    }),
+    "ingress_nginx": (releases.ingress_nginx, {
+        "ssl_enabled": True,
+        "acm_cert_arns": ["arn:aws:acm:eu-west-1:000000000000:certificate/benchmark"],
+        "global_rate_limit_enabled": True,
+        "karpenter_node_enabled": True,
+    }),
+    "argocd": (releases.argocd, {
+        "ingress_hostname": "argocd.example.com",
+        "ingress_protocol": "https",
+        "ingress_class_name": INGRESS["ingress_class_name"],
+        "karpenter_node_enabled": True,
+    }),
+    "prometheus_stack": (releases.prometheus_stack, {
+        "aws_region": AWS["aws_region"],
+        "ingress_domain": INGRESS["ingress_domain"],
+        "ingress_class_name": INGRESS["ingress_class_name"],
+        "thanos_enabled": True,
+        "karpenter_node_enabled": True,
+        "obj_storage_bucket": "benchmark",
+    }),
+    "thanos_stack": (releases.thanos_stack, {
+        "aws_region": AWS["aws_region"],
+        **INGRESS,
+        "compactor_enabled": True,
+        "karpenter_node_enabled": True,
+        "obj_storage_bucket": "benchmark",
+    }),
+    "opensearch": (releases.opensearch, INGRESS),
+    "loki": (releases.loki, {"aws_region": AWS["aws_region"], **INGRESS, "obj_storage_bucket": "benchmark"}),
+}
+
+def measure(name: str, calls: int) -> dict:
+    factory, kwargs = CASES[name]
+
+    seconds = []
+    for _ in range(calls):
+        mocks.set_mocks()
+        def timed():
+            start = time.perf_counter()
+            factory(provider=None, **kwargs)
+            seconds.append(time.perf_counter() - start)
+        mocks.run(timed)
+
+    recorder = mocks.set_mocks()
+    def traced():
+        tracemalloc.start()
+        factory(provider=None, **kwargs)
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return current, peak
+    alloc_current, alloc_peak = mocks.run(traced)
+
+    values_bytes = sum(
+        len(json.dumps(inputs.get("values", {}), sort_keys=True, default=str))
+        for inputs in recorder.resources.values()
+    )
+
+    return {
+        "factory": name,
+        "calls": calls,
+        "releases": len(recorder.resources),
+        "seconds_mean": statistics.mean(seconds),
+        "seconds_median": statistics.median(seconds),
+        "seconds_max": max(seconds),
+        "alloc_retained_bytes": alloc_current,
+        "alloc_peak_bytes": alloc_peak,
+        "values_bytes": values_bytes,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("factories", nargs="*", default=list(CASES), help=", ".join(CASES))
+    parser.add_argument("--calls", type=int, default=20)
+    parser.add_argument("--output", default="-", help="JSON output file, stdout by default")
+    args = parser.parse_args()
+
+    results = [measure(name, args.calls) for name in args.factories]
+    payload = json.dumps(results, indent=2)
+
+    if args.output == "-":
+        print(payload)
+    else:
+        with open(args.output, "w") as f:
+            f.write(payload + "\n")
@@ -0,0 +1,52 @@
+"""
+YAML emission micro-benchmark, pure-Python Dumper vs libyaml CDumper vs the cached serializer
+
+    python benchmarks/yaml_dump.py --number 2000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yaml
+from python_pulumi_helm.helpers import karpenter, serialization
+from python_pulumi_helm.helpers.values import thaw
+
+FRAGMENTS = {
+    "objstore_config": {
+        "type": "S3",
+        "config": {
+            "bucket": "benchmark",
+            "endpoint": "s3.eu-west-1.amazonaws.com",
+            "aws_sdk_auth": True
+        }
+    },
+    "loki_affinity": thaw(karpenter.affinity({ "component": "read" }, { "app": "loki" })),
+}
+
+def measure(name: str, number: int) -> dict:
+    data = FRAGMENTS[name]
+    cdumper = getattr(yaml, "CDumper", None)
+    serialization.dump_yaml.cache_clear()
+
+    results = {
+        "fragment": name,
+        "number": number,
+        "dumper_us": timeit.timeit(lambda: yaml.dump(data, Dumper=yaml.Dumper, default_flow_style=False), number=number) / number * 1e6,
+        "cdumper_us": timeit.timeit(lambda: yaml.dump(data, Dumper=cdumper, default_flow_style=False), number=number) / number * 1e6 if cdumper else None,
+        "cached_us": timeit.timeit(lambda: serialization.dump_yaml(data), number=number) / number * 1e6,
+    }
+    results["same_output"] = serialization.dump_yaml(data) == yaml.dump(data, default_flow_style=False)
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(json.dumps([measure(name, args.number) for name in FRAGMENTS], indent=2))
@@ -1,2 +1,41 @@
 __version__ = '0.7.7'
 VERSION = __version__
+
+import importlib
+
+# Factories and helpers are resolved on first access ( PEP 562 ), so `import python_pulumi_helm`
+# doesn't load the Pulumi SDK until a release is actually created
+_LAZY_ATTRIBUTES = {
+    "prefetch": ".helpers.prefetch",
+    "Platform": ".platform",
+    "cilium": ".releases",
+    "metrics_server": ".releases",
+    "cluster_autoscaler": ".releases",
+    "aws_load_balancer_controller": ".releases",
+    "external_dns": ".releases",
+    "aws_ebs_csi_driver": ".releases",
+    "karpenter": ".releases",
+    "ingress_nginx": ".releases",
+    "ingress_nginx_sharded": ".releases",
+    "argocd": ".releases",
+    "prometheus_stack": ".releases",
+    "thanos_stack": ".releases",
+    "opensearch": ".releases",
+    "loki": ".releases",
+}
+
+_LAZY_MODULES = ("releases", "helpers", "platform")
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name], __name__), name)
+    elif name in _LAZY_MODULES:
+        value = importlib.import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    globals()[name] = value
+    return value
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES) + list(_LAZY_MODULES))
@@ -0,0 +1,167 @@
+"""
+Await policies for Helm releases
+
+Helm can only wait for every resource of a release, so a blanket `skip_await=False` blocks every
+dependent release until the slowest workload is ready. Policies other than `all` install the
+release without waiting, and readiness of selected workloads is checked by patch resources
+( `DeploymentPatch`, `StatefulSetPatch`, `DaemonSetPatch` ), which the Kubernetes provider awaits
+like any other workload update.
+
+Neither helm nor the Kubernetes provider retry an expired wait, so every policy has a single timeout,
+the timeout of the release factory unless the policy sets one.
+"""
+
+from __future__ import annotations
+
+MODES = ("all", "none", "workloads", "deferred")
+
+PATCH_KINDS = {
+    "Deployment": "DeploymentPatch",
+    "StatefulSet": "StatefulSetPatch",
+    "DaemonSet": "DaemonSetPatch",
+}
+
+class DeferredChecks:
+    """
+    Readiness checks of `deferred` policies, collected while the releases are declared and created
+    together by `create`, once every release exists
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def add(self, provider, release, name: str, namespace: str, workloads: list[str], timeout: int):
+        self.pending.append((provider, release, name, namespace, workloads, timeout))
+
+    def create(self, depends_on: list = [])->list:
+        """
+        Create the pending checks, each depending on its release and on `depends_on`
+        """
+        checks = []
+        while self.pending:
+            provider, release, name, namespace, workloads, timeout = self.pending.pop(0)
+            checks.extend(readiness_checks(provider, release, name, namespace, workloads, timeout, depends_on))
+        return checks
+
+class AwaitPolicy:
+    """
+    How a release waits for its resources
+
+    - `all`: helm waits for every resource ( default behaviour )
+    - `none`: nothing is awaited
+    - `workloads`: only the listed workloads ( "Kind/name" ) are awaited, without blocking dependents of the release
+    - `deferred`: like `workloads`, but the checks are added to `deferred_checks` and created when its
+      `create` is called
+    """
+
+    def __init__(
+        self,
+        mode: str = "all",
+        timeout: int = None,
+        workloads: list[str] = None,
+        deferred_checks: DeferredChecks = None):
+
+        workloads = list(workloads or [])
+
+        if mode not in MODES:
+            raise ValueError(f"Unknown await mode {mode}, expected one of {', '.join(MODES)}")
+        if mode in ("workloads", "deferred") and len(workloads) == 0:
+            raise ValueError(f"Await mode {mode} requires at least one workload")
+        if mode == "deferred" and deferred_checks is None:
+            raise ValueError("Await mode deferred requires the DeferredChecks the checks are added to")
+        for workload in workloads:
+            kind, _, name = workload.partition("/")
+            if kind not in PATCH_KINDS or name == "":
+                raise ValueError(f"Invalid workload {workload}, expected <{'|'.join(PATCH_KINDS)}>/<name>")
+
+        self.mode = mode
+        self.timeout = timeout
+        self.workloads = workloads
+        self.deferred_checks = deferred_checks
+
+    def __repr__(self):
+        return f"AwaitPolicy(mode={self.mode!r}, timeout={self.timeout!r}, workloads={self.workloads!r})"
+
+    @classmethod
+    def all(cls, timeout: int = None)->AwaitPolicy:
+        return cls("all", timeout)
+
+    @classmethod
+    def none(cls)->AwaitPolicy:
+        return cls("none")
+
+    @classmethod
+    def only(cls, workloads: list[str], timeout: int = None)->AwaitPolicy:
+        return cls("workloads", timeout, workloads)
+
+    @classmethod
+    def deferred(cls, workloads: list[str], deferred_checks: DeferredChecks, timeout: int = None)->AwaitPolicy:
+        return cls("deferred", timeout, workloads, deferred_checks)
+
+    def without_workloads(self)->AwaitPolicy:
+        """
+        Policy of side releases that don't install the listed workloads, not awaited when the workloads are
+        """
+        if self.mode in ("workloads", "deferred"):
+            return AwaitPolicy("none", self.timeout)
+        return AwaitPolicy(self.mode, self.timeout)
+
+    def skip_await(self)->bool:
+        return self.mode != "all"
+
+def readiness_checks(
+    provider,
+    release,
+    name: str,
+    namespace: str,
+    workloads: list[str],
+    timeout: int,
+    depends_on: list = [])->list:
+    """
+    Patch resources awaiting the rollout of `workloads` installed by `release`
+    """
+    import pulumi
+    from pulumi_kubernetes.apps import v1 as apps
+    from pulumi_kubernetes.meta.v1 import ObjectMetaPatchArgs
+
+    checks = []
+    for workload in workloads:
+        kind, _, workload_name = workload.partition("/")
+        patch = getattr(apps, PATCH_KINDS[kind])
+
+        checks.append(patch(
+            resource_name=f"{name}-ready-{kind.lower()}-{workload_name}",
+            metadata=ObjectMetaPatchArgs(
+                name=workload_name,
+                namespace=namespace,
+                annotations={
+                    "pulumi.com/readiness-check": name,
+                },
+            ),
+            opts=pulumi.ResourceOptions(
+                provider=provider,
+                parent=release,
+                depends_on=[release] + [ d for d in depends_on if d is not release ],
+                custom_timeouts=pulumi.CustomTimeouts(create=f"{timeout}s", update=f"{timeout}s"),
+            ),
+        ))
+
+    return checks
+
+def apply(policy: AwaitPolicy, provider, release, name: str, namespace: str, timeout: int)->list:
+    """
+    Create the readiness checks of a release, or add them to the policy's `DeferredChecks`
+
+    `timeout` is the timeout of the release, used when the policy doesn't set one. Returns the checks
+    created now, none for deferred policies.
+    """
+    namespace = "default" if namespace is None else namespace
+    timeout = timeout if policy.timeout is None else policy.timeout
+
+    if policy.mode == "workloads":
+        return readiness_checks(provider, release, name, namespace, policy.workloads, timeout)
+
+    if policy.mode == "deferred":
+        policy.deferred_checks.add(provider, release, name, namespace, policy.workloads, timeout)
+
+    return []
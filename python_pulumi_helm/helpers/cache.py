@@ -0,0 +1,149 @@
+"""
+Content-addressed on-disk cache for Helm chart archives
+
+Archives are stored once per digest under `blobs/`, and a small reference file under
+`refs/` maps every (repo, chart, version) tuple to the digest of its archive.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from urllib.parse import urljoin
+
+CACHE_DIR_ENV = "PULUMI_HELM_CHART_CACHE"
+
+# Seconds before a request to a stalled repository is abandoned
+FETCH_TIMEOUT = 60
+
+_index_lock = threading.Lock()
+_index_cache = {}
+
+class ChartCacheError(Exception):
+    pass
+
+def default_cache_dir() -> str:
+    return os.environ.get(CACHE_DIR_ENV, "")
+
+def repo_url(repo: str) -> str:
+    # Plain directories are accepted as repositories, mostly for tests and air-gapped mirrors
+    if os.path.isdir(repo):
+        return Path(repo).resolve().as_uri() + "/"
+    return repo if repo.endswith("/") else f"{repo}/"
+
+def chart_key(repo: str, chart: str, version: str) -> str:
+    return hashlib.sha256(f"{repo_url(repo)}\n{chart}\n{version}".encode()).hexdigest()
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _ref_path(cache_dir: str, key: str) -> Path:
+    return Path(cache_dir, "refs", key)
+
+def _blob_path(cache_dir: str, digest: str) -> Path:
+    return Path(cache_dir, "blobs", f"{digest}.tgz")
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _repo_index(repo: str, timeout: float = FETCH_TIMEOUT) -> dict:
+    import yaml
+    from urllib.request import urlopen
+
+    url = repo_url(repo)
+    with _index_lock:
+        if url in _index_cache:
+            return _index_cache[url]
+
+    with urlopen(urljoin(url, "index.yaml"), timeout=timeout) as response:
+        try:
+            index = yaml.load(response.read(), Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+        except yaml.YAMLError as e:
+            raise ChartCacheError(f"Invalid index in repository {repo}: {e}")
+    if not isinstance(index, dict):
+        raise ChartCacheError(f"Invalid index in repository {repo}")
+
+    with _index_lock:
+        _index_cache[url] = index
+    return index
+
+def _chart_entry(repo: str, chart: str, version: str, timeout: float = FETCH_TIMEOUT) -> dict:
+    entries = (_repo_index(repo, timeout).get("entries") or {}).get(chart, [])
+    for entry in entries:
+        if str(entry.get("version")) == version:
+            return entry
+    raise ChartCacheError(f"Chart {chart} version {version} not found in repository {repo}")
+
+def lookup(cache_dir: str, repo: str, chart: str, version: str) -> str:
+    """
+    Return the path of a cached archive, or an empty string on a miss or a digest mismatch
+    """
+    ref = _ref_path(cache_dir, chart_key(repo, chart, version))
+    if not ref.is_file():
+        return ""
+
+    digest = ref.read_text().strip()
+    blob = _blob_path(cache_dir, digest)
+    if not blob.is_file() or file_digest(blob) != digest:
+        return ""
+
+    return str(blob)
+
+def fetch(
+    cache_dir: str,
+    repo: str,
+    chart: str,
+    version: str,
+    timeout: float = FETCH_TIMEOUT,
+    mirror: str = None) -> str:
+    """
+    Return the local path of the chart archive, downloading it into the cache if needed
+
+    With a `mirror` ( URL or directory ), the archive is downloaded from the mirror but still cached
+    under `repo`, the repository releases look it up with. Every request gives up after `timeout` seconds.
+    """
+    source = repo if mirror is None else mirror
+    if source.startswith("oci://"):
+        raise ChartCacheError(f"OCI repository {source} is not supported by the chart cache")
+
+    cached = lookup(cache_dir, repo, chart, version)
+    if cached:
+        return cached
+
+    from urllib.request import urlopen
+
+    entry = _chart_entry(source, chart, version, timeout)
+    urls = entry.get("urls", [])
+    if len(urls) == 0:
+        raise ChartCacheError(f"Chart {chart} version {version} has no download URL in repository {source}")
+
+    with urlopen(urljoin(repo_url(source), urls[0]), timeout=timeout) as response:
+        data = response.read()
+
+    digest = hashlib.sha256(data).hexdigest()
+    expected = entry.get("digest", "")
+    if expected and expected != digest:
+        raise ChartCacheError(f"Digest mismatch for chart {chart} version {version}: expected {expected}, got {digest}")
+
+    # A corrupted blob is replaced, not reused
+    blob = _blob_path(cache_dir, digest)
+    if not blob.is_file() or file_digest(blob) != digest:
+        _write_atomic(blob, data)
+    _write_atomic(_ref_path(cache_dir, chart_key(repo, chart, version)), digest.encode())
+
+    return str(blob)
+
+def clear(cache_dir: str):
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    with _index_lock:
+        _index_cache.clear()
@@ -0,0 +1,131 @@
+"""
+Critical path analysis of the release dependency graph
+
+Nodes are the releases recorded by `helpers.resources.record_releases`, weighted by their historical
+install time when known and by their `timeout` otherwise. Releases installed with `skip_await` don't
+block their dependents, so they weigh nothing unless a duration is given.
+"""
+
+import inspect
+
+def release_graph(records: list)->dict:
+    """
+    Releases and their `depends_on` edges, as a dict of name -> {"chart", "timeout", "skip_await", "requires"}
+    """
+    names = { id(r["release"]): r["name"] for r in records }
+
+    return {
+        r["name"]: {
+            "chart": r["chart"],
+            "timeout": r["timeout"],
+            "skip_await": r.get("skip_await", False),
+            "requires": { names[id(d)] for d in r["depends_on"] if id(d) in names },
+        }
+        for r in records
+    }
+
+def _duration(graph: dict, durations: dict, name: str)->float:
+    if name in durations:
+        return durations[name]
+    return 0 if graph[name].get("skip_await") else graph[name]["timeout"]
+
+def _longest_paths(graph: dict, durations: dict, skip_edge: tuple = None)->dict:
+    finish = {}
+
+    def visit(name, path):
+        if name in finish:
+            return finish[name]
+        if name in path:
+            raise ValueError(f"Dependency cycle between releases: {' -> '.join(path + [name])}")
+        start, previous = 0, None
+        for dependency in sorted(graph[name]["requires"]):
+            if (dependency, name) == skip_edge:
+                continue
+            end = visit(dependency, path + [name])[0]
+            if end > start:
+                start, previous = end, dependency
+        finish[name] = (start + _duration(graph, durations, name), previous)
+        return finish[name]
+
+    for name in graph:
+        visit(name, [])
+
+    return finish
+
+def critical_path(graph: dict, durations: dict = {}, skip_edge: tuple = None)->tuple:
+    """
+    Longest chain of releases and its total duration in seconds
+    """
+    if len(graph) == 0:
+        return [], 0
+
+    finish = _longest_paths(graph, durations, skip_edge)
+    last = max(finish, key=lambda name: finish[name][0])
+    total = finish[last][0]
+
+    path = []
+    while last is not None:
+        path.append(last)
+        last = finish[last][1]
+
+    return list(reversed(path)), total
+
+def _chart_factories()->dict:
+    from .. import platform
+
+    factories = {}
+    for factory, fn in platform.FACTORIES.items():
+        param = inspect.signature(fn).parameters.get("chart")
+        if param is not None:
+            factories[param.default] = factory
+    return factories
+
+def _required(dependency_factory: str, factory: str)->bool:
+    from .. import platform
+
+    # Conditional requirements are treated as required, the enabling arguments aren't known here
+    pending = [factory]
+    seen = set()
+    while pending:
+        current = pending.pop()
+        for required, _ in platform.DEPENDENCIES.get(current, []):
+            if required == dependency_factory:
+                return True
+            if required not in seen:
+                seen.add(required)
+                pending.append(required)
+    return False
+
+def analyze(records: list, durations: dict = {})->dict:
+    """
+    Critical path of the created releases, and the effect of removing each of its edges
+
+    `durations` maps release names to their historical install time in seconds. Edges are reported
+    with `required` set to None when the factory of either release isn't known.
+    """
+    graph = release_graph(records)
+    path, total = critical_path(graph, durations)
+    factories = _chart_factories()
+
+    edges = []
+    for dependency, name in zip(path, path[1:]):
+        dependency_factory = factories.get(graph[dependency]["chart"])
+        factory = factories.get(graph[name]["chart"])
+        required = None if dependency_factory is None or factory is None else _required(dependency_factory, factory)
+        _, total_without = critical_path(graph, durations, skip_edge=(dependency, name))
+
+        edges.append({
+            "from": dependency,
+            "to": name,
+            "required": required,
+            "total_seconds_without": total_without,
+            "saving_seconds": total - total_without,
+        })
+
+    return {
+        "critical_path": path,
+        "total_seconds": total,
+        "durations": { name: _duration(graph, durations, name) for name in path },
+        "edges": edges,
+        "removable_edges": [ e for e in edges if e["required"] is False and e["saving_seconds"] > 0 ],
+    }
@@ -0,0 +1,588 @@
+"""
+Building blocks of the ingress-nginx controller values
+"""
+
+import bisect
+import hashlib
+import math
+from typing import Literal, Union
+from .values import freeze, memoize
+
+PerformanceProfileName = Literal["default", "high-throughput", "low-latency"]
+
+RateLimitMode = Literal["none", "global", "local", "hybrid"]
+
+RATE_LIMIT_MODES = ("none", "global", "local", "hybrid")
+
+TargetType = Literal["instance", "ip"]
+
+AccessLogFormat = Literal["text", "json"]
+
+# `log-format-upstream` of every access log format, the json one carries the same fields
+ACCESS_LOG_FORMATS = {
+    "text": '$remote_addr - $host [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent" $request_length $request_time [$proxy_upstream_name] [$proxy_alternative_upstream_name] $upstream_addr $upstream_response_length $upstream_response_time $upstream_status $req_id',
+    "json": '{"remote_addr": "$remote_addr", "host": "$host", "time": "$time_iso8601", "request": "$request", "status": $status, "body_bytes_sent": $body_bytes_sent, "http_referer": "$http_referer", "http_user_agent": "$http_user_agent", "request_length": $request_length, "request_time": $request_time, "proxy_upstream_name": "$proxy_upstream_name", "proxy_alternative_upstream_name": "$proxy_alternative_upstream_name", "upstream_addr": "$upstream_addr", "upstream_response_length": "$upstream_response_length", "upstream_response_time": "$upstream_response_time", "upstream_status": "$upstream_status", "req_id": "$req_id"}',
+}
+
+# Controller access log, symlinked to stdout in the controller image
+ACCESS_LOG_PATH = "/var/log/nginx/access.log"
+
+# MIME types compressed on top of text/html, which nginx always compresses
+COMPRESSION_TYPES = [
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+    "text/css",
+    "text/javascript",
+    "text/plain",
+    "text/xml",
+]
+
+# Proxy cache zone and the volume backing it
+PROXY_CACHE_ZONE = "ingress-cache"
+PROXY_CACHE_PATH = "/var/cache/ingress-nginx"
+
+# Controller health endpoint, fails as soon as the controller receives SIGTERM
+HEALTHCHECK_PORT = 10254
+
+# ConfigMap `worker-shutdown-timeout` default, time nginx workers get to finish in-flight requests
+WORKER_SHUTDOWN_TIMEOUT = 240
+
+# Controller ConfigMap settings and resources of every preset, `default` keeps the chart defaults
+# https://kubernetes.github.io/ingress-nginx/user-guide/nginx-configuration/configmap/
+PERFORMANCE_PROFILES = freeze({
+    "default": {
+        "config": {},
+        "resources": {},
+    },
+    # Many long-lived client connections, upstream connections reused as much as possible
+    "high-throughput": {
+        "config": {
+            "worker-processes": "auto",
+            "max-worker-connections": "65536",
+            "max-worker-open-files": "0",
+            "reuse-port": "true",
+            "use-http2": "true",
+            "keep-alive": "75",
+            "keep-alive-requests": "10000",
+            "upstream-keepalive-connections": "1000",
+            "upstream-keepalive-requests": "100000",
+            "upstream-keepalive-timeout": "60",
+        },
+        "resources": {
+            "requests": { "cpu": "2000m", "memory": "1024Mi" },
+            "limits": { "memory": "2048Mi" },
+        },
+    },
+    # Connection setup kept off the request path, small TLS records to cut time to first byte
+    "low-latency": {
+        "config": {
+            "worker-processes": "auto",
+            "max-worker-connections": "16384",
+            "reuse-port": "true",
+            "use-http2": "true",
+            "keep-alive": "75",
+            "keep-alive-requests": "1000",
+            "upstream-keepalive-connections": "320",
+            "upstream-keepalive-requests": "10000",
+            "upstream-keepalive-timeout": "60",
+            "ssl-buffer-size": "4k",
+        },
+        "resources": {
+            "requests": { "cpu": "1000m", "memory": "512Mi" },
+            "limits": { "memory": "1024Mi" },
+        },
+    },
+})
+
+def performance_profile(profile: Union[PerformanceProfileName, dict])->dict:
+    """
+    Preset by name, or a custom profile given as `{"config": {...}, "resources": {...}}`
+    """
+    if isinstance(profile, dict):
+        unknown = set(profile) - { "config", "resources" }
+        if unknown:
+            raise ValueError(f"Unknown performance profile keys {', '.join(sorted(unknown))}, expected config and resources")
+        return freeze({ "config": profile.get("config", {}), "resources": profile.get("resources", {}) })
+
+    if profile not in PERFORMANCE_PROFILES:
+        raise ValueError(f"Unknown performance profile {profile}, expected one of {', '.join(PERFORMANCE_PROFILES)}")
+
+    return PERFORMANCE_PROFILES[profile]
+
+def controller_scaling(
+    release_name: str,
+    ingress_class_controller: str,
+    kind: str = "DaemonSet",
+    replicas: int = 2,
+    min_available: int = 1,
+    autoscaling_enabled: bool = False,
+    autoscaling_min_replicas: int = 2,
+    autoscaling_max_replicas: int = 10,
+    autoscaling_target_cpu: int = 70,
+    autoscaling_target_rps: int = 0,
+    autoscaling_prometheus_url: str = "" )->dict:
+    """
+    Controller values for the workload kind, replicas, disruption budget and autoscaling
+
+    A requests-per-second target needs KEDA ( ScaledObject with CPU and Prometheus triggers ),
+    otherwise a CPU based HorizontalPodAutoscaler is used.
+    """
+    if kind not in ("DaemonSet", "Deployment"):
+        raise ValueError(f"Unsupported controller kind {kind}, expected DaemonSet or Deployment")
+
+    if kind == "DaemonSet":
+        if autoscaling_enabled:
+            raise ValueError("Controller autoscaling requires the Deployment controller kind")
+        return { "kind": kind }
+
+    if autoscaling_enabled and autoscaling_min_replicas > autoscaling_max_replicas:
+        raise ValueError(f"Autoscaling min replicas {autoscaling_min_replicas} above max replicas {autoscaling_max_replicas}")
+    if autoscaling_enabled and autoscaling_target_rps > 0 and autoscaling_prometheus_url == "":
+        raise ValueError("Autoscaling on requests per second requires autoscaling_prometheus_url")
+
+    pod_labels = {
+        "app.kubernetes.io/name": "ingress-nginx",
+        "app.kubernetes.io/instance": release_name,
+        "app.kubernetes.io/component": "controller",
+    }
+
+    use_keda = autoscaling_enabled and autoscaling_target_rps > 0
+
+    return {
+        "kind": kind,
+        "replicaCount": replicas,
+        # The chart creates the PodDisruptionBudget when more than one replica is requested
+        "minAvailable": min_available,
+        "autoscaling": {
+            "enabled": autoscaling_enabled and not use_keda,
+            "minReplicas": autoscaling_min_replicas,
+            "maxReplicas": autoscaling_max_replicas,
+            "targetCPUUtilizationPercentage": autoscaling_target_cpu,
+            "targetMemoryUtilizationPercentage": None,
+        },
+        "keda": {
+            "enabled": use_keda,
+            "apiVersion": "keda.sh/v1alpha1",
+            "minReplicas": autoscaling_min_replicas,
+            "maxReplicas": autoscaling_max_replicas,
+            "pollingInterval": 15,
+            "cooldownPeriod": 300,
+            "triggers": [
+                {
+                    "type": "cpu",
+                    "metricType": "Utilization",
+                    "metadata": {
+                        "value": str(autoscaling_target_cpu),
+                    },
+                },
+                {
+                    "type": "prometheus",
+                    "metadata": {
+                        "serverAddress": autoscaling_prometheus_url,
+                        "metricName": "nginx_ingress_controller_requests_per_second",
+                        "query": f'sum(rate(nginx_ingress_controller_requests{{controller_class="{ingress_class_controller}"}}[1m]))',
+                        "threshold": str(autoscaling_target_rps),
+                    },
+                },
+            ] if use_keda else [],
+        },
+        "topologySpreadConstraints": [
+            {
+                "maxSkew": 1,
+                "topologyKey": "topology.kubernetes.io/zone",
+                "whenUnsatisfiable": "ScheduleAnyway",
+                "labelSelector": {
+                    "matchLabels": pod_labels,
+                },
+            },
+            {
+                "maxSkew": 1,
+                "topologyKey": "kubernetes.io/hostname",
+                "whenUnsatisfiable": "ScheduleAnyway",
+                "labelSelector": {
+                    "matchLabels": pod_labels,
+                },
+            },
+        ],
+    }
+
+# Controller pods assumed when sizing memcached for a DaemonSet controller, whose size follows the node count
+DAEMONSET_PODS_ESTIMATE = 10
+
+# Memcached settings used when neither the expected request rate nor explicit values are given
+MEMCACHED_DEFAULTS = freeze({
+    "replicas": 3,
+    "threads": 4,
+    "max_connections": 1024,
+    "cache_size_mb": 64,
+    "resources": { "limits": {}, "requests": { "memory": "256Mi", "cpu": "250m" } },
+})
+
+def memcached_sizing(
+    expected_rps: int,
+    controller_pods: int,
+    controller_worker_processes: int = 4,
+    pool_size: int = 50,
+    min_replicas: int = 3,
+    ops_per_thread: int = 25000 )->dict:
+    """
+    Memcached replicas, threads, connection limit and memory for the global rate limiter
+
+    Every request costs one memcached operation. Each nginx worker keeps a pool of up to `pool_size`
+    connections, and `sessionAffinity: ClientIP` pins a controller pod to a single memcached
+    replica, so connections are sized for twice the even share of controller pods per replica.
+    """
+    replicas = max(min_replicas, math.ceil(expected_rps / (ops_per_thread * 8)))
+    threads = min(16, max(4, math.ceil(expected_rps / replicas / ops_per_thread)))
+    max_connections = max(1024, 2 * math.ceil(controller_pods / replicas) * controller_worker_processes * pool_size)
+    # Counters are small and expire with the rate limit window, the connection buffers dominate memory use
+    cache_size_mb = 64
+    memory_mb = cache_size_mb + 32 + math.ceil(max_connections * 16 / 1024)
+
+    return {
+        "replicas": replicas,
+        "threads": threads,
+        "max_connections": max_connections,
+        "cache_size_mb": cache_size_mb,
+        "resources": {
+            "requests": { "cpu": f"{threads * 250}m", "memory": f"{memory_mb}Mi" },
+            "limits": { "memory": f"{memory_mb}Mi" },
+        },
+    }
+
+def controller_pods(kind: str, replicas: int, autoscaling_enabled: bool, autoscaling_max_replicas: int)->int:
+    """
+    Expected ( upper bound of ) controller pods
+    """
+    if kind == "DaemonSet":
+        return DAEMONSET_PODS_ESTIMATE
+    return autoscaling_max_replicas if autoscaling_enabled else replicas
+
+def append_snippet(config: dict, key: str, snippet: str):
+    """
+    Append an nginx snippet to a ConfigMap snippet setting ( `http-snippet`, `location-snippet`, ... )
+    """
+    config[key] = f"{config[key]}\n{snippet}" if config.get(key) else snippet
+
+def merge_config(config: dict, settings: dict):
+    """
+    Add ConfigMap `settings` to `config`, snippets are appended to the existing ones instead of replacing them
+    """
+    for setting, value in settings.items():
+        if setting.endswith("-snippet"):
+            append_snippet(config, setting, value)
+        else:
+            config[setting] = value
+
+LOCAL_RATE_LIMIT_ZONE = "local-rate-limit"
+
+def local_rate_limit_config(
+    rps: int,
+    key: str = "$binary_remote_addr",
+    zone_size: str = "10m",
+    status_code: int = 429,
+    expected_pods: int = 0 )->dict:
+    """
+    ConfigMap settings declaring the nginx `limit_req` shared-memory zone of every controller pod
+
+    Each pod allows `rps` requests per second per `key` ( the client address by default ), without a
+    memcached round trip per request. With `expected_pods`, `rps` is a budget shared by that many pods
+    instead, and each pod enforces its share, which only holds when the load balancer spreads clients
+    evenly. Ingresses opt in with `local_rate_limit_annotations`.
+    """
+    if rps <= 0:
+        raise ValueError("Local rate limiting requires a positive rate")
+    if expected_pods < 0:
+        raise ValueError("Expected controller pods can't be negative")
+
+    pod_rps = max(1, math.ceil(rps / expected_pods)) if expected_pods > 0 else rps
+
+    return {
+        "http-snippet": f"limit_req_zone {key} zone={LOCAL_RATE_LIMIT_ZONE}:{zone_size} rate={pod_rps}r/s;",
+        "limit-req-status-code": status_code,
+    }
+
+@memoize()
+def local_rate_limit_annotations(burst: int = 0)->dict:
+    """
+    Ingress annotations applying the local rate limit of the controller ( see `local_rate_limit_config` )
+    to an ingress, requests above the rate and `burst` are rejected right away
+    """
+    return {
+        "nginx.ingress.kubernetes.io/configuration-snippet": f"limit_req zone={LOCAL_RATE_LIMIT_ZONE} burst={burst} nodelay;",
+    }
+
+@memoize()
+def load_balancer_target(
+    target_type: TargetType = "instance",
+    healthcheck_interval: int = 5,
+    healthcheck_unhealthy_threshold: int = 2,
+    shutdown_grace_period: int = None,
+    deregistration_delay: int = None )->dict:
+    """
+    NLB target group annotations and matching controller values
+
+    `instance` targets keep the TCP health check on the NodePort. `ip` targets register the pods
+    directly, skipping the kube-proxy hop, and are health checked on the controller `/healthz`, which
+    fails once the pod is terminating. The controller then keeps serving for `shutdown_grace_period`
+    ( long enough for the NLB to see the failing checks, by default ) before `/wait-shutdown` stops nginx,
+    and the NLB drains connections for the same time.
+    """
+    if target_type not in ("instance", "ip"):
+        raise ValueError(f"Unsupported target type {target_type}, expected instance or ip")
+
+    if shutdown_grace_period is None:
+        shutdown_grace_period = healthcheck_interval * (healthcheck_unhealthy_threshold + 1) if target_type == "ip" else 0
+    if deregistration_delay is None:
+        deregistration_delay = max(shutdown_grace_period, 10)
+
+    annotations = {
+        "service.beta.kubernetes.io/aws-load-balancer-nlb-target-type": target_type,
+        "service.beta.kubernetes.io/aws-load-balancer-target-group-attributes": f"deregistration_delay.timeout_seconds={deregistration_delay},deregistration_delay.connection_termination.enabled=true",
+        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-protocol": "tcp",
+        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-path": "/healthz",
+        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-interval": healthcheck_interval,
+        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-unhealthy-threshold": healthcheck_unhealthy_threshold,
+    }
+
+    if target_type == "ip":
+        annotations.update({
+            "service.beta.kubernetes.io/aws-load-balancer-healthcheck-protocol": "http",
+            "service.beta.kubernetes.io/aws-load-balancer-healthcheck-port": HEALTHCHECK_PORT,
+        })
+
+    controller = {}
+    if shutdown_grace_period > 0:
+        controller = {
+            "extraArgs": {
+                "shutdown-grace-period": shutdown_grace_period,
+            },
+            "terminationGracePeriodSeconds": shutdown_grace_period + WORKER_SHUTDOWN_TIMEOUT + 60,
+        }
+
+    return {
+        "annotations": annotations,
+        "controller": controller,
+    }
+
+@memoize()
+def access_log_config(
+    enabled: bool = True,
+    log_format: AccessLogFormat = "text",
+    buffer: str = "",
+    flush: str = "5s",
+    sample_rate: float = 1.0,
+    always_log_status: str = "^[45]",
+    skip_paths: list[str] = [] )->dict:
+    """
+    ConfigMap settings of the controller access log
+
+    `buffer` ( e.g. "64k" ) batches log writes, flushed at least every `flush`. With a `sample_rate` below 1
+    only that share of the requests is logged, except responses whose status matches `always_log_status`.
+    Requests to `skip_paths` ( exact URIs, like the health checks ) are never logged.
+    """
+    if not enabled:
+        return {
+            "disable-access-log": True,
+        }
+
+    if log_format not in ACCESS_LOG_FORMATS:
+        raise ValueError(f"Unknown access log format {log_format}, expected one of {', '.join(ACCESS_LOG_FORMATS)}")
+    if not 0 < sample_rate <= 1:
+        raise ValueError("Access log sample rate must be in (0, 1]")
+
+    config = {
+        "skip-access-log-urls": ",".join([ "/healthz", "/healthz/" ] + skip_paths),
+        "log-format-upstream": ACCESS_LOG_FORMATS[log_format],
+    }
+
+    if log_format == "json":
+        config["log-format-escape-json"] = True
+
+    params = f"buffer={buffer} flush={flush}" if buffer != "" else ""
+    if params != "":
+        config["access-log-params"] = params
+
+    if sample_rate < 1:
+        # The http level access log already uses `if=$loggable` ( skipped URLs ), so sampled requests are
+        # logged by a location level access log, which replaces the inherited one
+        percent = f"{sample_rate * 100:.2f}".rstrip("0").rstrip(".")
+        config["http-snippet"] = "\n".join([
+            f"map $status $access_log_status {{ ~{always_log_status} 1; default 0; }}",
+            f"split_clients $request_id $access_log_sample {{ {percent}% 1; * 0; }}",
+            "map $loggable$access_log_status$access_log_sample $access_log_sampled { ~^1(1.|.1)$ 1; default 0; }",
+        ])
+        config["location-snippet"] = f"access_log {ACCESS_LOG_PATH} upstreaminfo {params + ' ' if params != '' else ''}if=$access_log_sampled;"
+
+    return config
+
+@memoize()
+def compression_config(
+    gzip_level: int = 0,
+    brotli_level: int = 0,
+    min_length: int = 1024,
+    types: list[str] = COMPRESSION_TYPES )->dict:
+    """
+    ConfigMap settings enabling gzip ( levels 1-9 ) and brotli ( levels 1-11 ) response compression, 0 disables
+    """
+    if not 0 <= gzip_level <= 9:
+        raise ValueError("gzip level must be between 0 and 9")
+    if not 0 <= brotli_level <= 11:
+        raise ValueError("brotli level must be between 0 and 11")
+
+    config = {}
+    if gzip_level > 0:
+        config.update({
+            "use-gzip": "true",
+            "gzip-level": str(gzip_level),
+            "gzip-min-length": str(min_length),
+            "gzip-types": " ".join(types),
+        })
+    if brotli_level > 0:
+        config.update({
+            "enable-brotli": "true",
+            "brotli-level": str(brotli_level),
+            "brotli-min-length": str(min_length),
+            "brotli-types": " ".join(types),
+        })
+
+    return config
+
+@memoize()
+def proxy_cache(
+    keys_zone_size: str = "64m",
+    max_size: str = "1g",
+    inactive: str = "10m" )->dict:
+    """
+    Shared proxy cache zone of the controller, `config` holds the ConfigMap settings and `controller` the
+    emptyDir volume backing the cache
+
+    Least recently used entries are evicted above `max_size`, and entries unused for `inactive` regardless of
+    their validity. Ingresses opt in with `cache_annotations`.
+    """
+    return {
+        "config": {
+            "http-snippet": f"proxy_cache_path {PROXY_CACHE_PATH} levels=1:2 keys_zone={PROXY_CACHE_ZONE}:{keys_zone_size} max_size={max_size} inactive={inactive} use_temp_path=off;",
+        },
+        "controller": {
+            "extraVolumes": [
+                {
+                    "name": "proxy-cache",
+                    "emptyDir": {
+                        # nginx may briefly go above max_size before the cache manager evicts entries
+                        "sizeLimit": f"{_size_mb(max_size) * 5 // 4}Mi",
+                    },
+                },
+            ],
+            "extraVolumeMounts": [
+                {
+                    "name": "proxy-cache",
+                    "mountPath": PROXY_CACHE_PATH,
+                },
+            ],
+        },
+    }
+
+def _size_mb(size: str)->int:
+    units = { "k": 1 / 1024, "m": 1, "g": 1024 }
+    unit = size[-1].lower()
+    if unit not in units:
+        return math.ceil(int(size) / 1024 / 1024)
+    return math.ceil(int(size[:-1]) * units[unit])
+
+@memoize()
+def cache_annotations(
+    valid: list[str] = [ "200 301 302 10m", "404 1m" ],
+    key: str = "$scheme$host$request_uri",
+    use_stale: str = "error timeout updating http_500 http_502 http_503 http_504",
+    lock: bool = True,
+    private_headers: list[str] = [ "Authorization", "Cookie" ] )->dict:
+    """
+    Ingress annotations caching the responses of an ingress in the controller proxy cache ( see `proxy_cache` )
+
+    The cache zone is shared by every ingress of the controller, so the key includes the requested host.
+    Requests with any of `private_headers` skip the cache and their responses aren't stored. Stale entries
+    are served while a single request refreshes them, so a burst of misses only reaches the backend once.
+    """
+    private = " ".join(f"$http_{header.lower().replace('-', '_')}" for header in private_headers)
+    snippet = [
+        f"proxy_cache {PROXY_CACHE_ZONE};",
+        f"proxy_cache_key {key};",
+    ] + ([
+        f"proxy_cache_bypass {private};",
+        f"proxy_no_cache {private};",
+    ] if private != "" else []) + [ f"proxy_cache_valid {v};" for v in valid ] + [
+        f"proxy_cache_use_stale {use_stale};",
+        "proxy_cache_background_update on;",
+        f"proxy_cache_lock {'on' if lock else 'off'};",
+        "add_header X-Cache-Status $upstream_cache_status;",
+    ]
+
+    return {
+        "nginx.ingress.kubernetes.io/configuration-snippet": "\n".join(snippet),
+    }
+
+def shard_suffixes(name_suffix: str, shards: int)->list:
+    """
+    Name suffixes of the controllers of a sharded ingress, the ingress class of each shard is `nginx-<suffix>`
+    """
+    return [ f"{name_suffix}-{shard}" for shard in range(shards) ]
+
+def _ring_hash(key: str)->int:
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big")
+
+@memoize()
+def hash_ring(members: list[str], vnodes: int = 128)->dict:
+    """
+    Consistent hash ring of `members`, each placed `vnodes` times to even out the share of keys
+
+    Adding or removing a member only moves the keys of that member.
+    """
+    points = sorted(( _ring_hash(f"{member}#{vnode}"), member ) for member in members for vnode in range(vnodes))
+    return {
+        "hashes": [ h for h, _ in points ],
+        "members": [ m for _, m in points ],
+    }
+
+def ring_lookup(ring: dict, key: str)->str:
+    """
+    Member of `ring` owning `key`
+    """
+    if len(ring["hashes"]) == 0:
+        raise ValueError("Empty hash ring")
+    index = bisect.bisect(ring["hashes"], _ring_hash(key)) % len(ring["hashes"])
+    return ring["members"][index]
+
+def assign_hosts(
+    hosts: list[str],
+    name_suffix: str = "default",
+    shards: int = 2,
+    dedicated: dict = {},
+    vnodes: int = 128 )->dict:
+    """
+    Ingress class of each host of a sharded ingress ( see `releases.ingress_nginx_sharded` )
+
+    `dedicated` maps hosts to a shard index reserved for them, those shards take no other hosts.
+    Remaining hosts are spread over the shared shards by consistent hashing, so resharding moves as few
+    hosts as possible.
+    """
+    suffixes = shard_suffixes(name_suffix, shards)
+    for host, shard in dedicated.items():
+        if not 0 <= shard < shards:
+            raise ValueError(f"Dedicated shard {shard} of {host} out of range, expected 0 to {shards - 1}")
+
+    shared = [ suffix for shard, suffix in enumerate(suffixes) if shard not in set(dedicated.values()) ]
+    ring = hash_ring(shared, vnodes) if len(shared) > 0 else None
+
+    assignments = {}
+    for host in hosts:
+        if host in dedicated:
+            assignments[host] = f"nginx-{suffixes[dedicated[host]]}"
+        elif ring is None:
+            raise ValueError(f"No shared shard left for {host}, every shard is dedicated")
+        else:
+            assignments[host] = f"nginx-{ring_lookup(ring, host)}"
+
+    return assignments
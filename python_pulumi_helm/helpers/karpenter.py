@@ -0,0 +1,153 @@
+"""
+Karpenter node provisioning objects and the matching pod affinity blocks
+
+Builders are memoized, so identical specs return the same ( frozen ) object.
+"""
+
+from typing import Literal
+from .values import memoize
+
+ApiVersion = Literal["v1alpha5", "v1beta1"]
+
+def _requirements(
+    instance_category: list[str],
+    instance_arch: list[str],
+    instance_capacity_type: list[str] )->list:
+
+    return [
+        { "key": "karpenter.k8s.aws/instance-category", "operator": "In", "values": instance_category },
+        { "key": "kubernetes.io/arch", "operator": "In", "values": instance_arch },
+        { "key": "kubernetes.io/os", "operator": "In", "values": [ "linux" ] },
+        { "key": "karpenter.sh/capacity-type", "operator": "In", "values": instance_capacity_type },
+    ]
+
+@memoize()
+def provisioner(
+    name: str,
+    labels: dict,
+    instance_category: list[str],
+    instance_arch: list[str],
+    instance_capacity_type: list[str],
+    provider_name: str = "default",
+    consolidation: bool = True,
+    ttl_seconds_after_empty: int = None,
+    ttl_seconds_until_expired: int = None,
+    api_version: ApiVersion = "v1alpha5",
+    metadata_labels: dict = None )->dict:
+    """
+    Karpenter `Provisioner` ( v1alpha5 ) or `NodePool` ( v1beta1 ) for nodes labeled with `labels`
+
+    The object itself is labeled with `metadata_labels`, `labels` when omitted.
+    """
+    metadata_labels = labels if metadata_labels is None else metadata_labels
+    requirements = _requirements(instance_category, instance_arch, instance_capacity_type)
+
+    if api_version == "v1beta1":
+        disruption = {
+            "consolidationPolicy": "WhenUnderutilized" if consolidation else "WhenEmpty",
+            "expireAfter": f"{ttl_seconds_until_expired}s" if ttl_seconds_until_expired is not None else "720h",
+        }
+        if not consolidation:
+            disruption["consolidateAfter"] = f"{ttl_seconds_after_empty if ttl_seconds_after_empty is not None else 30}s"
+
+        return {
+            "apiVersion": "karpenter.sh/v1beta1",
+            "kind": "NodePool",
+            "metadata": {
+                "labels": metadata_labels,
+                "name": name,
+            },
+            "spec": {
+                "template": {
+                    "metadata": {
+                        "labels": labels,
+                    },
+                    "spec": {
+                        "nodeClassRef": {
+                            "apiVersion": "karpenter.k8s.aws/v1beta1",
+                            "kind": "EC2NodeClass",
+                            "name": provider_name,
+                        },
+                        "taints": [],
+                        "requirements": requirements,
+                    },
+                },
+                "disruption": disruption,
+            },
+        }
+
+    if api_version != "v1alpha5":
+        raise ValueError(f"Unsupported Karpenter API version {api_version}, expected v1alpha5 or v1beta1")
+
+    spec = {
+        "consolidation": {
+            "enabled": consolidation,
+        },
+        "labels": labels,
+        "taints": [],
+        "providerRef": {
+            "name": provider_name,
+        },
+        "requirements": requirements,
+    }
+
+    if ttl_seconds_after_empty is not None:
+        spec["ttlSecondsAfterEmpty"] = ttl_seconds_after_empty
+
+    if ttl_seconds_until_expired is not None:
+        spec["ttlSecondsUntilExpired"] = ttl_seconds_until_expired
+
+    return {
+        "apiVersion": "karpenter.sh/v1alpha5",
+        "kind": "Provisioner",
+        "metadata": {
+            "labels": metadata_labels,
+            "name": name,
+        },
+        "spec": spec,
+    }
+
+@memoize()
+def node_affinity(labels: dict)->dict:
+    """
+    Required node affinity to nodes created for `labels`
+    """
+    return {
+        "nodeAffinity": {
+            "requiredDuringSchedulingIgnoredDuringExecution": {
+                "nodeSelectorTerms": [
+                    {
+                        "matchExpressions": [
+                            { "key": k, "operator": "In", "values": [ v ] } for k, v in labels.items()
+                        ]
+                    }
+                ]
+            }
+        }
+    }
+
+@memoize()
+def affinity(
+    pod_labels: dict,
+    node_labels: dict = {},
+    topology_key: str = "kubernetes.io/hostname" )->dict:
+    """
+    Required pod anti-affinity between pods with `pod_labels`, plus node affinity when `node_labels` is set
+    """
+    pod_affinity = {
+        "podAntiAffinity": {
+            "requiredDuringSchedulingIgnoredDuringExecution": [
+                {
+                    "topologyKey": topology_key,
+                    "labelSelector": {
+                        "matchLabels": pod_labels
+                    }
+                }
+            ]
+        }
+    }
+
+    if len(node_labels) > 0:
+        pod_affinity.update(node_affinity(node_labels))
+
+    return pod_affinity
@@ -0,0 +1,73 @@
+"""
+Parallel chart prefetcher, fills the local chart cache with every chart pinned by the release factories
+"""
+
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from . import cache
+
+def default_charts() -> list:
+    """
+    (repo, chart, version) of every chart installed with the factory defaults, side releases included
+    """
+    from .. import releases
+
+    charts = [ releases.MEMCACHED_CHART, releases.PROMTAIL_CHART ]
+    for _, factory in inspect.getmembers(releases, inspect.isfunction):
+        if factory.__module__ != releases.__name__:
+            continue
+        params = inspect.signature(factory).parameters
+        if not all(p in params for p in ("repo", "chart", "version")):
+            continue
+        charts.append((params["repo"].default, params["chart"].default, params["version"].default))
+
+    return sorted(set(charts))
+
+def prefetch(
+    cache_dir: str = None,
+    charts: list = None,
+    mirror: str = None,
+    max_workers: int = 8 )->dict:
+    """
+    Download `charts` ( (repo, chart, version) tuples, all factory defaults when omitted ) into the cache
+
+    With a `mirror` ( e.g. a local mirror directory ), every archive is downloaded from the mirror and
+    cached under its original repository, so releases find it without reaching the repository.
+    Returns a dict mapping (repo, chart, version) to the cached archive path.
+    """
+    cache_dir = cache.default_cache_dir() if cache_dir is None else cache_dir
+    if cache_dir == "":
+        raise cache.ChartCacheError(f"No cache directory given and {cache.CACHE_DIR_ENV} is not set")
+
+    charts = sorted(set(default_charts() if charts is None else charts))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        futures = {
+            (repo, chart, version): executor.submit(cache.fetch, cache_dir, repo, chart, version, mirror=mirror)
+            for repo, chart, version in charts
+        }
+
+    paths = {}
+    errors = []
+    for key, future in futures.items():
+        try:
+            paths[key] = future.result()
+        except Exception as e:
+            errors.append(f"{key[1]} {key[2]} from {key[0]}: {e}")
+
+    if len(errors) > 0:
+        raise cache.ChartCacheError("Failed to prefetch charts:\n" + "\n".join(errors))
+
+    return paths
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Prefetch Helm charts pinned by python_pulumi_helm factories")
+    parser.add_argument("--cache-dir", default=None)
+    parser.add_argument("--mirror", default=None, help="Download every chart from this repository (URL or directory)")
+    parser.add_argument("--max-workers", type=int, default=8)
+    args = parser.parse_args()
+
+    for (repo, chart, version), path in sorted(prefetch(args.cache_dir, mirror=args.mirror, max_workers=args.max_workers).items()):
+        print(f"{repo} {chart} {version} {path}")
@@ -0,0 +1,87 @@
+"""
+Building blocks of the Prometheus server values
+"""
+
+import math
+from typing import Literal
+from .values import freeze, memoize
+
+PrometheusMode = Literal["server", "agent"]
+
+PROMETHEUS_MODES = ("server", "agent")
+
+# Rules of thumb per active series: head block and WAL memory ( agents keep no head block to query ),
+# scrape and compression CPU, and compressed bytes per sample on disk
+MEMORY_BYTES_PER_SERIES = { "server": 8 * 1024, "agent": 3 * 1024 }
+MILLICORES_PER_MILLION_SERIES = 1000
+BYTES_PER_SAMPLE = 1.5
+
+# Series above which a single Prometheus starts to struggle ( memory, scrape duration, compaction )
+MAX_SERIES_PER_SHARD = 2_000_000
+
+# Per pod resources and volume size used when neither the expected series nor explicit values are given
+SIZING_DEFAULTS = freeze({
+    "resources": { "requests": { "cpu": "1000m", "memory": "2048Mi" }, "limits": { "cpu": "1000m", "memory": "2048Mi" } },
+    "storage": "20Gi",
+})
+
+# Samples sent by a remote write queue shard per second, used to bound the number of queue shards
+SAMPLES_PER_QUEUE_SHARD = 5000
+
+def duration_seconds(duration: str)->int:
+    """
+    Seconds in a Prometheus duration made of a single unit, e.g. "15s", "30d" or "2w"
+    """
+    units = { "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800, "y": 31536000 }
+    if len(duration) < 2 or duration[-1] not in units or not duration[:-1].isdigit():
+        raise ValueError(f"Unsupported duration {duration}, expected a number followed by one of {''.join(units)}")
+    return int(duration[:-1]) * units[duration[-1]]
+
+@memoize()
+def sizing(
+    expected_series: int,
+    shards: int = 0,
+    mode: PrometheusMode = "server",
+    scrape_interval: str = "15s",
+    retention: str = "30d" )->dict:
+    """
+    Shards, per pod resources, volume size and remote write queue of a Prometheus scraping `expected_series` active series
+
+    With `shards` set to 0, the number of shards keeps each one under `MAX_SERIES_PER_SHARD` series. Every
+    replica of a shard scrapes the same targets, so the per pod figures don't depend on the replicas.
+    """
+    if mode not in PROMETHEUS_MODES:
+        raise ValueError(f"Unknown Prometheus mode {mode}, expected one of {', '.join(PROMETHEUS_MODES)}")
+
+    shards = shards if shards > 0 else max(1, math.ceil(expected_series / MAX_SERIES_PER_SHARD))
+    series = math.ceil(expected_series / shards)
+    samples_per_second = series / duration_seconds(scrape_interval)
+
+    memory_mb = max(512, math.ceil(series * MEMORY_BYTES_PER_SERIES[mode] / 1024 / 1024))
+    cpu_millicores = max(250, math.ceil(series / 1_000_000 * MILLICORES_PER_MILLION_SERIES))
+
+    # Agents only keep the WAL until it is sent, servers keep `retention` of blocks plus the WAL
+    stored_seconds = duration_seconds(retention) if mode == "server" else 2 * 3600
+    storage_gb = max(10, math.ceil(samples_per_second * stored_seconds * BYTES_PER_SAMPLE * 1.2 / 1024 ** 3))
+
+    return {
+        "shards": shards,
+        "resources": {
+            "requests": { "cpu": f"{cpu_millicores}m", "memory": f"{memory_mb}Mi" },
+            "limits": { "memory": f"{memory_mb * 3 // 2}Mi" },
+        },
+        "storage": f"{storage_gb}Gi",
+        "queue_config": queue_config(samples_per_second),
+    }
+
+def queue_config(samples_per_second: float = 0)->dict:
+    """
+    Remote write queue sized for `samples_per_second`, Prometheus scales the queue shards up to `maxShards`
+    """
+    return {
+        "capacity": 10000,
+        "maxSamplesPerSend": 2000,
+        "minShards": 1,
+        "maxShards": max(10, math.ceil(samples_per_second / SAMPLES_PER_QUEUE_SHARD)),
+        "batchSendDeadline": "5s",
+    }
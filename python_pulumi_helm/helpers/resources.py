@@ -1,6 +1,123 @@
-from pulumi import ResourceOptions
-from pulumi_kubernetes.helm.v3 import Chart, ChartOpts, FetchOpts, Release, ReleaseArgs, RepositoryOptsArgs
-from pulumi_kubernetes import Provider
+from __future__ import annotations
+import contextvars
+import os
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+from . import cache
+from . import await_policy as await_policies
+from .values import update_in
+
+# Pulumi SDK modules are imported on first use, so importing a factory module stays cheap
+if TYPE_CHECKING:
+    from pulumi_kubernetes.helm.v3 import Chart, Release
+    from pulumi_kubernetes import Provider
+
+# Topology aware routing, endpoints in the zone of the client are preferred ( topology-mode from Kubernetes 1.27,
+# topology-aware-hints before )
+TOPOLOGY_ANNOTATIONS = {
+  "service.kubernetes.io/topology-mode": "Auto",
+  "service.kubernetes.io/topology-aware-hints": "auto",
+}
+
+# Values paths of the annotations of in-cluster services, by chart
+TOPOLOGY_SERVICE_PATHS = {
+  "ingress-nginx": [ ("controller", "service", "annotations") ],
+  "memcached": [ ("service", "annotations") ],
+  "argo-cd": [ ("redis", "service", "annotations"), ("server", "service", "annotations"), ("repoServer", "service", "annotations") ],
+  "thanos": [ ("query", "service", "annotations"), ("queryFrontend", "service", "annotations"), ("storegateway", "service", "annotations") ],
+  "opensearch": [ ("service", "annotations") ],
+  "loki": [ ("gateway", "service", "annotations") ],
+}
+
+# Record lists of the enclosing `record_releases` blocks, releases created outside of them aren't recorded
+_recorders = contextvars.ContextVar("release_recorders", default=())
+
+@contextmanager
+def record_releases():
+    """
+    Record the releases created through `release` inside the block, to rebuild the dependency graph ( see helpers.graph )
+
+        with record_releases() as records:
+            ...
+        graph.analyze(records)
+    """
+    records = []
+    token = _recorders.set(_recorders.get() + (records,))
+    try:
+      yield records
+    finally:
+      _recorders.reset(token)
+
+def stable_chart_path(path: str)->str:
+    """
+    `path` relative to the working directory ( the Pulumi project ) when it is inside it, so the `chart`
+    input of a release installed from a project-local cache is the same on every machine
+    """
+    path = os.path.abspath(path)
+    cwd = os.getcwd()
+    if os.path.commonpath([path, cwd]) != cwd:
+      return path
+    return os.path.join(".", os.path.relpath(path, cwd))
+
+# Parent of the releases and charts created inside a `parent_resource` block, e.g. a component resource
+_parent = contextvars.ContextVar("release_parent", default=None)
+
+def _parent_options()->dict:
+    # Resources created before they had a parent keep their state through an alias to the stack root
+    import pulumi
+
+    parent = _parent.get()
+    if parent is None:
+      return {}
+    return { "parent": parent, "aliases": [ pulumi.Alias(parent=pulumi.ROOT_STACK_RESOURCE) ] }
+
+@contextmanager
+def parent_resource(parent):
+    """
+    Create the releases and charts of the block as children of `parent`
+    """
+    token = _parent.set(parent)
+    try:
+      yield parent
+    finally:
+      _parent.reset(token)
+
+def cached_chart_path(
+    repo: str,
+    chart: str,
+    version: str,
+    cache_dir: str = None )->str:
+
+    cache_dir = cache.default_cache_dir() if cache_dir is None else cache_dir
+    if cache_dir == "":
+      return ""
+
+    try:
+      return stable_chart_path(cache.fetch(cache_dir, repo, chart, version))
+    except (cache.ChartCacheError, OSError) as e:
+      from pulumi import log
+
+      log.warn(f"Chart cache unavailable for {chart} {version} from {repo}, using remote repository: {e}")
+      return ""
+
+def topology_aware_values(
+    chart: str,
+    values: dict,
+    paths: list = None )->dict:
+    """
+    Copy of `values` with topology aware routing enabled on the services at `paths` ( `TOPOLOGY_SERVICE_PATHS` of the chart by default )
+    """
+    paths = TOPOLOGY_SERVICE_PATHS.get(chart) if paths is None else paths
+    if paths is None:
+      from pulumi import log
+
+      log.warn(f"Topology aware routing requested for {chart}, which has no known service annotations path")
+      return values
+
+    for path in paths:
+      values = update_in(values, path, lambda annotations: { **(annotations or {}), **TOPOLOGY_ANNOTATIONS })
+
+    return values
 
 def release(
     provider,
@@ -13,15 +130,34 @@ def release(
     skip_await: bool = False,
     timeout: int = 60,
     values: dict = {},
-    depends_on: list = [] )->Release:
+    depends_on: list = [],
+    chart_cache_dir: str = None,
+    await_policy: await_policies.AwaitPolicy = None,
+    topology_aware_routing: bool = False )->Release:
   
-    repo_opts_args = RepositoryOptsArgs(
+    from pulumi import ResourceOptions
+    from pulumi_kubernetes.helm.v3 import Release, ReleaseArgs, RepositoryOptsArgs
+
+    if topology_aware_routing:
+      values = topology_aware_values(chart, values)
+
+    # The policy replaces the factory default of skip_await, and its timeout when set, an explicit skip_await must agree with it
+    if await_policy is not None:
+      if skip_await and not await_policy.skip_await():
+        raise ValueError(f"skip_await=True conflicts with the {await_policy.mode} await policy of release {name}")
+      skip_await = await_policy.skip_await()
+      timeout = timeout if await_policy.timeout is None else await_policy.timeout
+
+    local_chart = cached_chart_path(repo, chart, version, chart_cache_dir)
+
+    repo_opts_args = None if local_chart else RepositoryOptsArgs(
       repo=repo
     )
 
+    # The version is kept with a local archive ( helm ignores it ), so bumps still show up in the diff
     release_args = ReleaseArgs(
       name=name,
-      chart=chart,
+      chart=local_chart if local_chart else chart,
       version=version,
       repository_opts=repo_opts_args,
       namespace=namespace,
@@ -31,14 +167,28 @@ def release(
       timeout=timeout,
     )
     
-    resource_options = ResourceOptions(provider=provider, depends_on=depends_on)
+    resource_options = ResourceOptions(provider=provider, depends_on=depends_on, **_parent_options())
 
     release = Release(
       resource_name=name,
       args=release_args,
       opts=resource_options
     )
-    
+
+    for records in _recorders.get():
+      records.append({
+        "name": name,
+        "chart": chart,
+        "version": version,
+        "timeout": timeout,
+        "skip_await": skip_await,
+        "release": release,
+        "depends_on": list(depends_on),
+      })
+
+    # Checks of `workloads` policies, dependents can wait for them instead of the release ( see Platform )
+    release.readiness_checks = [] if await_policy is None else await_policies.apply(await_policy, provider, release, name, namespace, timeout)
+
     return release
 
 def chart(
@@ -51,22 +201,36 @@ def chart(
     skip_await: bool = False,
     values: dict = {},
     depends_on: list = [],
-    transformations: list = [] )->Chart:
+    transformations: list = [],
+    chart_cache_dir: str = None )->Chart:
     
-    fetch_opts = FetchOpts(
-      repo=repo
-    )
+    from pulumi import ResourceOptions
+    from pulumi_kubernetes.helm.v3 import Chart, ChartOpts, FetchOpts, LocalChartOpts
 
-    chart_opts = ChartOpts(
-      chart=chart,
-      version=version,
-      fetch_opts=fetch_opts,
-      namespace=namespace,
-      skip_await=skip_await,
-      values=values
-    )
+    local_chart = cached_chart_path(repo, chart, version, chart_cache_dir)
+
+    if local_chart:
+      chart_opts = LocalChartOpts(
+        path=local_chart,
+        namespace=namespace,
+        skip_await=skip_await,
+        values=values
+      )
+    else:
+      fetch_opts = FetchOpts(
+        repo=repo
+      )
+
+      chart_opts = ChartOpts(
+        chart=chart,
+        version=version,
+        fetch_opts=fetch_opts,
+        namespace=namespace,
+        skip_await=skip_await,
+        values=values
+      )
 
-    resource_options = ResourceOptions(provider=provider, depends_on=depends_on, transformations=transformations)
+    resource_options = ResourceOptions(provider=provider, depends_on=depends_on, transformations=transformations, **_parent_options())
 
     helm_chart = Chart(
       release_name=name,
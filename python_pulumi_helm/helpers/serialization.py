@@ -0,0 +1,31 @@
+"""
+Cached YAML emission for values fragments passed to charts as strings
+"""
+
+from .values import FrozenDict, FrozenList, memoize
+
+_dumper_class = None
+
+def dumper():
+    """
+    libyaml `CDumper` when pyyaml was built with it, the pure-Python `Dumper` otherwise
+    """
+    global _dumper_class
+    if _dumper_class is None:
+        import yaml
+
+        cls = getattr(yaml, "CDumper", yaml.Dumper)
+        yaml.add_representer(FrozenDict, yaml.representer.SafeRepresenter.represent_dict, Dumper=cls)
+        yaml.add_representer(FrozenList, yaml.representer.SafeRepresenter.represent_list, Dumper=cls)
+        _dumper_class = cls
+
+    return _dumper_class
+
+@memoize(maxsize=512)
+def dump_yaml(data)->str:
+    """
+    Same output as `yaml.dump(data, default_flow_style=False)`, cached by the structure of `data`
+    """
+    import yaml
+
+    return yaml.dump(data, Dumper=dumper(), default_flow_style=False)
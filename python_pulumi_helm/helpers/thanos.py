@@ -0,0 +1,261 @@
+"""
+Building blocks of the Thanos components values
+"""
+
+from typing import Literal
+from .values import memoize
+
+CacheBackend = Literal["none", "in-memory", "memcached"]
+
+CACHE_BACKENDS = ("none", "in-memory", "memcached")
+
+StoreDiscovery = Literal["dnssrv", "static"]
+
+STORE_DISCOVERY = ("dnssrv", "static")
+
+# gRPC ports of the store gateways and of the Prometheus sidecar ( `--grpc-address` of prometheus_stack )
+STOREGATEWAY_GRPC_PORT = 10901
+SIDECAR_GRPC_PORT = 10902
+
+def memcached_addresses(service: str, namespace: str)->list:
+    """
+    Thanos memcached client addresses of a headless memcached service, one per pod through DNS SRV discovery
+    """
+    return [ f"dnssrv+_memcache._tcp.{service}.{namespace}.svc.cluster.local" ]
+
+def _memcached_client_config(addresses: list[str], max_item_size: str = "1MiB")->dict:
+    return {
+        "addresses": addresses,
+        "timeout": "500ms",
+        "max_idle_connections": 100,
+        "max_async_concurrency": 20,
+        "max_async_buffer_size": 10000,
+        "max_get_multi_concurrency": 100,
+        "max_get_multi_batch_size": 0,
+        "max_item_size": max_item_size,
+        "dns_provider_update_interval": "10s",
+    }
+
+def _cache_backend(backend: str, memcached_addresses: list[str]):
+    if backend not in CACHE_BACKENDS:
+        raise ValueError(f"Unknown cache backend {backend}, expected one of {', '.join(CACHE_BACKENDS)}")
+    if backend == "memcached" and len(memcached_addresses) == 0:
+        raise ValueError("Memcached cache backend requires memcached addresses")
+
+@memoize()
+def response_cache_config(
+    backend: CacheBackend,
+    size_mb: int = 512,
+    ttl: str = "24h",
+    memcached_addresses: list[str] = [] )->dict:
+    """
+    Query frontend results cache, bounded by `size_mb` ( least recently used entries are evicted first ) and `ttl`
+
+    Returns an empty dict for the `none` backend.
+    """
+    _cache_backend(backend, memcached_addresses)
+
+    if backend == "none":
+        return {}
+
+    if backend == "in-memory":
+        return {
+            "type": "IN-MEMORY",
+            "config": {
+                "max_size": f"{size_mb}MB",
+                "max_size_items": 0,
+                "validity": ttl,
+            },
+        }
+
+    return {
+        "type": "MEMCACHED",
+        "config": {
+            **_memcached_client_config(memcached_addresses),
+            "expiration": ttl,
+        },
+    }
+
+@memoize()
+def index_cache_config(
+    backend: CacheBackend,
+    size_mb: int = 250,
+    memcached_addresses: list[str] = [] )->dict:
+    """
+    Store gateway index cache ( postings and series ), empty for the `none` backend, which keeps the
+    Thanos default 250MB in-memory cache
+    """
+    _cache_backend(backend, memcached_addresses)
+
+    if backend == "none":
+        return {}
+
+    if backend == "in-memory":
+        return {
+            "type": "IN-MEMORY",
+            "config": {
+                "max_size": f"{size_mb}MB",
+                "max_item_size": f"{max(1, size_mb // 2)}MB",
+            },
+        }
+
+    return {
+        "type": "MEMCACHED",
+        "config": _memcached_client_config(memcached_addresses),
+    }
+
+@memoize()
+def bucket_cache_config(
+    backend: CacheBackend,
+    size_mb: int = 512,
+    memcached_addresses: list[str] = [] )->dict:
+    """
+    Store gateway caching bucket, caches chunk subranges and object metadata read from the object storage
+    """
+    _cache_backend(backend, memcached_addresses)
+
+    if backend == "none":
+        return {}
+
+    return {
+        "type": "IN-MEMORY" if backend == "in-memory" else "MEMCACHED",
+        "config": {
+            "max_size": f"{size_mb}MB",
+            "max_item_size": "16MB",
+        } if backend == "in-memory" else _memcached_client_config(memcached_addresses),
+        "chunk_subrange_size": 16000,
+        "max_chunks_get_range_requests": 3,
+        "chunk_object_attrs_ttl": "24h",
+        "chunk_subrange_ttl": "24h",
+        "blocks_iter_ttl": "5m",
+        "metafile_exists_ttl": "2h",
+        "metafile_doesnt_exist_ttl": "15m",
+        "metafile_content_ttl": "24h",
+    }
+
+def storegateway_shards(hash_shards: int = 1, time_partitions: list[dict] = [])->int:
+    """
+    Store gateway StatefulSets of the bitnami sharded mode, one per hash shard and time partition
+    """
+    return max(1, hash_shards) * max(1, len(time_partitions))
+
+def _store_endpoint(service: str, namespace: str, discovery: StoreDiscovery, port: int = STOREGATEWAY_GRPC_PORT)->str:
+    if discovery not in STORE_DISCOVERY:
+        raise ValueError(f"Unknown store discovery {discovery}, expected one of {', '.join(STORE_DISCOVERY)}")
+    if discovery == "dnssrv":
+        return f"dnssrv+_grpc._tcp.{service}.{namespace}.svc.cluster.local"
+    return f"{service}.{namespace}.svc.cluster.local:{port}"
+
+def storegateway_endpoints(
+    fullname: str,
+    namespace: str,
+    shards: int = 1,
+    discovery: StoreDiscovery = "static" )->list:
+    """
+    gRPC store addresses of the store gateway services, one per shard in sharded mode
+    """
+    if shards <= 1:
+        return [ _store_endpoint(f"{fullname}-storegateway", namespace, discovery) ]
+    return [ _store_endpoint(f"{fullname}-storegateway-{shard}", namespace, discovery) for shard in range(shards) ]
+
+def sidecar_endpoint(
+    prometheus_fullname: str,
+    namespace: str,
+    discovery: StoreDiscovery = "static" )->str:
+    """
+    gRPC store address of the Prometheus sidecars, behind the headless `thanos-discovery` service of kube-prometheus-stack
+
+    The service is headless, so static addresses dial the sidecar pods directly on their gRPC port.
+    With `dnssrv` discovery every sidecar is resolved and queried, not only the one picked by the service.
+    """
+    return _store_endpoint(f"{prometheus_fullname}-thanos-discovery", namespace, discovery, SIDECAR_GRPC_PORT)
+
+def prometheus_fullname(name: str, name_override: str = "")->str:
+    """
+    Resource name prefix of a kube-prometheus-stack release
+    """
+    if name_override == "":
+        name_override = name if "kube-prometheus-stack" in name else f"{name}-kube-prometheus-stack"
+    return name_override[:26].rstrip("-")
+
+def compactor_flags(
+    compact_concurrency: int = 1,
+    downsample_concurrency: int = 1,
+    block_sync_concurrency: int = 20,
+    delete_delay: str = "48h" )->list:
+    """
+    Compactor concurrency flags, a higher `compact_concurrency` compacts several groups ( streams ) in parallel
+    """
+    return [
+        f"--compact.concurrency={compact_concurrency}",
+        f"--downsample.concurrency={downsample_concurrency}",
+        f"--block-sync-concurrency={block_sync_concurrency}",
+        f"--delete-delay={delete_delay}",
+    ]
+
+def shard_relabel_config(labels: list[str], shards: int, shard: int)->list:
+    """
+    Block selector keeping the blocks of shard `shard` out of `shards`, by hashmod of the external `labels`
+
+    Compaction groups are made of blocks with the same external labels, so sharding by labels ( not by block )
+    keeps every group in a single compactor.
+    """
+    return [
+        {
+            "action": "hashmod",
+            "source_labels": labels,
+            "modulus": shards,
+            "target_label": "shard",
+        },
+        {
+            "action": "keep",
+            "source_labels": [ "shard" ],
+            "regex": str(shard),
+        },
+    ]
+
+def query_frontend_flags(
+    split_interval: str = "24h",
+    max_query_parallelism: int = 14,
+    max_retries: int = 3,
+    downstream_max_idle_conns: int = 100 )->list:
+    """
+    Query frontend flags, range queries are split in `split_interval` steps run at most `max_query_parallelism` at a time
+    """
+    return [
+        f"--query-range.split-interval={split_interval}",
+        f"--query-range.max-query-parallelism={max_query_parallelism}",
+        f"--query-range.max-retries-per-request={max_retries}",
+        "--query-range.align-range-with-step",
+        "--query-frontend.compress-responses",
+        f"--query-frontend.downstream-tripper-config=max_idle_conns_per_host: {downstream_max_idle_conns}",
+    ]
+
+def fullname(name: str, name_override: str = "")->str:
+    """
+    Resource name prefix of a bitnami thanos release
+    """
+    if name_override != "":
+        return name_override
+    return name if "thanos" in name else f"{name}-thanos"
+
+def query_url(name: str, namespace: str, name_override: str = "")->str:
+    """
+    In-cluster URL of the query component of a thanos_stack release
+    """
+    return f"http://{fullname(name, name_override)}-query.{namespace}.svc.cluster.local:9090"
+
+def query_frontend_url(name: str, namespace: str, name_override: str = "")->str:
+    """
+    In-cluster URL of the query frontend of a thanos_stack release
+    """
+    return f"http://{fullname(name, name_override)}-query-frontend.{namespace}.svc.cluster.local:9090"
+
+def datasource_url(name: str, namespace: str, values: dict)->str:
+    """
+    URL Grafana should query for a thanos_stack release with `values`, the query frontend when enabled
+    """
+    name_override = values.get("fullnameOverride") or ""
+    if (values.get("queryFrontend") or {}).get("enabled"):
+        return query_frontend_url(name, namespace, name_override)
+    return query_url(name, namespace, name_override)
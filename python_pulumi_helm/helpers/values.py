@@ -0,0 +1,146 @@
+"""
+Immutable, memoized Helm values trees
+
+Builders decorated with `memoize` return frozen trees that are shared between identical calls,
+so programs creating releases for many clusters keep a single copy of every repeated block.
+"""
+
+import functools
+import threading
+from collections import OrderedDict
+
+class FrozenDict(dict):
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is immutable, use thaw() to get a mutable copy")
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+    __ior__ = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), (dict(self),))
+
+class FrozenList(list):
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError(f"{type(self).__name__} is immutable, use thaw() to get a mutable copy")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _immutable
+    append = clear = extend = insert = pop = remove = reverse = sort = _immutable
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return (type(self), (list(self),))
+
+def freeze(obj):
+    if isinstance(obj, (FrozenDict, FrozenList)):
+        return obj
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return FrozenList(freeze(v) for v in obj)
+    return obj
+
+def thaw(obj):
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [thaw(v) for v in obj]
+    return obj
+
+def update_in(tree: dict, path: tuple, fn)->dict:
+    """
+    Copy of `tree` with the value at `path` replaced by `fn(current value or None)`
+
+    Only the dicts along `path` are copied ( missing ones are created ), so frozen trees can be updated
+    and untouched branches stay shared.
+    """
+    key, rest = path[0], path[1:]
+    current = tree.get(key) if tree is not None else None
+
+    updated = dict(tree) if tree is not None else {}
+    updated[key] = update_in(current, rest, fn) if len(rest) > 0 else fn(current)
+    return updated
+
+def assoc_in(tree: dict, path: tuple, value)->dict:
+    """
+    Copy of `tree` with `value` set at `path`, see `update_in`
+    """
+    return update_in(tree, path, lambda _: value)
+
+def structural_key(obj):
+    """
+    Hashable key of a values tree, equal for trees with the same structure, types and contents
+    """
+    if isinstance(obj, dict):
+        return (dict, tuple((k, structural_key(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple)):
+        return (list, tuple(structural_key(v) for v in obj))
+    if isinstance(obj, (set, frozenset)):
+        return (frozenset, frozenset(structural_key(v) for v in obj))
+    # The type is part of the key, otherwise True and 1 would share an entry
+    hash(obj)
+    return (type(obj), obj)
+
+def memoize(maxsize: int = 256):
+    """
+    Cache the frozen result of a values builder, keyed by its arguments, with LRU eviction
+
+    Lists and dicts are accepted as arguments. Calls with unhashable arguments ( e.g. Pulumi outputs
+    nested in unhashable objects ) bypass the cache.
+    """
+    def decorator(fn):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        stats = {"hits": 0, "misses": 0}
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                key = structural_key((args, sorted(kwargs.items())))
+            except TypeError:
+                return freeze(fn(*args, **kwargs))
+
+            with lock:
+                if key in cache:
+                    cache.move_to_end(key)
+                    stats["hits"] += 1
+                    return cache[key]
+
+            value = freeze(fn(*args, **kwargs))
+
+            with lock:
+                stats["misses"] += 1
+                value = cache.setdefault(key, value)
+                cache.move_to_end(key)
+                while len(cache) > maxsize:
+                    cache.popitem(last=False)
+
+            return value
+
+        def cache_info() -> dict:
+            with lock:
+                return {**stats, "maxsize": maxsize, "currsize": len(cache)}
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+                stats.update(hits=0, misses=0)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
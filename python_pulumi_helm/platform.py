@@ -0,0 +1,267 @@
+"""
+Platform bundle, deploys a set of addons from a single declarative spec
+
+    defaults:                 # passed to every addon accepting the argument
+      aws_region: eu-west-1
+      eks_cluster_name: main
+    addons:
+      cilium: {}
+      karpenter:
+        eks_sa_role_arn: arn:aws:iam::000000000000:role/karpenter
+        ...
+      ingress_internal:       # several instances of a factory, selected with `factory`
+        factory: ingress_nginx
+        public: false
+      loki:
+        enabled: false
+      opensearch:
+        await:                # see helpers.await_policy.AwaitPolicy
+          mode: deferred
+          workloads: [StatefulSet/opensearch-cluster-master]
+
+Every release only depends on the releases it actually needs ( see `DEPENDENCIES` ), so the
+Pulumi engine installs independent addons concurrently.
+"""
+
+import inspect
+import pulumi
+from . import releases
+from .helpers.await_policy import AwaitPolicy, DeferredChecks
+from .helpers.resources import parent_resource
+
+FACTORIES = {
+    "cilium": releases.cilium,
+    "metrics_server": releases.metrics_server,
+    "cluster_autoscaler": releases.cluster_autoscaler,
+    "aws_load_balancer_controller": releases.aws_load_balancer_controller,
+    "external_dns": releases.external_dns,
+    "aws_ebs_csi_driver": releases.aws_ebs_csi_driver,
+    "karpenter": releases.karpenter,
+    "ingress_nginx": releases.ingress_nginx,
+    "ingress_nginx_sharded": releases.ingress_nginx_sharded,
+    "argocd": releases.argocd,
+    "prometheus_stack": releases.prometheus_stack,
+    "thanos_stack": releases.thanos_stack,
+    "opensearch": releases.opensearch,
+    "loki": releases.loki,
+}
+
+# Factory -> [(required factory, argument enabling the requirement or None when always required)]
+DEPENDENCIES = {
+    "cilium": [],
+    # Pods need the CNI
+    "metrics_server": [("cilium", None)],
+    "cluster_autoscaler": [("cilium", None)],
+    "aws_load_balancer_controller": [("cilium", None)],
+    "external_dns": [("cilium", None)],
+    "aws_ebs_csi_driver": [("cilium", None)],
+    "karpenter": [("cilium", None)],
+    # The NLB is provisioned by the load balancer controller, Provisioner CRDs come from Karpenter
+    # and ServiceMonitor CRDs from the Prometheus stack
+    "ingress_nginx": [
+        ("cilium", None),
+        ("aws_load_balancer_controller", None),
+        ("karpenter", "karpenter_node_enabled"),
+        ("prometheus_stack", "metrics_enabled"),
+    ],
+    "ingress_nginx_sharded": [
+        ("cilium", None),
+        ("aws_load_balancer_controller", None),
+        ("karpenter", "karpenter_node_enabled"),
+        ("prometheus_stack", "metrics_enabled"),
+    ],
+    "argocd": [
+        ("cilium", None),
+        ("karpenter", "karpenter_node_enabled"),
+    ],
+    # Persistent volumes need the EBS CSI driver
+    "prometheus_stack": [
+        ("cilium", None),
+        ("aws_ebs_csi_driver", None),
+        ("karpenter", "karpenter_node_enabled"),
+    ],
+    "thanos_stack": [
+        ("cilium", None),
+        ("aws_ebs_csi_driver", None),
+        ("karpenter", "karpenter_node_enabled"),
+    ],
+    "opensearch": [
+        ("cilium", None),
+        ("aws_ebs_csi_driver", None),
+        ("karpenter", "karpenter_node_enabled"),
+    ],
+    "loki": [
+        ("cilium", None),
+        ("aws_ebs_csi_driver", None),
+        ("karpenter", "karpenter_node_enabled"),
+        ("prometheus_stack", "metrics_enabled"),
+    ],
+}
+
+# Spec keys consumed by the platform, not passed to the factories
+SPEC_KEYS = ("enabled", "factory", "depends_on", "await")
+
+def load_spec(spec)->dict:
+    """
+    Normalize a spec given as a dict or a YAML document
+    """
+    if isinstance(spec, str):
+        import yaml
+
+        spec = yaml.safe_load(spec) or {}
+
+    addons = {}
+    for name, addon in (spec.get("addons") or {}).items():
+        addon = dict(addon or {})
+        factory = addon.get("factory", name)
+        if factory not in FACTORIES:
+            raise ValueError(f"Unknown factory {factory} for addon {name}, expected one of {', '.join(FACTORIES)}")
+        addon["factory"] = factory
+        addons[name] = addon
+
+    return {
+        "defaults": dict(spec.get("defaults") or {}),
+        "addons": addons,
+    }
+
+def addon_arguments(spec: dict, name: str, deferred_checks: DeferredChecks = None)->dict:
+    """
+    Factory arguments of an addon, spec defaults accepted by the factory overridden by the addon settings
+
+    Deferred await policies add their checks to `deferred_checks`.
+    """
+    addon = spec["addons"][name]
+    params = inspect.signature(FACTORIES[addon["factory"]]).parameters
+
+    arguments = { k: v for k, v in spec["defaults"].items() if k in params }
+    arguments.update({ k: v for k, v in addon.items() if k not in SPEC_KEYS })
+
+    if "await" in addon:
+        arguments["await_policy"] = AwaitPolicy(**addon["await"], deferred_checks=deferred_checks)
+
+    return arguments
+
+def _argument(spec: dict, name: str, argument: str):
+    """
+    Value of a factory argument of an addon, read from the spec without building the await policy
+    """
+    addon = spec["addons"][name]
+    if argument in addon and argument not in SPEC_KEYS:
+        return addon[argument]
+
+    param = inspect.signature(FACTORIES[addon["factory"]]).parameters.get(argument)
+    if param is None:
+        return None
+    return spec["defaults"].get(argument, param.default)
+
+def dependency_graph(spec: dict)->dict:
+    """
+    Minimal dependency DAG of the enabled addons, as a dict of addon -> set of required addons
+
+    Requirements already implied by another requirement are dropped ( transitive reduction ).
+    """
+    enabled = [ name for name, addon in spec["addons"].items() if addon.get("enabled", True) ]
+    by_factory = {}
+    for name in enabled:
+        by_factory.setdefault(spec["addons"][name]["factory"], []).append(name)
+
+    graph = {}
+    for name in enabled:
+        requires = set()
+        for factory, argument in DEPENDENCIES[spec["addons"][name]["factory"]]:
+            if argument is None or _argument(spec, name, argument):
+                requires.update(by_factory.get(factory, []))
+        for dependency in spec["addons"][name].get("depends_on", []):
+            if dependency not in enabled:
+                raise ValueError(f"Addon {name} depends on {dependency}, which is not an enabled addon")
+            requires.add(dependency)
+        requires.discard(name)
+        graph[name] = requires
+
+    order = topological_order(graph)
+
+    ancestors = {}
+    for name in order:
+        ancestors[name] = set()
+        for dependency in graph[name]:
+            ancestors[name] |= { dependency } | ancestors[dependency]
+
+    return {
+        name: { d for d in requires if not any(d in ancestors[other] for other in requires if other != d) }
+        for name, requires in graph.items()
+    }
+
+def topological_order(graph: dict)->list:
+    """
+    Addons ordered so every addon comes after its requirements, ties keep the spec order
+    """
+    order = []
+    visiting = set()
+    done = set()
+
+    def visit(name, path):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Dependency cycle between addons: {' -> '.join(path + [name])}")
+        visiting.add(name)
+        for dependency in sorted(graph[name], key=list(graph).index):
+            visit(dependency, path + [name])
+        visiting.discard(name)
+        done.add(name)
+        order.append(name)
+
+    for name in graph:
+        visit(name, [])
+
+    return order
+
+def _resources(created)->list:
+    return list(created) if isinstance(created, (tuple, list)) else [created]
+
+class Platform(pulumi.ComponentResource):
+    """
+    Component grouping the releases of every enabled addon in `spec`, wired with the minimal `depends_on` lists
+
+    `releases` maps addon names to what their factory returned, `dependencies` holds the DAG used
+    and `readiness_checks` the checks of addons with a `workloads` or `deferred` await policy. Deferred
+    checks are created last and depend on every release of the platform. Resources depending on the
+    component wait for all of them.
+    """
+
+    def __init__(
+        self,
+        provider,
+        spec,
+        depends_on: list = [],
+        name: str = "platform",
+        opts: pulumi.ResourceOptions = None):
+
+        super().__init__("python-pulumi-helm:index:Platform", name, None, opts)
+
+        self.spec = load_spec(spec)
+        self.dependencies = dependency_graph(self.spec)
+        self.deferred_checks = DeferredChecks()
+        self.releases = {}
+
+        with parent_resource(self):
+            for addon in topological_order(self.dependencies):
+                factory = FACTORIES[self.spec["addons"][addon]["factory"]]
+                requires = [ r for d in self.dependencies[addon] for r in _resources(self.releases[d]) ]
+
+                self.releases[addon] = factory(
+                    provider=provider,
+                    depends_on=list(depends_on) + requires,
+                    **addon_arguments(self.spec, addon, self.deferred_checks),
+                )
+
+        created = [ r for addon in self.releases for r in _resources(self.releases[addon]) ]
+        self.readiness_checks = [ c for r in created for c in getattr(r, "readiness_checks", []) ]
+        self.readiness_checks += self.deferred_checks.create(depends_on=created)
+
+        self.register_outputs({
+            "releases": { addon: [ r.name for r in _resources(created) ] for addon, created in self.releases.items() },
+        })
+
+    def __getitem__(self, name: str):
+        return self.releases[name]
@@ -1,8 +1,131 @@
-import time
-from pulumi_kubernetes.helm.v3 import Release
+from __future__ import annotations
+from typing import TYPE_CHECKING
 from .helpers.resources import release
-import pulumi
-import yaml
+from .helpers import ingress_nginx as ingress_nginx_values
+from .helpers import karpenter as karpenter_nodes
+from .helpers import thanos as thanos_values
+from .helpers import prometheus as prometheus_values
+from .helpers.await_policy import AwaitPolicy
+from .helpers.serialization import dump_yaml
+from .helpers.values import memoize
+
+# Pulumi SDK and yaml modules are imported on first use, loading them costs seconds per program start
+if TYPE_CHECKING:
+    from pulumi_kubernetes.helm.v3 import Release
+
+# Charts installed as side releases, (repo, chart, version) ( promtail is installed from the `loki` repo )
+MEMCACHED_CHART = ("https://charts.bitnami.com/bitnami", "memcached", "6.6.2")
+PROMTAIL_CHART = ("https://grafana.github.io/helm-charts", "promtail", "6.15.1")
+
+@memoize()
+def _ingress_nginx_service_annotations(
+    name_suffix: str,
+    public: bool,
+    proxy_protocol: bool,
+    alb_resource_tags: dict,
+    ssl_enabled: bool,
+    acm_cert_arns: list[str],
+    target_node_labels: list[str],
+    target_type: str = "instance",
+    idle_timeout: int = 300,
+    cross_zone_enabled: bool = True,
+    healthcheck_interval: int = 5,
+    healthcheck_unhealthy_threshold: int = 2,
+    shutdown_grace_period: int = None )->dict:
+
+    service_annotations = {
+        "service.beta.kubernetes.io/aws-load-balancer-name": f"k8s-{name_suffix}",
+        "service.beta.kubernetes.io/aws-load-balancer-type": "external",
+        "service.beta.kubernetes.io/aws-load-balancer-scheme": "internet-facing" if public else "internal",
+        "service.beta.kubernetes.io/aws-load-balancer-backend-protocol": "tcp",
+        "service.beta.kubernetes.io/load-balancer-source-ranges": "0.0.0.0/0",
+        "service.beta.kubernetes.io/aws-load-balancer-manage-backend-security-group-rules": True,
+        "service.beta.kubernetes.io/aws-load-balancer-connection-idle-timeout": idle_timeout,
+        "service.beta.kubernetes.io/aws-load-balancer-attributes": f"load_balancing.cross_zone.enabled={str(cross_zone_enabled).lower()}",
+        # Health check options
+        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-timeout": 2,
+        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-healthy-threshold": 5,
+        # Target type, health check protocol and deregistration delay
+        **ingress_nginx_values.load_balancer_target(
+            target_type=target_type,
+            healthcheck_interval=healthcheck_interval,
+            healthcheck_unhealthy_threshold=healthcheck_unhealthy_threshold,
+            shutdown_grace_period=shutdown_grace_period,
+        )["annotations"],
+        # Proxy protocol options
+        "service.beta.kubernetes.io/aws-load-balancer-proxy-protocol": "*" if proxy_protocol else "",
+        # Additional AWS resource tags
+        "service.beta.kubernetes.io/aws-load-balancer-additional-resource-tags": ",".join([ f"{k}={v}" for k,v in alb_resource_tags.items() ]),
+    }
+
+    if ssl_enabled:
+        service_annotations.update({
+            # SSL options
+            "service.beta.kubernetes.io/aws-load-balancer-ssl-ports": 443,
+            "service.beta.kubernetes.io/aws-load-balancer-ssl-cert": ",".join(acm_cert_arns),
+            "service.beta.kubernetes.io/aws-load-balancer-ssl-negotiation-policy": "ELBSecurityPolicy-TLS13-1-2-2021-06",
+        })
+
+    if len(target_node_labels) > 0:
+        service_annotations.update({
+            "service.beta.kubernetes.io/aws-load-balancer-target-node-labels": ",".join(target_node_labels),
+        })
+
+    return service_annotations
+
+def _memcached_cache(
+    provider,
+    name: str,
+    namespace: str,
+    replicas: int,
+    cache_size_mb: int,
+    pod_labels: dict,
+    node_labels: dict = {},
+    skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
+    topology_aware_routing: bool = False,
+    depends_on: list = [] )->Release:
+    """
+    Memcached cluster behind a headless service, `cache_size_mb` is split across the replicas
+
+    Clients discover every pod through DNS SRV records and shard keys between them.
+    """
+    pod_cache_size_mb = -(-cache_size_mb // replicas)
+
+    return release(
+        name=name,
+        repo=MEMCACHED_CHART[0],
+        chart=MEMCACHED_CHART[1],
+        version=MEMCACHED_CHART[2],
+        namespace=namespace,
+        skip_await=skip_await,
+        await_policy=await_policy,
+        topology_aware_routing=topology_aware_routing,
+        depends_on=depends_on,
+        provider=provider,
+        timeout=600,
+        values={
+            "fullnameOverride": name,
+            "commonLabels": pod_labels,
+            "architecture": "high-availability",
+            "replicaCount": replicas,
+            "service": {
+                "clusterIP": "None"
+            },
+            "persistence": {
+                "enabled": False
+            },
+            "extraEnvVars": [
+                { "name": "MEMCACHED_CACHE_SIZE", "value": str(pod_cache_size_mb) },
+            ],
+            # Room for connections and slab overhead on top of the cache
+            "resources": {
+                "requests": { "memory": f"{pod_cache_size_mb * 5 // 4 + 64}Mi", "cpu": "250m" },
+                "limits": { "memory": f"{pod_cache_size_mb * 3 // 2 + 64}Mi" },
+            },
+            "affinity": karpenter_nodes.affinity(pod_labels, node_labels),
+        }
+    )
 
 def cilium(
     provider,
@@ -13,6 +136,7 @@ def cilium(
     repo: str = "https://helm.cilium.io",
     namespace: str = "kube-system",
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     cilium_release = release(
@@ -22,6 +146,7 @@ def cilium(
         repo=repo,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -62,6 +187,7 @@ def metrics_server(
     repo: str = "https://kubernetes-sigs.github.io/metrics-server",
     namespace: str = "kube-system",
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     metrics_server_release = release(
@@ -71,6 +197,7 @@ def metrics_server(
         repo=repo,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -100,6 +227,7 @@ def cluster_autoscaler(
     repo: str = "https://kubernetes.github.io/autoscaler",
     namespace: str = "default",
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     cluster_autoscaler_release = release(
@@ -109,6 +237,7 @@ def cluster_autoscaler(
         repo=repo,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -159,6 +288,7 @@ def aws_load_balancer_controller(
     repo: str = "https://aws.github.io/eks-charts",
     namespace: str = "default",
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     aws_load_balancer_controller_release = release(
@@ -168,6 +298,7 @@ def aws_load_balancer_controller(
         repo=repo,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
         depends_on=depends_on,
         provider=provider,
         #transformations=[tools.ignore_changes],
@@ -195,6 +326,7 @@ def external_dns(
     repo: str = "https://kubernetes-sigs.github.io/external-dns",
     namespace: str = "default",
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     external_dns_release = release(
@@ -204,6 +336,7 @@ def external_dns(
         repo=repo,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -234,6 +367,7 @@ def aws_ebs_csi_driver(
     repo: str = "https://kubernetes-sigs.github.io/aws-ebs-csi-driver",
     namespace: str = "default",
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     aws_ebs_csi_driver_release = release(
@@ -243,6 +377,7 @@ def aws_ebs_csi_driver(
         repo=repo,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -294,6 +429,7 @@ def karpenter(
     repo: str = "https://charts.karpenter.sh",
     namespace: str = "default",
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     karpenter_release = release(
@@ -303,6 +439,7 @@ def karpenter(
         repo=repo,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
         depends_on=depends_on,
         provider=provider,
         #transformations=[tools.ignore_changes],
@@ -330,160 +467,226 @@ def ingress_nginx(
     public: bool = True,
     proxy_protocol: bool = True,
     target_node_labels: list[str] = [],
+    lb_target_type: str = "instance",
+    lb_idle_timeout: int = 300,
+    lb_cross_zone_enabled: bool = True,
+    lb_healthcheck_interval: int = 5,
+    lb_healthcheck_unhealthy_threshold: int = 2,
+    controller_shutdown_grace_period: int = None,
+    access_log_enabled: bool = True,
+    access_log_format: str = "text",
+    access_log_buffer: str = "",
+    access_log_flush: str = "5s",
+    access_log_sample_rate: float = 1.0,
+    access_log_always_log_status: str = "^[45]",
+    access_log_skip_paths: list[str] = [],
+    gzip_level: int = 0,
+    brotli_level: int = 0,
+    compression_min_length: int = 1024,
+    proxy_buffering: bool = None,
+    proxy_buffer_size: str = "",
+    proxy_buffers_number: int = 0,
+    proxy_cache_enabled: bool = False,
+    proxy_cache_keys_zone_size: str = "64m",
+    proxy_cache_max_size: str = "1g",
+    proxy_cache_inactive: str = "10m",
     alb_resource_tags: dict = { "pulumi-provisioned" : "true" },
     metrics_enabled: bool = False,
     global_rate_limit_enabled: bool = False,
+    rate_limit_mode: str = "",
+    local_rate_limit_rps: int = 0,
+    local_rate_limit_key: str = "$binary_remote_addr",
+    local_rate_limit_zone_size: str = "10m",
+    local_rate_limit_expected_pods: int = 0,
+    memcached_expected_rps: int = 0,
+    memcached_replicas: int = None,
+    memcached_threads: int = None,
+    memcached_max_connections: int = None,
+    memcached_cache_size_mb: int = None,
+    memcached_resources: dict = None,
+    memcached_pool_size: int = 50,
+    memcached_autoscaling_enabled: bool = False,
+    memcached_autoscaling_min_replicas: int = 2,
+    memcached_autoscaling_max_replicas: int = 6,
+    performance_profile: str = "default",
+    controller_config: dict = {},
+    controller_resources: dict = {},
+    controller_kind: str = "DaemonSet",
+    controller_replicas: int = 2,
+    controller_min_available: int = 1,
+    autoscaling_enabled: bool = False,
+    autoscaling_min_replicas: int = 2,
+    autoscaling_max_replicas: int = 10,
+    autoscaling_target_cpu: int = 70,
+    autoscaling_target_rps: int = 0,
+    autoscaling_prometheus_url: str = "",
     karpenter_node_enabled: bool = False,
     karpenter_node_provider_name: str = "default",
+    karpenter_node_api_version: str = "v1alpha5",
     name: str = "ingress-nginx",
     chart: str = "ingress-nginx",
     version: str = "4.2.5",
     repo: str = "https://kubernetes.github.io/ingress-nginx",
     namespace: str = "default",
+    topology_aware_routing: bool = False,
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
-    karpenter_provisioner_obj = {
-        "apiVersion": "karpenter.sh/v1alpha5",
-        "kind": "Provisioner",
-        "metadata": {
-            "labels": {
-                "app": f"mc-{name}",
-                "ingress": name,
-            },
-            "name": f"mc-{name}",
-        },
-        "spec": {
-            "consolidation": {
-                "enabled": True,
-            },
-            "labels": {
-                "app": f"mc-{name}",
-                "ingress": name,
-            },
-            "taints": [],
-            "providerRef": {
-                "name": karpenter_node_provider_name,
-            },
-            "requirements": [
-                { "key": "karpenter.k8s.aws/instance-category", "operator": "In", "values": [ "t" ] },
-                { "key": "kubernetes.io/arch", "operator": "In", "values": [ "arm64" ] },
-                { "key": "kubernetes.io/os", "operator": "In", "values": [ "linux" ] },
-                { "key": "karpenter.sh/capacity-type", "operator": "In", "values": [ "spot", "on-demand" ] },
-            ],
-        },
-    }
-
-    karpenter_node_affinity = {
-        "nodeAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": {
-                "nodeSelectorTerms": [
-                    {
-                        "matchExpressions": [
-                            {
-                                "key": "app",
-                                "operator": "In",
-                                "values": [ f"mc-{name}" ]
-                            },
-                            {
-                                "key": "ingress",
-                                "operator": "In",
-                                "values": [ name ]
-                            }
-                        ]
-                    }
-                ]
-            }
-        }
-    }
-    
-    default_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "labelSelector": {
-                        "matchLabels": {
-                            "app": f"mc-{name}",
-                            "ingress": name,
-                        }
-                    },
-                    "topologyKey": "kubernetes.io/hostname"
-                }
-            ]
-        }
-    }
-    
-    if karpenter_node_enabled:
-        default_affinity.update(karpenter_node_affinity)
+    karpenter_provisioner_obj = karpenter_nodes.provisioner(
+        name=f"mc-{name}",
+        labels={ "app": f"mc-{name}", "ingress": name },
+        instance_category=["t"],
+        instance_arch=["arm64"],
+        instance_capacity_type=["spot", "on-demand"],
+        provider_name=karpenter_node_provider_name,
+        api_version=karpenter_node_api_version,
+    )
 
-    service_annotations = {
-        "service.beta.kubernetes.io/aws-load-balancer-name": f"k8s-{name_suffix}",
-        "service.beta.kubernetes.io/aws-load-balancer-type": "external",
-        "service.beta.kubernetes.io/aws-load-balancer-scheme": "internet-facing" if public else "internal",
-        "service.beta.kubernetes.io/aws-load-balancer-nlb-target-type": "instance",
-        "service.beta.kubernetes.io/aws-load-balancer-backend-protocol": "tcp",
-        "service.beta.kubernetes.io/load-balancer-source-ranges": "0.0.0.0/0",
-        "service.beta.kubernetes.io/aws-load-balancer-manage-backend-security-group-rules": True,
-        "service.beta.kubernetes.io/aws-load-balancer-connection-idle-timeout": 300,
-        "service.beta.kubernetes.io/aws-load-balancer-attributes": "load_balancing.cross_zone.enabled=true",
-        "service.beta.kubernetes.io/aws-load-balancer-target-group-attributes": "deregistration_delay.timeout_seconds=10,deregistration_delay.connection_termination.enabled=true",
-        # Health check options
-        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-protocol": "tcp",
-        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-path": "/healthz",
-        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-timeout": 2,
-        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-healthy-threshold": 5,
-        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-unhealthy-threshold": 2,
-        "service.beta.kubernetes.io/aws-load-balancer-healthcheck-interval": 5,
-        # Proxy protocol options
-        "service.beta.kubernetes.io/aws-load-balancer-proxy-protocol": "*" if proxy_protocol else "",
-        # Additional AWS resource tags
-        "service.beta.kubernetes.io/aws-load-balancer-additional-resource-tags": ",".join([ f"{k}={v}" for k,v in alb_resource_tags.items() ]),
-    }
+    default_affinity = karpenter_nodes.affinity(
+        pod_labels={ "app": f"mc-{name}", "ingress": name },
+        node_labels={ "app": f"mc-{name}", "ingress": name } if karpenter_node_enabled else {},
+    )
 
-    ssl_enabled_service_annotations = {
-        # SSL options
-        "service.beta.kubernetes.io/aws-load-balancer-ssl-ports": 443,
-        "service.beta.kubernetes.io/aws-load-balancer-ssl-cert": ",".join(acm_cert_arns),
-        "service.beta.kubernetes.io/aws-load-balancer-ssl-negotiation-policy": "ELBSecurityPolicy-TLS13-1-2-2021-06",
-    }
+    service_annotations = _ingress_nginx_service_annotations(
+        name_suffix=name_suffix,
+        public=public,
+        proxy_protocol=proxy_protocol,
+        alb_resource_tags=alb_resource_tags,
+        ssl_enabled=ssl_enabled,
+        acm_cert_arns=acm_cert_arns,
+        target_node_labels=target_node_labels,
+        target_type=lb_target_type,
+        idle_timeout=lb_idle_timeout,
+        cross_zone_enabled=lb_cross_zone_enabled,
+        healthcheck_interval=lb_healthcheck_interval,
+        healthcheck_unhealthy_threshold=lb_healthcheck_unhealthy_threshold,
+        shutdown_grace_period=controller_shutdown_grace_period,
+    )
 
-    target_node_labels_service_annotations = {
-        "service.beta.kubernetes.io/aws-load-balancer-target-node-labels": ",".join(target_node_labels),
-    }
+    # Controller shutdown matching the target group deregistration
+    controller_shutdown = ingress_nginx_values.load_balancer_target(
+        target_type=lb_target_type,
+        healthcheck_interval=lb_healthcheck_interval,
+        healthcheck_unhealthy_threshold=lb_healthcheck_unhealthy_threshold,
+        shutdown_grace_period=controller_shutdown_grace_period,
+    )["controller"]
     
     configmap_settings = {
         "ssl-redirect": False,
         "redirect-to-https": True,
         "use-forwarded-headers": True,
         "use-proxy-protocol": True,
-        "skip-access-log-urls": "/healthz,/healthz/",
         "no-tls-redirect-locations": "/healthz,/healthz/",
-        "log-format-upstream": '$remote_addr - $host [$time_local] "$request" $status $body_bytes_sent "$http_referer" "$http_user_agent" $request_length $request_time [$proxy_upstream_name] [$proxy_alternative_upstream_name] $upstream_addr $upstream_response_length $upstream_response_time $upstream_status $req_id',
         "server-snippet": "if ($proxy_protocol_server_port != '443'){ return 301 https://$host$request_uri; }",
     }
+
+    ingress_nginx_values.merge_config(configmap_settings, ingress_nginx_values.access_log_config(
+        enabled=access_log_enabled,
+        log_format=access_log_format,
+        buffer=access_log_buffer,
+        flush=access_log_flush,
+        sample_rate=access_log_sample_rate,
+        always_log_status=access_log_always_log_status,
+        skip_paths=access_log_skip_paths,
+    ))
+
+    configmap_settings.update(ingress_nginx_values.compression_config(
+        gzip_level=gzip_level,
+        brotli_level=brotli_level,
+        min_length=compression_min_length,
+    ))
+
+    # Responses are only cached when buffered
+    if proxy_cache_enabled and proxy_buffering is False:
+        raise ValueError("Proxy cache requires proxy buffering")
+    if proxy_buffering is not None or proxy_cache_enabled:
+        configmap_settings["proxy-buffering"] = "on" if proxy_buffering is not False else "off"
+    if proxy_buffer_size != "":
+        configmap_settings["proxy-buffer-size"] = proxy_buffer_size
+    if proxy_buffers_number > 0:
+        configmap_settings["proxy-buffers-number"] = str(proxy_buffers_number)
+
+    controller_proxy_cache = {}
+    if proxy_cache_enabled:
+        proxy_cache = ingress_nginx_values.proxy_cache(
+            keys_zone_size=proxy_cache_keys_zone_size,
+            max_size=proxy_cache_max_size,
+            inactive=proxy_cache_inactive,
+        )
+        ingress_nginx_values.merge_config(configmap_settings, proxy_cache["config"])
+        controller_proxy_cache = proxy_cache["controller"]
+
+    profile = ingress_nginx_values.performance_profile(performance_profile)
+    # Explicit ConfigMap settings and resources win over the profile
+    configmap_settings.update(profile["config"])
+    configmap_settings.update(controller_config)
+    controller_resources = controller_resources if len(controller_resources) > 0 else profile["resources"]
+
+    controller_scaling = ingress_nginx_values.controller_scaling(
+        release_name=name,
+        ingress_class_controller=f"k8s.io/ingress-nginx-{name_suffix}",
+        kind=controller_kind,
+        replicas=controller_replicas,
+        min_available=controller_min_available,
+        autoscaling_enabled=autoscaling_enabled,
+        autoscaling_min_replicas=autoscaling_min_replicas,
+        autoscaling_max_replicas=autoscaling_max_replicas,
+        autoscaling_target_cpu=autoscaling_target_cpu,
+        autoscaling_target_rps=autoscaling_target_rps,
+        autoscaling_prometheus_url=autoscaling_prometheus_url,
+    )
     
     global_rate_limit_configmap_settings = {
         #"http-snippet": "limit_req_zone ${request_method}-${request_uri}-${http_x_custom_header} zone=default:10m rate=50r/s;",
         "global-rate-limit-status-code": 429,
         "global-rate-limit-memcached-host": f"mc-{name}",
         "global-rate-limit-memcached-port": 11211,
+        "global-rate-limit-memcached-pool-size": memcached_pool_size,
     }
 
-    if ssl_enabled:
-        service_annotations.update(ssl_enabled_service_annotations)
-
-    if len(target_node_labels) > 0:
-        service_annotations.update(target_node_labels_service_annotations)
+    # Rate limiting modes: global ( memcached, accurate ), local ( per pod nginx limit_req, no round trip ) or both
+    rate_limit_mode = rate_limit_mode if rate_limit_mode != "" else ("global" if global_rate_limit_enabled else "none")
+    if rate_limit_mode not in ingress_nginx_values.RATE_LIMIT_MODES:
+        raise ValueError(f"Unknown rate limit mode {rate_limit_mode}, expected one of {', '.join(ingress_nginx_values.RATE_LIMIT_MODES)}")
+    global_rate_limit_enabled = rate_limit_mode in ("global", "hybrid")
+
+    controller_pods = ingress_nginx_values.controller_pods(controller_kind, controller_replicas, autoscaling_enabled, autoscaling_max_replicas)
+
+    # Explicit memcached_* arguments win over the sizing derived from memcached_expected_rps
+    memcached_sizing = ingress_nginx_values.MEMCACHED_DEFAULTS
+    if memcached_expected_rps > 0:
+        memcached_sizing = ingress_nginx_values.memcached_sizing(
+            expected_rps=memcached_expected_rps,
+            controller_pods=controller_pods,
+            pool_size=memcached_pool_size,
+        )
+    memcached_replicas = memcached_sizing["replicas"] if memcached_replicas is None else memcached_replicas
+    memcached_threads = memcached_sizing["threads"] if memcached_threads is None else memcached_threads
+    memcached_max_connections = memcached_sizing["max_connections"] if memcached_max_connections is None else memcached_max_connections
+    memcached_cache_size_mb = memcached_sizing["cache_size_mb"] if memcached_cache_size_mb is None else memcached_cache_size_mb
+    memcached_resources = memcached_sizing["resources"] if memcached_resources is None else memcached_resources
+
+    if rate_limit_mode in ("local", "hybrid"):
+        local_rate_limit_configmap_settings = ingress_nginx_values.local_rate_limit_config(
+            rps=local_rate_limit_rps,
+            key=local_rate_limit_key,
+            zone_size=local_rate_limit_zone_size,
+            expected_pods=local_rate_limit_expected_pods,
+        )
+        ingress_nginx_values.merge_config(configmap_settings, local_rate_limit_configmap_settings)
 
     if global_rate_limit_enabled:
         configmap_settings.update(global_rate_limit_configmap_settings)
         memcached_release = release(
             name=f"mc-{name}",
-            chart="memcached",
-            version="6.6.2",
-            repo="https://charts.bitnami.com/bitnami",
+            repo=MEMCACHED_CHART[0],
+            chart=MEMCACHED_CHART[1],
+            version=MEMCACHED_CHART[2],
             namespace=namespace,
             skip_await=skip_await,
+            await_policy=await_policy.without_workloads() if await_policy else None,
+            topology_aware_routing=topology_aware_routing,
             depends_on=depends_on,
             provider=provider,
             timeout=600,
@@ -506,19 +709,18 @@ def ingress_nginx(
                 "persistence": {
                     "enabled": False
                 },
-                "resources": {
-                    "limits": {},
-                    "requests": {
-                        "memory": "256Mi",
-                        "cpu": "250m"
-                    }
-                },
+                "extraEnvVars": [
+                    { "name": "MEMCACHED_CACHE_SIZE", "value": str(memcached_cache_size_mb) },
+                    { "name": "MEMCACHED_MAX_CONNECTIONS", "value": str(memcached_max_connections) },
+                    { "name": "MEMCACHED_THREADS", "value": str(memcached_threads) },
+                ],
+                "resources": memcached_resources,
                 "architecture": "high-availability",
-                "replicaCount": 3,
+                "replicaCount": memcached_replicas,
                 "autoscaling": {
-                    "enabled": False,
-                    "minReplicas": 2,
-                    "maxReplicas": 6,
+                    "enabled": memcached_autoscaling_enabled,
+                    "minReplicas": memcached_autoscaling_min_replicas,
+                    "maxReplicas": max(memcached_autoscaling_max_replicas, memcached_replicas),
                     "targetCPU": 50,
                     "targetMemory": 50
                 },
@@ -557,6 +759,8 @@ def ingress_nginx(
         repo=repo,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
+        topology_aware_routing=topology_aware_routing,
         depends_on=depends_on,
         provider=provider,
         timeout=600,
@@ -565,7 +769,9 @@ def ingress_nginx(
                 "enabled": True
             },
             "controller": {
-                "kind": "DaemonSet",
+                **controller_scaling,
+                **controller_shutdown,
+                **controller_proxy_cache,
                 "healthCheckPath": "/healthz",
                 "lifecycle": {
                     "preStop": {
@@ -587,6 +793,8 @@ def ingress_nginx(
                 },
                 "electionID": f"ingress-controller-{name_suffix}-leader",
                 "config": configmap_settings,
+                # Empty resources keep the chart defaults
+                "resources": controller_resources,
                 "containerPort": {
                     "http": 80,
                     "https": 443,
@@ -632,6 +840,37 @@ def ingress_nginx(
 
     return ingress_nginx_release
 
+def ingress_nginx_sharded(
+    provider,
+    shards: int = 2,
+    name_suffix: str = "default",
+    name: str = "ingress-nginx",
+    shard_overrides: dict = {},
+    depends_on: list = [],
+    **kwargs )->list[Release]:
+    """
+    `shards` independent ingress_nginx controllers, each with its own load balancer, ingress class and memcached
+
+    Shard `i` is named `<name>-<i>` with ingress class `nginx-<name_suffix>-<i>`; hosts are assigned to
+    classes with `helpers.ingress_nginx.assign_hosts`. `shard_overrides` maps shard indexes to extra
+    `ingress_nginx` arguments, e.g. bigger controllers for a dedicated tenant. Other arguments are passed
+    to every shard.
+    """
+    unknown = set(shard_overrides) - set(range(shards))
+    if unknown:
+        raise ValueError(f"Overrides for unknown shards {', '.join(map(str, sorted(unknown)))}")
+
+    return [
+        ingress_nginx(
+            provider=provider,
+            name_suffix=suffix,
+            name=f"{name}-{shard}",
+            depends_on=depends_on,
+            **{ **kwargs, **shard_overrides.get(shard, {}) },
+        )
+        for shard, suffix in enumerate(ingress_nginx_values.shard_suffixes(name_suffix, shards))
+    ]
+
 def argocd(
     provider,
     ingress_hostname: str,
@@ -648,6 +887,7 @@ def argocd(
     argocd_plugins_enabled: bool = False,
     karpenter_node_enabled: bool = False,
     karpenter_node_provider_name: str = "default",
+    karpenter_node_api_version: str = "v1alpha5",
     karpenter_provisioner_controller_instance_category: list[str] = ["t"],
     karpenter_provisioner_controller_instance_arch: list[str] = ["amd64"],
     karpenter_provisioner_controller_instance_capacity_type: list[str] = ["spot"],
@@ -661,7 +901,9 @@ def argocd(
     version: str = "5.46.0",
     repo: str = "https://argoproj.github.io/argo-helm",
     namespace: str = "default",
+    topology_aware_routing: bool = False,
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     plugin_objs = [
@@ -678,62 +920,24 @@ def argocd(
     ]
 
     karpenter_provisioner_objs = [
-        {
-            "apiVersion": "karpenter.sh/v1alpha5",
-            "kind": "Provisioner",
-            "metadata": {
-                "labels": {
-                    "app": "argo-cd",
-                },
-                "name": "argo-cd",
-            },
-            "spec": {
-                "consolidation": {
-                    "enabled": True,
-                },
-                "labels": {
-                    "app": "argo-cd",
-                },
-                "taints": [],
-                "providerRef": {
-                    "name": karpenter_node_provider_name,
-                },
-                "requirements": [
-                    { "key": "karpenter.k8s.aws/instance-category", "operator": "In", "values": karpenter_provisioner_controller_instance_category },
-                    { "key": "kubernetes.io/arch", "operator": "In", "values": karpenter_provisioner_controller_instance_arch },
-                    { "key": "kubernetes.io/os", "operator": "In", "values": [ "linux" ] },
-                    { "key": "karpenter.sh/capacity-type", "operator": "In", "values": karpenter_provisioner_controller_instance_capacity_type },
-                ],
-            },
-        },
-        {
-            "apiVersion": "karpenter.sh/v1alpha5",
-            "kind": "Provisioner",
-            "metadata": {
-                "labels": {
-                    "app": "redis",
-                },
-                "name": "redis",
-            },
-            "spec": {
-                "consolidation": {
-                    "enabled": True,
-                },
-                "labels": {
-                    "app": "redis",
-                },
-                "taints": [],
-                "providerRef": {
-                    "name": karpenter_node_provider_name,
-                },
-                "requirements": [
-                    { "key": "karpenter.k8s.aws/instance-category", "operator": "In", "values": karpenter_provisioner_redis_instance_category },
-                    { "key": "kubernetes.io/arch", "operator": "In", "values": karpenter_provisioner_redis_instance_arch },
-                    { "key": "kubernetes.io/os", "operator": "In", "values": [ "linux" ] },
-                    { "key": "karpenter.sh/capacity-type", "operator": "In", "values": karpenter_provisioner_redis_instance_capacity_type },
-                ],
-            },
-        },
+        karpenter_nodes.provisioner(
+            name="argo-cd",
+            labels={ "app": "argo-cd" },
+            instance_category=karpenter_provisioner_controller_instance_category,
+            instance_arch=karpenter_provisioner_controller_instance_arch,
+            instance_capacity_type=karpenter_provisioner_controller_instance_capacity_type,
+            provider_name=karpenter_node_provider_name,
+            api_version=karpenter_node_api_version,
+        ),
+        karpenter_nodes.provisioner(
+            name="redis",
+            labels={ "app": "redis" },
+            instance_category=karpenter_provisioner_redis_instance_category,
+            instance_arch=karpenter_provisioner_redis_instance_arch,
+            instance_capacity_type=karpenter_provisioner_redis_instance_capacity_type,
+            provider_name=karpenter_node_provider_name,
+            api_version=karpenter_node_api_version,
+        ),
     ]
 
     extra_objects = []
@@ -764,23 +968,7 @@ def argocd(
         }
     ]
 
-    karpenter_provisioner_affinity_redis = {
-        "nodeAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": {
-                "nodeSelectorTerms": [
-                    {
-                        "matchExpressions": [
-                            {
-                                "key": "app",
-                                "operator": "In",
-                                "values": ["redis"]
-                            }
-                        ],
-                    },
-                ],
-            },
-        },
-    }
+    karpenter_provisioner_affinity_redis = karpenter_nodes.node_affinity({ "app": "redis" })
 
     argocd_release = release(
         name=name,
@@ -790,6 +978,8 @@ def argocd(
         namespace=namespace,
         timeout=600,
         skip_await=skip_await,
+        await_policy=await_policy,
+        topology_aware_routing=topology_aware_routing,
         depends_on=depends_on,
         provider=provider,
         values=      {
@@ -993,12 +1183,23 @@ def prometheus_stack(
     storage_class_name: str = "ebs",
     eks_sa_role_arn: str = "",
     thanos_enabled: bool = False,
+    thanos_datasource_url: str = "http://thanos-stack-query.prometheus.svc.cluster.local:9090",
+    thanos_release: Release = None,
     prometheus_tsdb_retention: str = "30d",
+    prometheus_scrape_interval: str = "15s",
+    prometheus_scrape_timeout: str = "14s",
     prometheus_external_label_env: str = "dev",
     prometheus_crds_enabled: bool = True,
-    resources_prometheus: dict = { "requests": { "cpu": "1000m", "memory": "2048Mi" }, "limits": { "cpu": "1000m", "memory": "2048Mi" } },
+    resources_prometheus: dict = None,
+    prometheus_mode: str = "server",
+    prometheus_replicas: int = 3,
+    prometheus_shards: int = 1,
+    prometheus_expected_series: int = 0,
+    prometheus_storage_size: str = None,
+    remote_write_urls: list[str] = [],
     karpenter_node_enabled: bool = False,
     karpenter_node_provider_name: str = "default",
+    karpenter_node_api_version: str = "v1alpha5",
     obj_storage_bucket: str = "",
     name_override: str = "prom-stack",
     name: str = "kube-prometheus-stack",
@@ -1007,6 +1208,7 @@ def prometheus_stack(
     repo: str = "https://prometheus-community.github.io/helm-charts",
     namespace: str = "default",
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
     s3_objstore_config = {
@@ -1018,7 +1220,7 @@ def prometheus_stack(
         }
     }
 
-    s3_objstore_config_str = yaml.dump(s3_objstore_config, default_flow_style=False)
+    s3_objstore_config_str = dump_yaml(s3_objstore_config)
 
     sidecar_containers = [
         {
@@ -1062,69 +1264,59 @@ def prometheus_stack(
         }
     ]
 
-    karpenter_provisioner_obj = {
-        "apiVersion": "karpenter.sh/v1alpha5",
-        "kind": "Provisioner",
-        "metadata": {
-            "labels": {
-                "app": "prometheus"
-            },
-            "name": "prometheus"
-        },
-        "spec": {
-            "consolidation": {
-                "enabled": False
-            },
-            "ttlSecondsAfterEmpty": 30,
-            "ttlSecondsUntilExpired": 2592000,
-            "labels": {
-                "karpenter": "enabled",
-                "app": "prometheus"
-            },
-            "taints": [],
-            "providerRef": {
-                "name": karpenter_node_provider_name
-            },
-            "requirements": [
-                { "key": "karpenter.k8s.aws/instance-category", "operator": "In", "values": ["t"] },
-                { "key": "kubernetes.io/arch", "operator": "In", "values": ["amd64", "arm64"] },
-                { "key": "kubernetes.io/os", "operator": "In", "values": ["linux"] },
-                { "key": "karpenter.sh/capacity-type", "operator": "In", "values": ["on-demand"] }
-            ]
-        }
-    }
+    karpenter_provisioner_obj = karpenter_nodes.provisioner(
+        name="prometheus",
+        labels={ "karpenter": "enabled", "app": "prometheus" },
+        metadata_labels={ "app": "prometheus" },
+        instance_category=["t"],
+        instance_arch=["amd64", "arm64"],
+        instance_capacity_type=["on-demand"],
+        provider_name=karpenter_node_provider_name,
+        api_version=karpenter_node_api_version,
+        consolidation=False,
+        ttl_seconds_after_empty=30,
+        ttl_seconds_until_expired=2592000,
+    )
 
-    karpenter_provisioner_affinity = {
-        "nodeAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": {
-                "nodeSelectorTerms": [
-                    {
-                        "matchExpressions": [
-                            { "key": "app", "operator": "In", "values": ["prometheus"] }
-                        ]
-                    }
-                ]
-            }
-        },
-    }
+    prom_server_affinity = karpenter_nodes.affinity(
+        pod_labels={ "app": "prometheus" },
+        node_labels={ "app": "prometheus" } if karpenter_node_enabled else {},
+    )
 
-    prom_server_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "topologyKey": "kubernetes.io/hostname",
-                    "labelSelector": {
-                        "matchLabels": {
-                            "app": "prometheus"
-                        }
-                    }
-                }
-            ]
-        }
-    }
-    
-    if karpenter_node_enabled:
-        prom_server_affinity.update(karpenter_provisioner_affinity)
+    # Agents only scrape and remote write, they don't write the TSDB blocks the Thanos sidecar uploads
+    if prometheus_mode not in prometheus_values.PROMETHEUS_MODES:
+        raise ValueError(f"Unknown Prometheus mode {prometheus_mode}, expected one of {', '.join(prometheus_values.PROMETHEUS_MODES)}")
+    if prometheus_mode == "agent" and thanos_enabled:
+        raise ValueError("Prometheus agents can't run the Thanos sidecar, use remote write instead")
+    if prometheus_mode == "agent" and len(remote_write_urls) == 0:
+        raise ValueError("Prometheus agents require at least one remote write URL")
+    if prometheus_values.duration_seconds(prometheus_scrape_timeout) > prometheus_values.duration_seconds(prometheus_scrape_interval):
+        raise ValueError(f"Scrape timeout {prometheus_scrape_timeout} can't be longer than the scrape interval {prometheus_scrape_interval}")
+
+    # Scrape targets are split between shards ( hashmod of the target address ), each with its own replicas
+    # Explicit resources_prometheus and prometheus_storage_size win over the sizing derived from prometheus_expected_series
+    remote_write_queue_config = prometheus_values.queue_config()
+    prometheus_sizing = prometheus_values.SIZING_DEFAULTS
+    if prometheus_expected_series > 0:
+        prometheus_sizing = prometheus_values.sizing(
+            expected_series=prometheus_expected_series,
+            shards=prometheus_shards,
+            mode=prometheus_mode,
+            scrape_interval=prometheus_scrape_interval,
+            retention=prometheus_tsdb_retention,
+        )
+        prometheus_shards = prometheus_sizing["shards"]
+        remote_write_queue_config = prometheus_sizing["queue_config"]
+    resources_prometheus = prometheus_sizing["resources"] if resources_prometheus is None else resources_prometheus
+    prometheus_storage_size = prometheus_sizing["storage"] if prometheus_storage_size is None else prometheus_storage_size
+
+    # Grafana queries the thanos_stack release, through its query frontend when enabled
+    if thanos_release is not None:
+        import pulumi
+
+        thanos_datasource_url = pulumi.Output.all(thanos_release.name, thanos_release.namespace, thanos_release.values).apply(
+            lambda args: thanos_values.datasource_url(args[0], args[1], args[2] or {})
+        )
 
     prometheus_stack_release = release(
         name=name,
@@ -1134,6 +1326,7 @@ def prometheus_stack(
         namespace=namespace,
         timeout=600,
         skip_await=skip_await,
+        await_policy=await_policy,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -1151,6 +1344,7 @@ def prometheus_stack(
             },
             "prometheus": {
                 "enabled": True,
+                "agentMode": prometheus_mode == "agent",
                 "serviceAccount": {
                     "create": True,
                     "annotations": {
@@ -1192,7 +1386,8 @@ def prometheus_stack(
                     "tls": []
                 },
                 "prometheusSpec": {
-                    "replicas": 3,
+                    "replicas": prometheus_replicas,
+                    "shards": max(1, prometheus_shards),
                     "replicaExternalLabelName": "prometheus_replica",
                     "prometheusExternalLabelName": "prometheus_instance",
                     "retention": prometheus_tsdb_retention,
@@ -1201,8 +1396,8 @@ def prometheus_stack(
                     "externalLabels": {
                         "env": "dev"
                     },
-                    "scrapeInterval": "15s",
-                    "scrapeTimeout": "14s",
+                    "scrapeInterval": prometheus_scrape_interval,
+                    "scrapeTimeout": prometheus_scrape_timeout,
                     "serviceMonitorSelector": {},
                     "serviceMonitorNamespaceSelector": {},
                     "serviceMonitorSelectorNilUsesHelmValues": False,
@@ -1210,6 +1405,9 @@ def prometheus_stack(
                     "podMonitorNamespaceSelector": {},
                     "podMonitorSelectorNilUsesHelmValues": False,
                     "containers": sidecar_containers if thanos_enabled else [],
+                    "remoteWrite": [
+                        { "url": url, "queueConfig": remote_write_queue_config } for url in remote_write_urls
+                    ],
                     "resources": resources_prometheus,
                     "affinity": prom_server_affinity,
                     "tolerations": [],
@@ -1247,7 +1445,7 @@ def prometheus_stack(
                                 "accessModes": ["ReadWriteOnce"],
                                 "resources": {
                                     "requests": {
-                                        "storage": "20Gi"
+                                        "storage": prometheus_storage_size
                                     }
                                 }
                             }
@@ -1317,8 +1515,8 @@ def prometheus_stack(
                         "name": "thanos",
                         "type": "prometheus",
                         "access": "proxy",
-                        # Depends on the value of fullnameOverride in the Thanos Stack release
-                        "url": "http://thanos-stack-query.prometheus.svc.cluster.local:9090",
+                        # Thanos query, or its query frontend ( see helpers.thanos.query_frontend_url )
+                        "url": thanos_datasource_url,
                         "isDefault": False
                     }
                 ]
@@ -1344,100 +1542,74 @@ def thanos_stack(
     compactor_retention_resolution_raw: str = "30d",
     compactor_retention_resolution_5m: str = "90d",
     compactor_retention_resolution_1h: str = "1y",
+    compactor_consistency_delay: str = "30m",
+    compactor_concurrency: int = 1,
+    compactor_downsample_concurrency: int = 1,
+    compactor_block_sync_concurrency: int = 20,
+    compactor_delete_delay: str = "48h",
+    compactor_persistence_size: str = "8Gi",
+    compactor_storage_class_name: str = "",
+    compactor_resources: dict = { "requests": { "memory": "128Mi", "cpu": "200m" }, "limits": { "memory": "256Mi", "cpu": "500m" } },
+    compactor_shards: int = 1,
+    compactor_shard_labels: list[str] = [ "env", "prometheus_instance", "prometheus_replica" ],
+    prometheus_release: Release = None,
+    prometheus_name_override: str = "prom-stack",
+    prometheus_namespace: str = "prometheus",
+    store_discovery: str = "static",
+    query_frontend_enabled: bool = False,
+    query_frontend_replicas: int = 2,
+    query_frontend_split_interval: str = "24h",
+    query_frontend_max_query_parallelism: int = 14,
+    query_frontend_downstream_max_idle_conns: int = 100,
+    query_frontend_cache: str = "in-memory",
+    query_frontend_cache_size_mb: int = 512,
+    query_frontend_cache_ttl: str = "24h",
+    query_frontend_memcached_replicas: int = 3,
+    storegateway_replicas: int = 3,
+    storegateway_persistence_size: str = "8Gi",
+    storegateway_index_cache: str = "none",
+    storegateway_index_cache_size_mb: int = 250,
+    storegateway_chunk_cache: str = "none",
+    storegateway_chunk_cache_size_mb: int = 512,
+    storegateway_memcached_replicas: int = 3,
+    storegateway_hash_shards: int = 1,
+    storegateway_time_partitions: list[dict] = [],
     karpenter_node_enabled: bool = False,
     karpenter_node_provider_name: str = "default",
+    karpenter_node_api_version: str = "v1alpha5",
     name_override: str = "",
     name: str = "thanos",
     chart: str = "thanos",
     version: str = "12.13.1",
     repo: str = "https://charts.bitnami.com/bitnami",
     namespace: str = "default",
+    topology_aware_routing: bool = False,
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
-    karpenter_provisioner_obj = {
-        "apiVersion": "karpenter.sh/v1alpha5",
-        "kind": "Provisioner",
-        "metadata": {
-            "labels": {
-                "app": "thanos"
-            },
-            "name": "thanos"
-        },
-        "spec": {
-            "consolidation": {
-                "enabled": True
-            },
-            "labels": {
-                "karpenter": "enabled",
-                "app": "thanos"
-            },
-            "taints": [],
-            "providerRef": {
-                "name": karpenter_node_provider_name
-            },
-            "requirements": [
-                { "key": "karpenter.k8s.aws/instance-category", "operator": "In", "values": ["t"] },
-                { "key": "kubernetes.io/arch", "operator": "In", "values": ["arm64"] },
-                { "key": "kubernetes.io/os", "operator": "In", "values": ["linux"] },
-                { "key": "karpenter.sh/capacity-type", "operator": "In", "values": ["on-demand"] },
-            ]
-        }
-    }
+    karpenter_provisioner_obj = karpenter_nodes.provisioner(
+        name="thanos",
+        labels={ "karpenter": "enabled", "app": "thanos" },
+        metadata_labels={ "app": "thanos" },
+        instance_category=["t"],
+        instance_arch=["arm64"],
+        instance_capacity_type=["on-demand"],
+        provider_name=karpenter_node_provider_name,
+        api_version=karpenter_node_api_version,
+    )
 
-    karpenter_provisioner_affinity = {
-        "nodeAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": {
-                "nodeSelectorTerms": [
-                    {
-                        "matchExpressions": [
-                            {
-                                "key": "app",
-                                "operator": "In",
-                                "values": [
-                                    "thanos"
-                                ]
-                            }
-                        ]
-                    }
-                ]
-            }
-        }
-    }
-    
-    query_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "topologyKey": "kubernetes.io/hostname",
-                    "labelSelector": {
-                        "matchLabels": {
-                            "app": "thanos-query"
-                        }
-                    }
-                }
-            ]
-        }
-    }
-    
-    storegateway_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "topologyKey": "kubernetes.io/hostname",
-                    "labelSelector": {
-                        "matchLabels": {
-                            "app": "thanos-storegateway"
-                        }
-                    }
-                }
-            ]
-        }
-    }
-    
-    if karpenter_node_enabled:
-        query_affinity.update(karpenter_provisioner_affinity)
-        storegateway_affinity.update(karpenter_provisioner_affinity)
+    karpenter_provisioner_affinity = karpenter_nodes.node_affinity({ "app": "thanos" })
+
+    query_affinity = karpenter_nodes.affinity(
+        pod_labels={ "app": "thanos-query" },
+        node_labels={ "app": "thanos" } if karpenter_node_enabled else {},
+    )
+
+    storegateway_affinity = karpenter_nodes.affinity(
+        pod_labels={ "app": "thanos-storegateway" },
+        node_labels={ "app": "thanos" } if karpenter_node_enabled else {},
+    )
 
     s3_objstore_config = {
         "type": "S3",
@@ -1448,7 +1620,208 @@ def thanos_stack(
         }
     }
 
-    s3_objstore_config_str = yaml.dump(s3_objstore_config, default_flow_style=False)
+    s3_objstore_config_str = dump_yaml(s3_objstore_config)
+
+    # Query frontend results cache, memcached runs as a side release installed before the components using it
+    cache_releases = []
+    query_frontend_cache_addresses = []
+    if query_frontend_enabled and query_frontend_cache == "memcached":
+        cache_releases.append(_memcached_cache(
+            provider=provider,
+            name=f"mc-{name}-query-frontend",
+            namespace=namespace,
+            replicas=query_frontend_memcached_replicas,
+            cache_size_mb=query_frontend_cache_size_mb,
+            pod_labels={ "app": "thanos-query-frontend-cache" },
+            node_labels={ "app": "thanos" } if karpenter_node_enabled else {},
+            skip_await=skip_await,
+            await_policy=await_policy.without_workloads() if await_policy else None,
+            topology_aware_routing=topology_aware_routing,
+            depends_on=depends_on,
+        ))
+        query_frontend_cache_addresses = thanos_values.memcached_addresses(f"mc-{name}-query-frontend", namespace)
+
+    query_frontend_cache_config = thanos_values.response_cache_config(
+        backend=query_frontend_cache,
+        size_mb=query_frontend_cache_size_mb,
+        ttl=query_frontend_cache_ttl,
+        memcached_addresses=query_frontend_cache_addresses,
+    ) if query_frontend_enabled else {}
+
+    # Store gateway index and chunk caches, memcached clusters run as side releases
+    storegateway_cache_addresses = {}
+    for cache, backend in (("index", storegateway_index_cache), ("chunks", storegateway_chunk_cache)):
+        if backend != "memcached":
+            continue
+        cache_releases.append(_memcached_cache(
+            provider=provider,
+            name=f"mc-{name}-{cache}",
+            namespace=namespace,
+            replicas=storegateway_memcached_replicas,
+            cache_size_mb=storegateway_index_cache_size_mb if cache == "index" else storegateway_chunk_cache_size_mb,
+            pod_labels={ "app": f"thanos-storegateway-{cache}-cache" },
+            node_labels={ "app": "thanos" } if karpenter_node_enabled else {},
+            skip_await=skip_await,
+            await_policy=await_policy.without_workloads() if await_policy else None,
+            topology_aware_routing=topology_aware_routing,
+            depends_on=depends_on,
+        ))
+        storegateway_cache_addresses[cache] = thanos_values.memcached_addresses(f"mc-{name}-{cache}", namespace)
+
+    storegateway_index_cache_config = thanos_values.index_cache_config(
+        backend=storegateway_index_cache,
+        size_mb=storegateway_index_cache_size_mb,
+        memcached_addresses=storegateway_cache_addresses.get("index", []),
+    )
+
+    storegateway_bucket_cache_config = thanos_values.bucket_cache_config(
+        backend=storegateway_chunk_cache,
+        size_mb=storegateway_chunk_cache_size_mb,
+        memcached_addresses=storegateway_cache_addresses.get("chunks", []),
+    )
+
+    # In-memory caches live in the store gateway heap
+    storegateway_cache_memory_mb = sum(
+        size for backend, size in (
+            (storegateway_index_cache, storegateway_index_cache_size_mb),
+            (storegateway_chunk_cache, storegateway_chunk_cache_size_mb),
+        ) if backend == "in-memory"
+    )
+
+    # Prometheus sidecars, named after the prometheus_stack release outputs when given
+    if prometheus_release is not None:
+        import pulumi
+
+        sidecar_store = pulumi.Output.all(prometheus_release.name, prometheus_release.namespace, prometheus_release.values).apply(
+            lambda args: thanos_values.sidecar_endpoint(
+                thanos_values.prometheus_fullname(args[0], (args[2] or {}).get("fullnameOverride") or ""),
+                args[1],
+                store_discovery,
+            )
+        )
+    else:
+        sidecar_store = thanos_values.sidecar_endpoint(prometheus_name_override, prometheus_namespace, store_discovery)
+
+    compactor_values = {
+        "enabled": compactor_enabled,
+        "podLabels": {
+            "app": "thanos-compactor"
+        },
+        "logLevel": "info",
+        "logFormat": "logfmt",
+        "retentionResolutionRaw": compactor_retention_resolution_raw,
+        "retentionResolution5m": compactor_retention_resolution_5m,
+        "retentionResolution1h": compactor_retention_resolution_1h,
+        "consistencyDelay": compactor_consistency_delay,
+        "extraFlags": thanos_values.compactor_flags(
+            compact_concurrency=compactor_concurrency,
+            downsample_concurrency=compactor_downsample_concurrency,
+            block_sync_concurrency=compactor_block_sync_concurrency,
+            delete_delay=compactor_delete_delay,
+        ),
+        "serviceAccount": {
+            "create": True,
+            "annotations": {
+                "eks.amazonaws.com/role-arn": eks_sa_role_arn
+            }
+        },
+        # Scratch space for the blocks being compacted or downsampled, the storage class of existing
+        # claims can't change, so it is only set when given ( chart default otherwise )
+        "persistence": {
+            "enabled": True,
+            **({ "storageClass": compactor_storage_class_name } if compactor_storage_class_name != "" else {}),
+            "size": compactor_persistence_size,
+        },
+        "resources": compactor_resources,
+        "affinity": karpenter_provisioner_affinity if karpenter_node_enabled else {},
+    }
+
+    # Compaction sharded by external labels, the release compactor handles shard 0 and compactor-only
+    # releases the others
+    compactor_shard_values = [ compactor_values ] if compactor_shards <= 1 else [
+        {
+            **compactor_values,
+            "extraFlags": compactor_values["extraFlags"] + [
+                f"--selector.relabel-config={dump_yaml(thanos_values.shard_relabel_config(compactor_shard_labels, compactor_shards, shard))}",
+            ],
+        }
+        for shard in range(compactor_shards)
+    ]
+
+    if compactor_enabled:
+        for shard in range(1, len(compactor_shard_values)):
+            release(
+                name=f"{name}-compactor-{shard}",
+                chart=chart,
+                version=version,
+                repo=repo,
+                timeout=600,
+                namespace=namespace,
+                skip_await=skip_await,
+                await_policy=await_policy.without_workloads() if await_policy else None,
+                depends_on=depends_on,
+                provider=provider,
+                values={
+                    "fullnameOverride": f"{thanos_values.fullname(name, name_override)}-{shard}",
+                    "objstoreConfig": s3_objstore_config_str,
+                    "query": { "enabled": False },
+                    "queryFrontend": { "enabled": False },
+                    "bucketweb": { "enabled": False },
+                    "storegateway": { "enabled": False },
+                    "ruler": { "enabled": False },
+                    "receive": { "enabled": False },
+                    "receiveDistributor": { "enabled": False },
+                    "compactor": compactor_shard_values[shard],
+                }
+            )
+
+    # Bitnami sharded mode, one StatefulSet per hash shard and time partition, each serving part of the bucket
+    storegateway_shards = thanos_values.storegateway_shards(storegateway_hash_shards, storegateway_time_partitions)
+    storegateway_sharded = {
+        "enabled": storegateway_shards > 1,
+        "hashPartitioning": {
+            "shards": storegateway_hash_shards if storegateway_hash_shards > 1 else "",
+        },
+        "timePartitioning": storegateway_time_partitions,
+    }
+
+    query_frontend_values = {
+        "enabled": False,
+        "podLabels": {},
+        "logLevel": "info",
+        "logFormat": "logfmt"
+    }
+    if query_frontend_enabled:
+        query_frontend_memory_mb = query_frontend_cache_size_mb if query_frontend_cache == "in-memory" else 0
+        query_frontend_values = {
+            "enabled": True,
+            "replicaCount": query_frontend_replicas,
+            "podLabels": {
+                "app": "thanos-query-frontend"
+            },
+            "logLevel": "info",
+            "logFormat": "logfmt",
+            # Results cache configuration, no cache when empty
+            "config": dump_yaml(query_frontend_cache_config) if len(query_frontend_cache_config) > 0 else "",
+            "extraFlags": thanos_values.query_frontend_flags(
+                split_interval=query_frontend_split_interval,
+                max_query_parallelism=query_frontend_max_query_parallelism,
+                downstream_max_idle_conns=query_frontend_downstream_max_idle_conns,
+            ),
+            "resources": {
+                "requests": {
+                    "memory": f"{256 + query_frontend_memory_mb}Mi",
+                    "cpu": "250m"
+                },
+                "limits": {
+                    "memory": f"{512 + query_frontend_memory_mb}Mi",
+                }
+            },
+            "affinity": karpenter_nodes.affinity(
+                pod_labels={ "app": "thanos-query-frontend" },
+                node_labels={ "app": "thanos" } if karpenter_node_enabled else {},
+            ),
+        }
     
     thanos_stack_release = release(
         name=name,
@@ -1458,7 +1831,9 @@ def thanos_stack(
         timeout=600,
         namespace=namespace,
         skip_await=skip_await,
-        depends_on=depends_on,
+        await_policy=await_policy,
+        topology_aware_routing=topology_aware_routing,
+        depends_on=depends_on + cache_releases,
         provider=provider,
         values={
             "fullnameOverride": name_override,
@@ -1504,10 +1879,9 @@ def thanos_stack(
                     "prometheus_replica"
                 ],
                 "stores": [
-                    # Naming based on `fullNameOverride` in `prometheus-stack` release ( prom-stack )
-                    "prom-stack-thanos-discovery.prometheus.svc.cluster.local:10902",
-                    # Namin based on `fullNameOverride` in `thanos-stack` release ( thanos-stack )
-                    "thanos-stack-storegateway.prometheus.svc.cluster.local:10901"
+                    sidecar_store,
+                    # Store gateway services of this release, one per shard
+                    *thanos_values.storegateway_endpoints(thanos_values.fullname(name, name_override), namespace, storegateway_shards, store_discovery),
                 ],
                 "sdConfig": "",
                 "resources": {
@@ -1544,16 +1918,10 @@ def thanos_stack(
                     }
                 ]
             },
-            "queryFrontend": {
-                "enabled": False,
-                "recplicaCount": 1,
-                "podLabels": {},
-                "logLevel": "info",
-                "logFormat": "logfmt"
-            },
+            "queryFrontend": query_frontend_values,
             "bucketweb": {
                 "enabled": True,
-                "recplicaCount": 1,
+                "replicaCount": 1,
                 "podLabels": {
                     "app": "thanos-bucketweb"
                 },
@@ -1590,38 +1958,10 @@ def thanos_stack(
                 },
                 "affinity": karpenter_provisioner_affinity if karpenter_node_enabled else {},
             },
-            "compactor": {
-                "enabled": compactor_enabled,
-                "podLabels": {
-                    "app": "thanos-compactor"
-                },
-                "logLevel": "info",
-                "logFormat": "logfmt",
-                "retentionResolutionRaw": compactor_retention_resolution_raw,
-                "retentionResolution5m": compactor_retention_resolution_5m,
-                "retentionResolution1h": compactor_retention_resolution_1h,
-                "consistencyDelay": "30m",
-                "serviceAccount": {
-                    "create": True,
-                    "annotations": {
-                        "eks.amazonaws.com/role-arn": eks_sa_role_arn
-                    }
-                },
-                "resources": {
-                    "requests": {
-                        "memory": "128Mi",
-                        "cpu": "200m"
-                    },
-                    "limits": {
-                        "memory": "256Mi",
-                        "cpu": "500m"
-                    }
-                },
-                "affinity": karpenter_provisioner_affinity if karpenter_node_enabled else {},
-            },
+            "compactor": compactor_shard_values[0],
             "storegateway": {
                 "enabled": True,
-                "replicaCount": 3,
+                "replicaCount": storegateway_replicas,
                 "podLabels": {
                     "app": "thanos-storegateway"
                 },
@@ -1633,7 +1973,12 @@ def thanos_stack(
                     },
                     "annotations": {}
                 },
-                "extraFlags": [],
+                # Index cache configuration, Thanos default in-memory cache when empty
+                "config": dump_yaml(storegateway_index_cache_config) if len(storegateway_index_cache_config) > 0 else "",
+                "extraFlags": [
+                    f"--store.caching-bucket.config={dump_yaml(storegateway_bucket_cache_config)}",
+                ] if len(storegateway_bucket_cache_config) > 0 else [],
+                "sharded": storegateway_sharded,
                 "serviceAccount": {
                     "create": True,
                     "annotations": {
@@ -1660,15 +2005,15 @@ def thanos_stack(
                     "accessModes": [
                         "ReadWriteOnce"
                     ],
-                    "size": "8Gi"
+                    "size": storegateway_persistence_size
                 },
                 "resources": {
                     "requests": {
-                        "memory": "512Mi",
+                        "memory": f"{512 + storegateway_cache_memory_mb}Mi",
                         "cpu": "500m"
                     },
                     "limits": {
-                        "memory": "1024Mi",
+                        "memory": f"{1024 + storegateway_cache_memory_mb}Mi",
                         "cpu": 1
                     }
                 },
@@ -1741,6 +2086,7 @@ def opensearch(
     name_override: str = "",
     karpenter_node_enabled: bool = True,
     karpenter_node_provider_name: str = "default",
+    karpenter_node_api_version: str = "v1alpha5",
     replicas: int = 3,
     resources_requests_memory_mb: str = "2000",
     resources_requests_cpu: str = "1000m",
@@ -1751,63 +2097,23 @@ def opensearch(
     version: str = "2.14.1",
     repo: str = "https://opensearch-project.github.io/helm-charts",
     namespace: str = "default",
+    topology_aware_routing: bool = False,
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->Release:
 
-    karpenter_provisioner_obj = {
-        "apiVersion": "karpenter.sh/v1alpha5",
-        "kind": "Provisioner",
-        "metadata": {
-            "labels": {
-            "app": "opensearch"
-            },
-            "name": "opensearch"
-        },
-        "spec": {
-            "consolidation": {
-                "enabled": True
-            },
-            "labels": {
-                "karpenter": "enabled",
-                "app": "opensearch"
-            },
-            "taints": [],
-            "providerRef": {
-                "name": karpenter_node_provider_name
-            },
-            "requirements": [
-                { "key": "karpenter.k8s.aws/instance-category", "operator": "In", "values": ["r"] },
-                { "key": "kubernetes.io/arch", "operator": "In", "values": ["arm64"] },
-                { "key": "kubernetes.io/os", "operator": "In", "values": ["linux"] },
-                { "key": "karpenter.sh/capacity-type", "operator": "In", "values": ["on-demand"] },
-            ]
-        }
-    }
+    karpenter_provisioner_obj = karpenter_nodes.provisioner(
+        name="opensearch",
+        labels={ "karpenter": "enabled", "app": "opensearch" },
+        metadata_labels={ "app": "opensearch" },
+        instance_category=["r"],
+        instance_arch=["arm64"],
+        instance_capacity_type=["on-demand"],
+        provider_name=karpenter_node_provider_name,
+        api_version=karpenter_node_api_version,
+    )
 
-    karpenter_provisioner_affinity = {
-        "requiredDuringSchedulingIgnoredDuringExecution": {
-            "nodeSelectorTerms": [
-                {
-                    "matchExpressions": [
-                        {
-                            "key": "karpenter",
-                            "operator": "In",
-                            "values": [
-                                "enabled"
-                            ]
-                        },
-                        {
-                            "key": "app",
-                            "operator": "In",
-                            "values": [
-                                "opensearch"
-                            ]
-                        }
-                    ]
-                }
-            ]
-        }
-    }
+    karpenter_provisioner_affinity = karpenter_nodes.node_affinity({ "karpenter": "enabled", "app": "opensearch" })["nodeAffinity"]
 
     opensearch_release = release(
         name=name,
@@ -1817,6 +2123,8 @@ def opensearch(
         namespace=namespace,
         timeout=600,
         skip_await=skip_await,
+        await_policy=await_policy,
+        topology_aware_routing=topology_aware_routing,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -1924,158 +2232,49 @@ def loki(
     autoscaling_max_replicas: int = 5,
     karpenter_node_enabled: bool = True,
     karpenter_node_provider_name: str = "default",
+    karpenter_node_api_version: str = "v1alpha5",
     name_override: str = "",
     name: str = "loki",
     chart: str = "loki",
     version: str = "5.21.0",
     repo: str = "https://grafana.github.io/helm-charts",
     namespace: str = "default",
+    topology_aware_routing: bool = False,
     skip_await: bool = False,
+    await_policy: AwaitPolicy = None,
     depends_on: list = [] )->(Release, Release):
 
-    karpenter_provisioner_affinity = {
-        "nodeAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": {
-                "nodeSelectorTerms": [
-                    {
-                        "matchExpressions": [
-                            {
-                                "key": "app",
-                                "operator": "In",
-                                "values": ["loki"]
-                            }
-                        ],
-                    },
-                ],
-            },
-        },
-    }
-    
-    read_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "topologyKey": "kubernetes.io/hostname",
-                    "labelSelector": {
-                        "matchLabels": {
-                            "component": "read"
-                        }
-                    }
-                }
-            ]
-        }
-    }
-
-    write_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "topologyKey": "kubernetes.io/hostname",
-                    "labelSelector": {
-                        "matchLabels": {
-                            "component": "write"
-                        }
-                    }
-                }
-            ]
-        }
-    }
+    karpenter_provisioner_affinity = karpenter_nodes.node_affinity({ "app": "loki" })
 
-    backend_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "topologyKey": "kubernetes.io/hostname",
-                    "labelSelector": {
-                        "matchLabels": {
-                            "component": "backend"
-                        }
-                    }
-                }
-            ]
-        }
-    }
+    loki_node_labels = { "app": "loki" } if karpenter_node_enabled else {}
 
-    gateway_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "topologyKey": "kubernetes.io/hostname",
-                    "labelSelector": {
-                        "matchLabels": {
-                            "component": "gateway"
-                        }
-                    }
-                }
-            ]
-        }
-    }
+    read_affinity_str = dump_yaml(karpenter_nodes.affinity({ "component": "read" }, loki_node_labels))
+    write_affinity_str = dump_yaml(karpenter_nodes.affinity({ "component": "write" }, loki_node_labels))
+    backend_affinity_str = dump_yaml(karpenter_nodes.affinity({ "component": "backend" }, loki_node_labels))
+    gateway_affinity_str = dump_yaml(karpenter_nodes.affinity({ "component": "gateway" }, loki_node_labels))
+    singlebinary_affinity_str = dump_yaml(karpenter_nodes.affinity({ "component": "singlebinary" }, loki_node_labels))
 
-    singlebinary_affinity = {
-        "podAntiAffinity": {
-            "requiredDuringSchedulingIgnoredDuringExecution": [
-                {
-                    "topologyKey": "kubernetes.io/hostname",
-                    "labelSelector": {
-                        "matchLabels": {
-                            "component": "singlebinary"
-                        }
-                    }
-                }
-            ]
-        }
-    }
+    karpenter_provisioner_obj = karpenter_nodes.provisioner(
+        name="loki",
+        labels={ "app": "loki" },
+        instance_category=["t"],
+        instance_arch=["arm64"],
+        instance_capacity_type=["spot", "on-demand"],
+        provider_name=karpenter_node_provider_name,
+        api_version=karpenter_node_api_version,
+    )
 
-    if karpenter_node_enabled:
-        read_affinity.update(karpenter_provisioner_affinity)
-        write_affinity.update(karpenter_provisioner_affinity)
-        backend_affinity.update(karpenter_provisioner_affinity)
-        gateway_affinity.update(karpenter_provisioner_affinity)
-        singlebinary_affinity.update(karpenter_provisioner_affinity)
-
-    read_affinity_str = yaml.dump(read_affinity, default_flow_style=False)
-    write_affinity_str = yaml.dump(write_affinity, default_flow_style=False)
-    backend_affinity_str = yaml.dump(backend_affinity, default_flow_style=False)
-    gateway_affinity_str = yaml.dump(gateway_affinity, default_flow_style=False)
-    singlebinary_affinity_str = yaml.dump(singlebinary_affinity, default_flow_style=False)
-
-    karpenter_provisioner_obj = {
-        "apiVersion": "karpenter.sh/v1alpha5",
-        "kind": "Provisioner",
-        "metadata": {
-            "labels": {
-                "app": "loki",
-            },
-            "name": "loki",
-        },
-        "spec": {
-            "consolidation": {
-                "enabled": True,
-            },
-            "labels": {
-                "app": "loki",
-            },
-            "taints": [],
-            "providerRef": {
-                "name": karpenter_node_provider_name,
-            },
-            "requirements": [
-                { "key": "karpenter.k8s.aws/instance-category", "operator": "In", "values": [ "t" ] },
-                { "key": "kubernetes.io/arch", "operator": "In", "values": [ "arm64" ] },
-                { "key": "kubernetes.io/os", "operator": "In", "values": [ "linux" ] },
-                { "key": "karpenter.sh/capacity-type", "operator": "In", "values": [ "spot", "on-demand" ] },
-            ],
-        },
-    }
+    import pulumi
 
     promtail_release = release(
         name="promtail",
-        chart="promtail",
-        version="6.15.1",
+        chart=PROMTAIL_CHART[1],
+        version=PROMTAIL_CHART[2],
         repo=repo,
         timeout=600,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy.without_workloads() if await_policy else None,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -2102,6 +2301,8 @@ def loki(
         timeout=600,
         namespace=namespace,
         skip_await=skip_await,
+        await_policy=await_policy,
+        topology_aware_routing=topology_aware_routing,
         depends_on=depends_on,
         provider=provider,
         values={
@@ -0,0 +1,68 @@
+import hashlib
+import io
+import tarfile
+
+import pytest
+import yaml
+
+from benchmarks import mocks
+from python_pulumi_helm.helpers import cache
+
+def chart_archive(chart: str, version: str) -> bytes:
+    """
+    Minimal chart archive, a `<chart>/Chart.yaml` in a gzipped tarball
+    """
+    data = yaml.safe_dump({ "apiVersion": "v2", "name": chart, "version": version }).encode()
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        info = tarfile.TarInfo(f"{chart}/Chart.yaml")
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+def write_repo(path, charts: list) -> dict:
+    """
+    Directory-backed chart repository holding `charts` ( (chart, version) tuples ), returns the archive digests
+    """
+    path.mkdir(parents=True, exist_ok=True)
+    entries = {}
+    digests = {}
+    for chart, version in charts:
+        data = chart_archive(chart, version)
+        (path / f"{chart}-{version}.tgz").write_bytes(data)
+        digests[(chart, version)] = hashlib.sha256(data).hexdigest()
+        entries.setdefault(chart, []).append({
+            "name": chart,
+            "version": version,
+            "digest": digests[(chart, version)],
+            "urls": [ f"{chart}-{version}.tgz" ],
+        })
+    (path / "index.yaml").write_text(yaml.safe_dump({ "apiVersion": "v1", "entries": entries }))
+    return digests
+
+@pytest.fixture(autouse=True)
+def clear_index_cache():
+    # Repository indexes are kept per process, every test starts from an empty one
+    cache._index_cache.clear()
+    yield
+    cache._index_cache.clear()
+
+@pytest.fixture
+def repo(tmp_path):
+    """
+    Local repository with two versions of `app` and one of `db`
+    """
+    path = tmp_path / "repo"
+    digests = write_repo(path, [ ("app", "1.0.0"), ("app", "1.1.0"), ("db", "2.0.0") ])
+    return str(path), digests
+
+@pytest.fixture
+def pulumi_mocks():
+    """
+    Recorder of the inputs of every resource registered in the mocked Pulumi runtime, see `benchmarks.mocks`
+    """
+    return mocks.set_mocks()
+
+@pytest.fixture
+def run():
+    return mocks.run
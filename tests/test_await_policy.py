@@ -0,0 +1,124 @@
+import pytest
+
+from python_pulumi_helm import releases
+from python_pulumi_helm.helpers import resources
+from python_pulumi_helm.helpers.await_policy import AwaitPolicy, DeferredChecks
+from python_pulumi_helm.platform import Platform
+
+def _release(**kwargs):
+    return resources.release(**{
+        "provider": None,
+        "name": "db",
+        "chart": "db",
+        "version": "1.0.0",
+        "repo": "https://charts.example.com",
+        "chart_cache_dir": "",
+        **kwargs,
+    })
+
+def test_invalid_policies():
+    with pytest.raises(ValueError, match="Unknown await mode"):
+        AwaitPolicy("sometimes")
+    with pytest.raises(ValueError, match="at least one workload"):
+        AwaitPolicy.only([])
+    with pytest.raises(ValueError, match="at least one workload"):
+        AwaitPolicy.deferred([], DeferredChecks())
+    with pytest.raises(ValueError, match="DeferredChecks"):
+        AwaitPolicy("deferred", workloads=[ "StatefulSet/db" ])
+    with pytest.raises(ValueError, match="Invalid workload"):
+        AwaitPolicy.only([ "Pod/db" ])
+
+def test_policies_own_their_workloads():
+    workloads = [ "StatefulSet/db" ]
+    policy = AwaitPolicy.only(workloads)
+    workloads.append("Deployment/api")
+
+    assert policy.workloads == [ "StatefulSet/db" ]
+    assert AwaitPolicy().workloads is not AwaitPolicy().workloads
+
+def test_side_releases_are_not_awaited_with_workload_policies():
+    assert AwaitPolicy.only([ "StatefulSet/db" ]).without_workloads().mode == "none"
+    assert AwaitPolicy.deferred([ "StatefulSet/db" ], DeferredChecks()).without_workloads().mode == "none"
+    assert AwaitPolicy.all(300).without_workloads().timeout == 300
+
+def test_workloads_policy_creates_checks(pulumi_mocks, run):
+    release = run(lambda: _release(await_policy=AwaitPolicy.only([ "StatefulSet/db-0", "Deployment/db-api" ], timeout=900)))
+
+    assert pulumi_mocks.resources["db"]["skipAwait"] is True
+    assert pulumi_mocks.resources["db"]["timeout"] == 900
+    assert len(release.readiness_checks) == 2
+    assert { "db-ready-statefulset-db-0", "db-ready-deployment-db-api" } <= set(pulumi_mocks.resources)
+
+def test_skip_await_conflicting_with_the_policy(pulumi_mocks, run):
+    with pytest.raises(ValueError, match="skip_await"):
+        run(lambda: _release(skip_await=True, await_policy=AwaitPolicy.all()))
+
+def test_deferred_checks_are_created_on_demand(pulumi_mocks, run):
+    deferred_checks = DeferredChecks()
+
+    def program():
+        release = _release(await_policy=AwaitPolicy.deferred([ "StatefulSet/db-0" ], deferred_checks))
+        assert release.readiness_checks == []
+        assert "db-ready-statefulset-db-0" not in pulumi_mocks.resources
+        return deferred_checks.create(depends_on=[ release ])
+
+    checks = run(program)
+
+    assert len(checks) == 1
+    assert "db-ready-statefulset-db-0" in pulumi_mocks.resources
+    assert deferred_checks.pending == []
+
+def test_deferred_policy_on_a_direct_factory_call(pulumi_mocks, run):
+    deferred_checks = DeferredChecks()
+
+    def program():
+        releases.opensearch(
+            provider=None,
+            ingress_domain="example.com",
+            ingress_class_name="nginx",
+            storage_class_name="ebs",
+            await_policy=AwaitPolicy.deferred([ "StatefulSet/opensearch-cluster-master" ], deferred_checks),
+        )
+        return deferred_checks.create()
+
+    assert len(run(program)) == 1
+
+def test_platform_creates_every_readiness_check(pulumi_mocks, run):
+    spec = {
+        "addons": {
+            "cilium": {
+                "eks_cluster_name": "main",
+                "await": { "mode": "deferred", "workloads": [ "DaemonSet/cilium" ] },
+            },
+            "metrics_server": {
+                "await": { "mode": "workloads", "workloads": [ "Deployment/metrics-server" ] },
+            },
+        },
+    }
+
+    platform = run(lambda: Platform(None, spec))
+
+    assert len(platform.readiness_checks) == 2
+    assert platform.deferred_checks.pending == []
+
+def test_policies_keep_the_factory_timeout(pulumi_mocks, run):
+    deferred_checks = DeferredChecks()
+
+    def program():
+        releases.opensearch(
+            provider=None,
+            ingress_domain="example.com",
+            ingress_class_name="nginx",
+            storage_class_name="ebs",
+            await_policy=AwaitPolicy.all(),
+        )
+        _release(name="short", timeout=120, await_policy=AwaitPolicy.all(30))
+        _release(name="checked", timeout=900, await_policy=AwaitPolicy.deferred([ "StatefulSet/db-0" ], deferred_checks))
+        return deferred_checks.pending[0]
+
+    pending = run(program)
+
+    assert pulumi_mocks.resources["opensearch"]["timeout"] == 600
+    assert pulumi_mocks.resources["short"]["timeout"] == 30
+    # Readiness checks are created with the timeout of their release
+    assert pending[-1] == 900
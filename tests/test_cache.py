@@ -0,0 +1,126 @@
+import os
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from python_pulumi_helm.helpers import cache, resources
+
+def test_fetch_stores_archive_by_digest(tmp_path, repo):
+    repo_dir, digests = repo
+    path = cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "1.0.0")
+
+    assert Path(path).name == f"{digests[('app', '1.0.0')]}.tgz"
+    assert cache.file_digest(path) == digests[("app", "1.0.0")]
+    assert cache.lookup(str(tmp_path / "cache"), repo_dir, "app", "1.0.0") == path
+
+def test_fetch_hit_does_not_read_the_repository(tmp_path, repo):
+    repo_dir, _ = repo
+    path = cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "1.0.0")
+
+    os.remove(Path(repo_dir, "app-1.0.0.tgz"))
+    os.remove(Path(repo_dir, "index.yaml"))
+    cache._index_cache.clear()
+
+    assert cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "1.0.0") == path
+
+def test_corrupted_archive_is_downloaded_again(tmp_path, repo):
+    repo_dir, digests = repo
+    path = cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "1.0.0")
+    Path(path).write_bytes(b"corrupted")
+
+    assert cache.lookup(str(tmp_path / "cache"), repo_dir, "app", "1.0.0") == ""
+    assert cache.file_digest(cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "1.0.0")) == digests[("app", "1.0.0")]
+
+def test_digest_mismatch(tmp_path, repo):
+    repo_dir, _ = repo
+    Path(repo_dir, "app-1.0.0.tgz").write_bytes(b"tampered")
+
+    with pytest.raises(cache.ChartCacheError, match="Digest mismatch"):
+        cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "1.0.0")
+    assert cache.lookup(str(tmp_path / "cache"), repo_dir, "app", "1.0.0") == ""
+
+def test_unknown_version(tmp_path, repo):
+    repo_dir, _ = repo
+    with pytest.raises(cache.ChartCacheError, match="not found"):
+        cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "9.9.9")
+
+def test_invalid_index(tmp_path, repo):
+    repo_dir, _ = repo
+    Path(repo_dir, "index.yaml").write_text("entries: [")
+
+    with pytest.raises(cache.ChartCacheError, match="Invalid index"):
+        cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "1.0.0")
+
+def test_oci_repositories_are_not_cached(tmp_path):
+    with pytest.raises(cache.ChartCacheError, match="OCI"):
+        cache.fetch(str(tmp_path / "cache"), "oci://registry.example.com/charts", "app", "1.0.0")
+
+def test_requests_have_a_timeout(tmp_path, repo, monkeypatch):
+    repo_dir, _ = repo
+    timeouts = []
+    urlopen = urllib.request.urlopen
+
+    def recording_urlopen(url, timeout=None):
+        timeouts.append(timeout)
+        return urlopen(url, timeout=timeout)
+
+    monkeypatch.setattr(urllib.request, "urlopen", recording_urlopen)
+    cache.fetch(str(tmp_path / "cache"), repo_dir, "app", "1.0.0", timeout=5)
+
+    assert timeouts == [5, 5]
+
+def test_cached_chart_path_falls_back_on_cache_errors(tmp_path, repo):
+    repo_dir, _ = repo
+    assert resources.cached_chart_path(repo_dir, "app", "9.9.9", str(tmp_path / "cache")) == ""
+    # Nothing listens on the discard port, the connection is refused ( OSError )
+    assert resources.cached_chart_path("http://127.0.0.1:9/charts", "app", "1.0.0", str(tmp_path / "cache")) == ""
+
+def test_cached_chart_path_raises_unexpected_errors(tmp_path, repo, monkeypatch):
+    repo_dir, _ = repo
+
+    def broken_fetch(*args, **kwargs):
+        raise TypeError("bug")
+
+    monkeypatch.setattr(cache, "fetch", broken_fetch)
+    with pytest.raises(TypeError):
+        resources.cached_chart_path(repo_dir, "app", "1.0.0", str(tmp_path / "cache"))
+
+def _release_inputs(pulumi_mocks, run, repo_dir, cache_dir):
+    run(lambda: resources.release(
+        provider=None,
+        name="app",
+        chart="app",
+        version="1.0.0",
+        repo=repo_dir,
+        chart_cache_dir=cache_dir,
+    ))
+    return pulumi_mocks.resources["app"]
+
+def test_release_inputs_are_stable_across_projects(tmp_path, repo, pulumi_mocks, run, monkeypatch):
+    repo_dir, digests = repo
+    inputs = []
+    for project in ("a", "b"):
+        (tmp_path / project).mkdir()
+        monkeypatch.chdir(tmp_path / project)
+        inputs.append(_release_inputs(pulumi_mocks, run, repo_dir, ".chart-cache"))
+
+    assert inputs[0]["chart"] == inputs[1]["chart"] == f"./.chart-cache/blobs/{digests[('app', '1.0.0')]}.tgz"
+    assert inputs[0]["version"] == inputs[1]["version"] == "1.0.0"
+
+def test_release_inputs_on_miss_and_hit(tmp_path, repo, pulumi_mocks, run, monkeypatch):
+    repo_dir, _ = repo
+    monkeypatch.chdir(tmp_path)
+
+    miss = _release_inputs(pulumi_mocks, run, repo_dir, ".chart-cache")
+    hit = _release_inputs(pulumi_mocks, run, repo_dir, ".chart-cache")
+
+    assert miss == hit
+
+def test_release_without_cache(repo, pulumi_mocks, run):
+    repo_dir, _ = repo
+    inputs = _release_inputs(pulumi_mocks, run, repo_dir, "")
+
+    assert inputs["chart"] == "app"
+    assert inputs["version"] == "1.0.0"
+    assert inputs["repositoryOpts"]["repo"] == repo_dir
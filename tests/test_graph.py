@@ -0,0 +1,95 @@
+import pytest
+
+from python_pulumi_helm.helpers import graph, resources
+
+def _release(name: str, chart: str, timeout: int = 60, depends_on: list = [], skip_await: bool = False):
+    return resources.release(
+        provider=None,
+        name=name,
+        chart=chart,
+        version="1.0.0",
+        repo="https://charts.example.com",
+        timeout=timeout,
+        skip_await=skip_await,
+        depends_on=depends_on,
+        chart_cache_dir="",
+    )
+
+def _bootstrap():
+    """
+    cilium -> kube-prometheus-stack -> argo-cd, and loki ( skip_await ) next to them
+    """
+    cilium = _release("cilium", "cilium", 60)
+    prometheus = _release("prometheus", "kube-prometheus-stack", 600, [ cilium ])
+    _release("argocd", "argo-cd", 600, [ cilium, prometheus ])
+    _release("loki", "loki", 600, [ cilium ], skip_await=True)
+
+def test_releases_are_only_recorded_inside_the_block(pulumi_mocks, run):
+    def program():
+        _release("before", "a")
+        with resources.record_releases() as outer:
+            _release("first", "a")
+            with resources.record_releases() as inner:
+                _release("second", "a")
+        _release("after", "a")
+        return outer, inner
+
+    outer, inner = run(program)
+
+    assert [ r["name"] for r in outer ] == [ "first", "second" ]
+    assert [ r["name"] for r in inner ] == [ "second" ]
+    assert not hasattr(resources, "created_releases")
+
+def test_release_graph(pulumi_mocks, run):
+    def program():
+        with resources.record_releases() as records:
+            _bootstrap()
+        return records
+
+    records = run(program)
+
+    assert graph.release_graph(records) == {
+        "cilium": { "chart": "cilium", "timeout": 60, "skip_await": False, "requires": set() },
+        "prometheus": { "chart": "kube-prometheus-stack", "timeout": 600, "skip_await": False, "requires": { "cilium" } },
+        "argocd": { "chart": "argo-cd", "timeout": 600, "skip_await": False, "requires": { "cilium", "prometheus" } },
+        "loki": { "chart": "loki", "timeout": 600, "skip_await": True, "requires": { "cilium" } },
+    }
+
+def test_analyze_with_synthetic_durations(pulumi_mocks, run):
+    def program():
+        with resources.record_releases() as records:
+            _bootstrap()
+        return records
+
+    records = run(program)
+    report = graph.analyze(records, durations={ "prometheus": 300 })
+
+    assert report["critical_path"] == [ "cilium", "prometheus", "argocd" ]
+    assert report["total_seconds"] == 60 + 300 + 600
+    assert report["durations"] == { "cilium": 60, "prometheus": 300, "argocd": 600 }
+
+    # argocd doesn't need the Prometheus stack, dropping the edge leaves cilium -> argocd
+    assert [ (e["from"], e["to"]) for e in report["removable_edges"] ] == [ ("prometheus", "argocd") ]
+    assert report["removable_edges"][0]["saving_seconds"] == 300
+    assert report["edges"][0]["required"] is True
+
+def test_skip_await_releases_weigh_nothing():
+    releases = {
+        "a": { "chart": "a", "timeout": 600, "skip_await": True, "requires": set() },
+        "b": { "chart": "b", "timeout": 60, "skip_await": False, "requires": { "a" } },
+    }
+
+    assert graph.critical_path(releases) == ([ "b" ], 60)
+    assert graph.critical_path(releases, durations={ "a": 30 }) == ([ "a", "b" ], 90)
+
+def test_cycles_are_reported():
+    releases = {
+        "a": { "chart": "a", "timeout": 1, "requires": { "b" } },
+        "b": { "chart": "b", "timeout": 1, "requires": { "a" } },
+    }
+
+    with pytest.raises(ValueError, match="cycle"):
+        graph.critical_path(releases)
+
+def test_empty_graph():
+    assert graph.critical_path({}) == ([], 0)
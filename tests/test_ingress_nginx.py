@@ -0,0 +1,306 @@
+import pytest
+
+from python_pulumi_helm import releases
+from python_pulumi_helm.helpers import ingress_nginx
+
+def _ingress_nginx(**kwargs):
+    return releases.ingress_nginx(**{
+        "provider": None,
+        "global_rate_limit_enabled": True,
+        **kwargs,
+    })
+
+def _memcached_env(values: dict)->dict:
+    return { env["name"]: env["value"] for env in values["extraEnvVars"] }
+
+def test_memcached_sizing():
+    sizing = ingress_nginx.memcached_sizing(expected_rps=1000000, controller_pods=20)
+
+    assert sizing["replicas"] == 5
+    assert sizing["threads"] == 8
+    assert sizing["max_connections"] == 1600
+    assert sizing["resources"]["requests"] == { "cpu": "2000m", "memory": "121Mi" }
+
+def test_memcached_defaults_without_expected_rps(pulumi_mocks, run):
+    run(lambda: _ingress_nginx())
+
+    values = pulumi_mocks.resources["mc-ingress-nginx"]["values"]
+    assert values["replicaCount"] == 3
+    assert values["resources"] == ingress_nginx.MEMCACHED_DEFAULTS["resources"]
+    assert _memcached_env(values) == { "MEMCACHED_CACHE_SIZE": "64", "MEMCACHED_MAX_CONNECTIONS": "1024", "MEMCACHED_THREADS": "4" }
+
+    with pytest.raises(TypeError):
+        ingress_nginx.MEMCACHED_DEFAULTS["resources"]["requests"]["cpu"] = "1"
+
+def test_explicit_memcached_arguments_win_over_the_sizing(pulumi_mocks, run):
+    run(lambda: _ingress_nginx(
+        memcached_expected_rps=1000000,
+        memcached_replicas=2,
+        memcached_resources={ "requests": { "cpu": "1" } },
+    ))
+
+    values = pulumi_mocks.resources["mc-ingress-nginx"]["values"]
+    assert values["replicaCount"] == 2
+    assert values["resources"] == { "requests": { "cpu": "1" } }
+    # Settings not given explicitly still come from the sizing
+    assert _memcached_env(values)["MEMCACHED_THREADS"] == "8"
+
+def test_local_rate_limit_is_per_client_and_per_ingress(pulumi_mocks, run):
+    run(lambda: releases.ingress_nginx(provider=None, rate_limit_mode="local", local_rate_limit_rps=100))
+
+    config = pulumi_mocks.resources["ingress-nginx"]["values"]["controller"]["config"]
+    assert config["http-snippet"] == "limit_req_zone $binary_remote_addr zone=local-rate-limit:10m rate=100r/s;"
+    assert "location-snippet" not in config
+    assert ingress_nginx.local_rate_limit_annotations(burst=20) == {
+        "nginx.ingress.kubernetes.io/configuration-snippet": "limit_req zone=local-rate-limit burst=20 nodelay;",
+    }
+
+def test_local_rate_limit_budget_over_expected_pods():
+    config = ingress_nginx.local_rate_limit_config(rps=1000, key="$server_name", expected_pods=3)
+
+    assert config["http-snippet"] == "limit_req_zone $server_name zone=local-rate-limit:10m rate=334r/s;"
+
+def _directives(snippet: str)->dict:
+    return { line.split(" ", 1)[0]: line.split(" ", 1)[1].rstrip(";") for line in snippet.splitlines() }
+
+def test_cache_keys_differ_per_host():
+    directives = _directives(ingress_nginx.cache_annotations()["nginx.ingress.kubernetes.io/configuration-snippet"])
+
+    def key(host: str)->str:
+        variables = { "$scheme": "https", "$host": host, "$request_uri": "/index.html" }
+        rendered = directives["proxy_cache_key"]
+        for variable, value in variables.items():
+            rendered = rendered.replace(variable, value)
+        return rendered
+
+    assert "$" not in key("a.example.com")
+    assert key("a.example.com") != key("b.example.com")
+
+def test_private_requests_are_not_cached():
+    directives = _directives(ingress_nginx.cache_annotations()["nginx.ingress.kubernetes.io/configuration-snippet"])
+
+    assert directives["proxy_cache_bypass"] == "$http_authorization $http_cookie"
+    assert directives["proxy_no_cache"] == "$http_authorization $http_cookie"
+
+    public = _directives(ingress_nginx.cache_annotations(private_headers=[])["nginx.ingress.kubernetes.io/configuration-snippet"])
+    assert "proxy_no_cache" not in public
+
+HOSTS = [ f"app-{i}.example.com" for i in range(200) ]
+
+def test_ring_lookup_is_stable_and_balanced():
+    ring = ingress_nginx.hash_ring([ "a", "b", "c" ])
+    owners = [ ingress_nginx.ring_lookup(ring, host) for host in HOSTS ]
+
+    assert owners == [ ingress_nginx.ring_lookup(ingress_nginx.hash_ring([ "a", "b", "c" ]), host) for host in HOSTS ]
+    assert all(owners.count(member) > len(HOSTS) / 6 for member in "abc")
+
+    with pytest.raises(ValueError, match="Empty"):
+        ingress_nginx.ring_lookup(ingress_nginx.hash_ring([]), "a.example.com")
+
+def test_resharding_only_moves_hosts_to_the_new_shard():
+    before = ingress_nginx.assign_hosts(HOSTS, shards=3)
+    after = ingress_nginx.assign_hosts(HOSTS, shards=4)
+
+    moved = [ host for host in HOSTS if before[host] != after[host] ]
+    assert 0 < len(moved) < len(HOSTS) / 2
+    assert { after[host] for host in moved } == { "nginx-default-3" }
+
+def test_dedicated_shards():
+    assignments = ingress_nginx.assign_hosts(HOSTS, shards=3, dedicated={ "app-0.example.com": 2 })
+
+    assert assignments["app-0.example.com"] == "nginx-default-2"
+    assert set(assignments.values()) == { "nginx-default-0", "nginx-default-1", "nginx-default-2" }
+    assert [ host for host, c in assignments.items() if c == "nginx-default-2" ] == [ "app-0.example.com" ]
+
+    with pytest.raises(ValueError, match="out of range"):
+        ingress_nginx.assign_hosts(HOSTS, shards=2, dedicated={ "app-0.example.com": 2 })
+    with pytest.raises(ValueError, match="every shard is dedicated"):
+        ingress_nginx.assign_hosts(HOSTS[:2], shards=1, dedicated={ HOSTS[0]: 0 })
+
+def test_sharded_controllers(pulumi_mocks, run):
+    run(lambda: releases.ingress_nginx_sharded(provider=None, shards=2, shard_overrides={ 1: { "controller_replicas": 4 } }))
+
+    assert { "ingress-nginx-0", "ingress-nginx-1" } <= set(pulumi_mocks.resources)
+    classes = [ pulumi_mocks.resources[f"ingress-nginx-{i}"]["values"]["controller"]["ingressClassResource"]["name"] for i in range(2) ]
+    assert classes == [ "nginx-default-0", "nginx-default-1" ]
+
+    with pytest.raises(ValueError, match="unknown shards"):
+        releases.ingress_nginx_sharded(provider=None, shards=2, shard_overrides={ 2: {} })
+
+def _controller_config(pulumi_mocks, run, **kwargs)->dict:
+    run(lambda: releases.ingress_nginx(provider=None, **kwargs))
+    return pulumi_mocks.resources["ingress-nginx"]["values"]["controller"]["config"]
+
+def test_text_access_log(pulumi_mocks, run):
+    config = _controller_config(pulumi_mocks, run, access_log_skip_paths=[ "/ready" ], access_log_buffer="64k")
+
+    assert config["log-format-upstream"] == ingress_nginx.ACCESS_LOG_FORMATS["text"]
+    assert config["skip-access-log-urls"] == "/healthz,/healthz/,/ready"
+    assert config["access-log-params"] == "buffer=64k flush=5s"
+    assert not { "log-format-escape-json", "disable-access-log", "location-snippet" } & set(config)
+
+def test_json_access_log(pulumi_mocks, run):
+    config = _controller_config(pulumi_mocks, run, access_log_format="json")
+
+    assert config["log-format-upstream"] == ingress_nginx.ACCESS_LOG_FORMATS["json"]
+    assert config["log-format-upstream"].startswith('{"remote_addr": "$remote_addr"')
+    assert config["log-format-escape-json"] is True
+    assert "access-log-params" not in config
+
+def test_sampled_access_log(pulumi_mocks, run):
+    config = _controller_config(pulumi_mocks, run, access_log_sample_rate=0.125, access_log_always_log_status="^5", access_log_buffer="32k")
+
+    assert config["http-snippet"].splitlines() == [
+        "map $status $access_log_status { ~^5 1; default 0; }",
+        "split_clients $request_id $access_log_sample { 12.5% 1; * 0; }",
+        "map $loggable$access_log_status$access_log_sample $access_log_sampled { ~^1(1.|.1)$ 1; default 0; }",
+    ]
+    assert config["location-snippet"] == "access_log /var/log/nginx/access.log upstreaminfo buffer=32k flush=5s if=$access_log_sampled;"
+
+def test_disabled_access_log(pulumi_mocks, run):
+    config = _controller_config(pulumi_mocks, run, access_log_enabled=False, access_log_format="xml")
+
+    assert config["disable-access-log"] is True
+    assert not { "log-format-upstream", "skip-access-log-urls", "http-snippet" } & set(config)
+
+def test_access_log_validation():
+    with pytest.raises(ValueError, match="Unknown access log format"):
+        ingress_nginx.access_log_config(log_format="xml")
+    with pytest.raises(ValueError, match="sample rate"):
+        ingress_nginx.access_log_config(sample_rate=0)
+    with pytest.raises(ValueError, match="sample rate"):
+        ingress_nginx.access_log_config(sample_rate=1.5)
+
+def _service_and_controller(pulumi_mocks, run, **kwargs)->tuple:
+    run(lambda: releases.ingress_nginx(provider=None, **kwargs))
+    controller = pulumi_mocks.resources["ingress-nginx"]["values"]["controller"]
+    return controller["service"]["annotations"], controller
+
+def test_instance_targets(pulumi_mocks, run):
+    annotations, controller = _service_and_controller(pulumi_mocks, run)
+
+    assert annotations["service.beta.kubernetes.io/aws-load-balancer-nlb-target-type"] == "instance"
+    assert annotations["service.beta.kubernetes.io/aws-load-balancer-healthcheck-protocol"] == "tcp"
+    assert "service.beta.kubernetes.io/aws-load-balancer-healthcheck-port" not in annotations
+    assert annotations["service.beta.kubernetes.io/aws-load-balancer-target-group-attributes"] == \
+        "deregistration_delay.timeout_seconds=10,deregistration_delay.connection_termination.enabled=true"
+    # No shutdown grace period, the chart keeps its termination grace period
+    assert "terminationGracePeriodSeconds" not in controller
+    assert "shutdown-grace-period" not in controller.get("extraArgs", {})
+
+def test_ip_targets(pulumi_mocks, run):
+    annotations, controller = _service_and_controller(pulumi_mocks, run, lb_target_type="ip", lb_healthcheck_interval=10)
+
+    assert annotations["service.beta.kubernetes.io/aws-load-balancer-nlb-target-type"] == "ip"
+    assert annotations["service.beta.kubernetes.io/aws-load-balancer-healthcheck-protocol"] == "http"
+    assert annotations["service.beta.kubernetes.io/aws-load-balancer-healthcheck-path"] == "/healthz"
+    assert annotations["service.beta.kubernetes.io/aws-load-balancer-healthcheck-port"] == ingress_nginx.HEALTHCHECK_PORT
+    # Three failed checks ( unhealthy threshold + 1 ) before the NLB stops sending traffic
+    assert annotations["service.beta.kubernetes.io/aws-load-balancer-target-group-attributes"] == \
+        "deregistration_delay.timeout_seconds=30,deregistration_delay.connection_termination.enabled=true"
+    assert controller["extraArgs"]["shutdown-grace-period"] == 30
+    assert controller["terminationGracePeriodSeconds"] == 30 + ingress_nginx.WORKER_SHUTDOWN_TIMEOUT + 60
+
+def test_explicit_shutdown_grace_period(pulumi_mocks, run):
+    annotations, controller = _service_and_controller(pulumi_mocks, run, lb_target_type="ip", controller_shutdown_grace_period=5)
+
+    assert "deregistration_delay.timeout_seconds=10," in annotations["service.beta.kubernetes.io/aws-load-balancer-target-group-attributes"]
+    assert controller["terminationGracePeriodSeconds"] == 5 + ingress_nginx.WORKER_SHUTDOWN_TIMEOUT + 60
+
+def test_load_balancer_target_deregistration_delay():
+    target = ingress_nginx.load_balancer_target(target_type="ip", deregistration_delay=120)
+
+    assert "deregistration_delay.timeout_seconds=120," in target["annotations"]["service.beta.kubernetes.io/aws-load-balancer-target-group-attributes"]
+    assert target["controller"]["extraArgs"] == { "shutdown-grace-period": 15 }
+
+    with pytest.raises(ValueError, match="Unsupported target type"):
+        ingress_nginx.load_balancer_target(target_type="alb")
+
+def _controller(pulumi_mocks, run, **kwargs)->dict:
+    run(lambda: releases.ingress_nginx(provider=None, **kwargs))
+    return pulumi_mocks.resources["ingress-nginx"]["values"]["controller"]
+
+def test_daemonset_controller(pulumi_mocks, run):
+    controller = _controller(pulumi_mocks, run)
+
+    assert controller["kind"] == "DaemonSet"
+    assert not { "replicaCount", "autoscaling", "keda" } & set(controller)
+
+def test_hpa_autoscaling(pulumi_mocks, run):
+    controller = _controller(pulumi_mocks, run, controller_kind="Deployment", autoscaling_enabled=True, autoscaling_min_replicas=3, autoscaling_max_replicas=12)
+
+    assert controller["kind"] == "Deployment"
+    assert controller["minAvailable"] == 1
+    assert controller["autoscaling"] == {
+        "enabled": True,
+        "minReplicas": 3,
+        "maxReplicas": 12,
+        "targetCPUUtilizationPercentage": 70,
+    }
+    assert controller["keda"]["enabled"] is False
+    assert controller["keda"]["triggers"] == []
+    assert [ c["topologyKey"] for c in controller["topologySpreadConstraints"] ] == [ "topology.kubernetes.io/zone", "kubernetes.io/hostname" ]
+
+def test_keda_autoscaling_on_requests_per_second(pulumi_mocks, run):
+    controller = _controller(
+        pulumi_mocks, run,
+        controller_kind="Deployment",
+        autoscaling_enabled=True,
+        autoscaling_target_rps=500,
+        autoscaling_prometheus_url="http://prometheus:9090",
+    )
+
+    assert controller["autoscaling"]["enabled"] is False
+    assert controller["keda"]["enabled"] is True
+    cpu, rps = controller["keda"]["triggers"]
+    assert cpu["metadata"] == { "value": "70" }
+    assert rps["metadata"]["serverAddress"] == "http://prometheus:9090"
+    assert rps["metadata"]["threshold"] == "500"
+    assert 'controller_class="k8s.io/ingress-nginx-default"' in rps["metadata"]["query"]
+
+def test_controller_scaling_validation():
+    scaling = lambda **kwargs: ingress_nginx.controller_scaling(release_name="ingress-nginx", ingress_class_controller="k8s.io/ingress-nginx-default", **kwargs)
+
+    with pytest.raises(ValueError, match="Unsupported controller kind"):
+        scaling(kind="StatefulSet")
+    with pytest.raises(ValueError, match="requires the Deployment"):
+        scaling(autoscaling_enabled=True)
+    with pytest.raises(ValueError, match="above max replicas"):
+        scaling(kind="Deployment", autoscaling_enabled=True, autoscaling_min_replicas=5, autoscaling_max_replicas=2)
+    with pytest.raises(ValueError, match="autoscaling_prometheus_url"):
+        scaling(kind="Deployment", autoscaling_enabled=True, autoscaling_target_rps=100)
+
+def test_performance_profile_reaches_the_controller(pulumi_mocks, run):
+    controller = _controller(pulumi_mocks, run, performance_profile="high-throughput")
+
+    profile = ingress_nginx.PERFORMANCE_PROFILES["high-throughput"]
+    assert profile["config"].items() <= controller["config"].items()
+    assert controller["resources"] == profile["resources"]
+
+def test_default_profile_keeps_the_chart_defaults(pulumi_mocks, run):
+    controller = _controller(pulumi_mocks, run)
+
+    assert "max-worker-connections" not in controller["config"]
+    assert controller["resources"] == {}
+
+def test_explicit_config_and_resources_override_the_profile(pulumi_mocks, run):
+    controller = _controller(
+        pulumi_mocks, run,
+        performance_profile="low-latency",
+        controller_config={ "keep-alive": "30", "use-gzip": "false" },
+        controller_resources={ "requests": { "cpu": "4" } },
+    )
+
+    assert controller["config"]["keep-alive"] == "30"
+    assert controller["config"]["use-gzip"] == "false"
+    assert controller["config"]["ssl-buffer-size"] == "4k"
+    assert controller["resources"] == { "requests": { "cpu": "4" } }
+
+def test_custom_performance_profile():
+    profile = ingress_nginx.performance_profile({ "config": { "worker-processes": "4" } })
+
+    assert profile == { "config": { "worker-processes": "4" }, "resources": {} }
+    with pytest.raises(ValueError, match="Unknown performance profile keys"):
+        ingress_nginx.performance_profile({ "limits": {} })
+    with pytest.raises(ValueError, match="Unknown performance profile"):
+        ingress_nginx.performance_profile("fast")
@@ -0,0 +1,71 @@
+import pytest
+
+from python_pulumi_helm import releases
+from python_pulumi_helm.helpers import karpenter
+
+def _provisioner(**kwargs):
+    return karpenter.provisioner(**{
+        "name": "app",
+        "labels": { "karpenter": "enabled", "app": "app" },
+        "instance_category": [ "t" ],
+        "instance_arch": [ "arm64" ],
+        "instance_capacity_type": [ "on-demand" ],
+        **kwargs,
+    })
+
+def test_provisioner_metadata_labels():
+    assert _provisioner()["metadata"]["labels"] == { "karpenter": "enabled", "app": "app" }
+
+    provisioner = _provisioner(metadata_labels={ "app": "app" })
+    assert provisioner["metadata"]["labels"] == { "app": "app" }
+    assert provisioner["spec"]["labels"] == { "karpenter": "enabled", "app": "app" }
+
+def test_factory_provisioners_keep_their_metadata(pulumi_mocks, run):
+    run(lambda: releases.opensearch(
+        provider=None,
+        ingress_domain="example.com",
+        ingress_class_name="nginx",
+        storage_class_name="ebs",
+        karpenter_node_enabled=True,
+    ))
+
+    provisioner = pulumi_mocks.resources["opensearch"]["values"]["extraObjects"][0]
+    assert provisioner["metadata"] == { "labels": { "app": "opensearch" }, "name": "opensearch" }
+    assert provisioner["spec"]["labels"] == { "karpenter": "enabled", "app": "opensearch" }
+
+def test_identical_specs_share_one_object():
+    assert _provisioner() is _provisioner()
+    assert karpenter.affinity({ "app": "a" }, { "app": "nodes" }) is karpenter.affinity({ "app": "a" }, { "app": "nodes" })
+
+def test_v1alpha5_provisioner():
+    provisioner = _provisioner(ttl_seconds_after_empty=30, provider_name="nodes")
+
+    assert provisioner["kind"] == "Provisioner"
+    assert provisioner["spec"]["providerRef"] == { "name": "nodes" }
+    assert provisioner["spec"]["ttlSecondsAfterEmpty"] == 30
+    assert "ttlSecondsUntilExpired" not in provisioner["spec"]
+    assert { "key": "kubernetes.io/arch", "operator": "In", "values": [ "arm64" ] } in provisioner["spec"]["requirements"]
+
+def test_v1beta1_node_pool():
+    node_pool = _provisioner(api_version="v1beta1", consolidation=False, ttl_seconds_after_empty=60)
+
+    assert node_pool["apiVersion"] == "karpenter.sh/v1beta1"
+    assert node_pool["kind"] == "NodePool"
+    assert node_pool["spec"]["template"]["metadata"]["labels"] == { "karpenter": "enabled", "app": "app" }
+    assert node_pool["spec"]["disruption"] == {
+        "consolidationPolicy": "WhenEmpty",
+        "expireAfter": "720h",
+        "consolidateAfter": "60s",
+    }
+
+def test_unsupported_api_version():
+    with pytest.raises(ValueError, match="v1"):
+        _provisioner(api_version="v1")
+
+def test_affinity():
+    pod_only = karpenter.affinity({ "app": "a" })
+    assert list(pod_only) == [ "podAntiAffinity" ]
+
+    with_nodes = karpenter.affinity({ "app": "a" }, { "app": "nodes" })
+    terms = with_nodes["nodeAffinity"]["requiredDuringSchedulingIgnoredDuringExecution"]["nodeSelectorTerms"]
+    assert terms == [ { "matchExpressions": [ { "key": "app", "operator": "In", "values": [ "nodes" ] } ] } ]
@@ -0,0 +1,43 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import python_pulumi_helm
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def _run(code: str)->dict:
+    output = subprocess.run([ sys.executable, "-c", code ], cwd=ROOT, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+def test_import_does_not_load_the_sdk():
+    loaded = _run("""
+import json, sys
+import python_pulumi_helm
+print(json.dumps({ "pulumi": "pulumi" in sys.modules, "yaml": "yaml" in sys.modules, "releases": "python_pulumi_helm.releases" in sys.modules }))
+""")
+
+    assert loaded == { "pulumi": False, "yaml": False, "releases": False }
+
+def test_lazy_attributes_resolve():
+    loaded = _run("""
+import json, sys
+import python_pulumi_helm
+factory = python_pulumi_helm.opensearch
+print(json.dumps({ "factory": factory.__module__, "pulumi": "pulumi" in sys.modules }))
+""")
+
+    # The SDK is only imported when a release is created
+    assert loaded == { "factory": "python_pulumi_helm.releases", "pulumi": False }
+
+@pytest.mark.parametrize("name", sorted(python_pulumi_helm._LAZY_ATTRIBUTES) + list(python_pulumi_helm._LAZY_MODULES))
+def test_every_lazy_name_resolves(name):
+    assert getattr(python_pulumi_helm, name) is not None
+    assert name in dir(python_pulumi_helm)
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError, match="no attribute 'nginx'"):
+        python_pulumi_helm.nginx
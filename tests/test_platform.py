@@ -0,0 +1,103 @@
+import pulumi
+import pytest
+
+from python_pulumi_helm import platform
+from python_pulumi_helm.platform import Platform
+
+SPEC = """
+defaults:
+  eks_cluster_name: main
+  eks_sa_role_arn: arn:aws:iam::000000000000:role/addon
+addons:
+  cilium: {}
+  metrics_server: {}
+  aws_ebs_csi_driver: {}
+  opensearch:
+    ingress_domain: example.com
+    ingress_class_name: nginx
+    storage_class_name: ebs
+    karpenter_node_enabled: false
+"""
+
+def test_dependency_graph_is_minimal():
+    graph = platform.dependency_graph(platform.load_spec(SPEC))
+
+    assert graph == {
+        "cilium": set(),
+        "metrics_server": { "cilium" },
+        "aws_ebs_csi_driver": { "cilium" },
+        # cilium is implied by aws_ebs_csi_driver
+        "opensearch": { "aws_ebs_csi_driver" },
+    }
+
+def test_disabled_addons_and_explicit_edges():
+    spec = platform.load_spec({
+        "addons": {
+            "cilium": {},
+            "metrics_server": { "depends_on": [ "cluster_autoscaler" ] },
+            "cluster_autoscaler": { "enabled": False },
+        },
+    })
+
+    with pytest.raises(ValueError, match="not an enabled addon"):
+        platform.dependency_graph(spec)
+
+def test_unknown_factory():
+    with pytest.raises(ValueError, match="Unknown factory"):
+        platform.load_spec({ "addons": { "web": { "factory": "nginx" } } })
+
+def test_spec_defaults_only_reach_factories_accepting_them():
+    spec = platform.load_spec(SPEC)
+
+    assert platform.addon_arguments(spec, "cilium") == { "eks_cluster_name": "main" }
+    assert "eks_cluster_name" not in platform.addon_arguments(spec, "metrics_server")
+
+def test_platform_is_a_component_parenting_its_releases(pulumi_mocks, run):
+    urns = []
+
+    def program():
+        bundle = Platform(None, SPEC, name="main")
+        bundle["opensearch"].urn.apply(urns.append)
+        return bundle
+
+    bundle = run(program)
+
+    assert isinstance(bundle, pulumi.ComponentResource)
+    assert set(bundle.releases) == { "cilium", "metrics_server", "aws_ebs_csi_driver", "opensearch" }
+    assert "python-pulumi-helm:index:Platform$kubernetes:helm.sh/v3:Release::opensearch" in urns[0]
+
+def test_platform_as_a_dependency(pulumi_mocks, run):
+    def program():
+        bundle = Platform(None, { "addons": { "cilium": { "eks_cluster_name": "main" } } })
+        return pulumi.CustomResource("test:index:Resource", "after", opts=pulumi.ResourceOptions(depends_on=[ bundle ]))
+
+    run(program)
+
+    assert "after" in pulumi_mocks.resources
+
+def test_deferred_addon_with_a_conditional_dependency(pulumi_mocks, run):
+    spec = """
+defaults:
+  eks_cluster_name: main
+  eks_sa_role_arn: arn:aws:iam::000000000000:role/addon
+  default_instance_profile_name: nodes
+  eks_cluster_endpoint: https://main.eks.amazonaws.com
+  karpenter_node_enabled: true
+addons:
+  cilium: {}
+  karpenter: {}
+  aws_ebs_csi_driver: {}
+  opensearch:
+    ingress_domain: example.com
+    ingress_class_name: nginx
+    storage_class_name: ebs
+    await:
+      mode: deferred
+      workloads: [StatefulSet/opensearch-cluster-master]
+"""
+    assert platform.dependency_graph(platform.load_spec(spec))["opensearch"] == { "karpenter", "aws_ebs_csi_driver" }
+
+    bundle = run(lambda: Platform(None, spec))
+
+    assert len(bundle.readiness_checks) == 1
+    assert "opensearch-ready-statefulset-opensearch-cluster-master" in pulumi_mocks.resources
@@ -0,0 +1,62 @@
+import pytest
+
+from python_pulumi_helm import releases
+from python_pulumi_helm.helpers import cache, prefetch, resources
+from conftest import write_repo
+
+# Unreachable origin repositories, any request to them fails the test
+ORIGIN = "http://127.0.0.1:9/charts"
+OTHER_ORIGIN = "http://127.0.0.1:9/other-charts"
+
+def test_default_charts_include_side_releases():
+    charts = prefetch.default_charts()
+
+    assert releases.MEMCACHED_CHART in charts
+    assert releases.PROMTAIL_CHART in charts
+    assert ("https://helm.cilium.io", "cilium", "1.14.1") in charts
+    assert len(charts) == len(set(charts))
+
+def test_prefetch_from_local_repository(tmp_path, repo):
+    repo_dir, digests = repo
+    charts = [ (repo_dir, "app", "1.0.0"), (repo_dir, "app", "1.1.0"), (repo_dir, "db", "2.0.0") ]
+
+    paths = prefetch.prefetch(str(tmp_path / "cache"), charts=charts, max_workers=2)
+
+    assert set(paths) == set(charts)
+    for repo_dir, chart, version in charts:
+        assert cache.file_digest(paths[(repo_dir, chart, version)]) == digests[(chart, version)]
+
+def test_mirror_keeps_origin_repository_as_cache_key(tmp_path, repo):
+    mirror, _ = repo
+    cache_dir = str(tmp_path / "cache")
+
+    paths = prefetch.prefetch(cache_dir, charts=[ (ORIGIN, "app", "1.0.0") ], mirror=mirror)
+
+    # Releases look the archive up with the factory repository, without reaching it
+    assert resources.cached_chart_path(ORIGIN, "app", "1.0.0", cache_dir) == resources.stable_chart_path(paths[(ORIGIN, "app", "1.0.0")])
+    assert cache.lookup(cache_dir, mirror, "app", "1.0.0") == ""
+
+def test_same_chart_in_two_repositories(tmp_path, repo):
+    mirror, _ = repo
+    charts = [ (ORIGIN, "app", "1.0.0"), (OTHER_ORIGIN, "app", "1.0.0") ]
+
+    paths = prefetch.prefetch(str(tmp_path / "cache"), charts=charts, mirror=mirror)
+
+    assert set(paths) == set(charts)
+
+def test_prefetch_reports_every_failure(tmp_path, repo):
+    repo_dir, _ = repo
+    write_repo(tmp_path / "other", [ ("db", "3.0.0") ])
+    charts = [ (repo_dir, "app", "9.9.9"), (repo_dir, "app", "1.0.0"), (str(tmp_path / "other"), "db", "2.0.0") ]
+
+    with pytest.raises(cache.ChartCacheError) as error:
+        prefetch.prefetch(str(tmp_path / "cache"), charts=charts)
+
+    assert "app 9.9.9" in str(error.value)
+    assert "db 2.0.0" in str(error.value)
+    assert cache.lookup(str(tmp_path / "cache"), repo_dir, "app", "1.0.0") != ""
+
+def test_prefetch_requires_a_cache_directory(monkeypatch):
+    monkeypatch.delenv(cache.CACHE_DIR_ENV, raising=False)
+    with pytest.raises(cache.ChartCacheError, match=cache.CACHE_DIR_ENV):
+        prefetch.prefetch(charts=[])
@@ -0,0 +1,81 @@
+import pytest
+
+from python_pulumi_helm import releases
+from python_pulumi_helm.helpers import prometheus
+
+def _prometheus_stack(**kwargs):
+    return releases.prometheus_stack(**{
+        "provider": None,
+        "aws_region": "eu-west-1",
+        "ingress_domain": "example.com",
+        "ingress_class_name": "nginx",
+        **kwargs,
+    })
+
+def test_duration_seconds():
+    assert prometheus.duration_seconds("15s") == 15
+    assert prometheus.duration_seconds("2w") == 1209600
+
+    with pytest.raises(ValueError, match="Unsupported duration"):
+        prometheus.duration_seconds("1h30m")
+
+def test_sizing_shards_and_resources():
+    sizing = prometheus.sizing(expected_series=5_000_000)
+
+    assert sizing["shards"] == 3
+    assert sizing["resources"]["requests"] == { "cpu": "1667m", "memory": "13021Mi" }
+    assert prometheus.sizing(expected_series=5_000_000, shards=5)["shards"] == 5
+
+def test_agents_need_less_memory_and_storage():
+    server = prometheus.sizing(expected_series=1_000_000)
+    agent = prometheus.sizing(expected_series=1_000_000, mode="agent")
+
+    assert agent["resources"]["requests"]["memory"] < server["resources"]["requests"]["memory"]
+    assert agent["storage"] == "10Gi"
+
+def test_sizing_follows_the_scrape_interval():
+    every_15s = prometheus.sizing(expected_series=10_000_000, scrape_interval="15s")
+    every_60s = prometheus.sizing(expected_series=10_000_000, scrape_interval="60s")
+
+    assert int(every_15s["storage"][:-2]) > 3 * int(every_60s["storage"][:-2])
+    assert every_15s["queue_config"]["maxShards"] > every_60s["queue_config"]["maxShards"]
+
+def test_configured_scrape_interval_is_used_for_sizing(pulumi_mocks, run):
+    run(lambda: _prometheus_stack(prometheus_expected_series=10_000_000, prometheus_shards=0, prometheus_scrape_interval="60s", prometheus_scrape_timeout="30s"))
+
+    spec = pulumi_mocks.resources["kube-prometheus-stack"]["values"]["prometheus"]["prometheusSpec"]
+    sizing = prometheus.sizing(expected_series=10_000_000, scrape_interval="60s")
+    assert (spec["scrapeInterval"], spec["scrapeTimeout"]) == ("60s", "30s")
+    assert spec["storageSpec"]["volumeClaimTemplate"]["spec"]["resources"]["requests"]["storage"] == sizing["storage"]
+    assert spec["shards"] == sizing["shards"]
+
+def test_scrape_timeout_longer_than_the_interval():
+    with pytest.raises(ValueError, match="Scrape timeout"):
+        _prometheus_stack(prometheus_scrape_interval="10s")
+
+def test_explicit_resources_and_storage_win_over_the_sizing(pulumi_mocks, run):
+    run(lambda: _prometheus_stack(
+        prometheus_expected_series=10_000_000,
+        prometheus_shards=0,
+        resources_prometheus={ "requests": { "cpu": "4" } },
+    ))
+
+    spec = pulumi_mocks.resources["kube-prometheus-stack"]["values"]["prometheus"]["prometheusSpec"]
+    sizing = prometheus.sizing(expected_series=10_000_000)
+    assert spec["resources"] == { "requests": { "cpu": "4" } }
+    # Settings not given explicitly still come from the sizing
+    assert spec["storageSpec"]["volumeClaimTemplate"]["spec"]["resources"]["requests"]["storage"] == sizing["storage"]
+    assert spec["shards"] == sizing["shards"]
+
+def test_explicit_storage_size(pulumi_mocks, run):
+    run(lambda: _prometheus_stack(prometheus_expected_series=10_000_000, prometheus_storage_size="1Ti"))
+
+    spec = pulumi_mocks.resources["kube-prometheus-stack"]["values"]["prometheus"]["prometheusSpec"]
+    assert spec["storageSpec"]["volumeClaimTemplate"]["spec"]["resources"]["requests"]["storage"] == "1Ti"
+
+def test_default_resources_and_storage(pulumi_mocks, run):
+    run(lambda: _prometheus_stack())
+
+    spec = pulumi_mocks.resources["kube-prometheus-stack"]["values"]["prometheus"]["prometheusSpec"]
+    assert spec["resources"] == prometheus.SIZING_DEFAULTS["resources"]
+    assert spec["storageSpec"]["volumeClaimTemplate"]["spec"]["resources"]["requests"]["storage"] == "20Gi"
@@ -0,0 +1,51 @@
+import pulumi
+import pytest
+
+from python_pulumi_helm import releases
+from python_pulumi_helm.helpers import resources
+
+@pytest.mark.parametrize("chart", sorted(resources.TOPOLOGY_SERVICE_PATHS))
+def test_topology_annotations_at_every_chart_path(chart):
+    values = resources.topology_aware_values(chart, {})
+
+    for path in resources.TOPOLOGY_SERVICE_PATHS[chart]:
+        annotations = values
+        for key in path:
+            annotations = annotations[key]
+        assert annotations == resources.TOPOLOGY_ANNOTATIONS
+
+def test_existing_annotations_are_kept_and_values_copied():
+    values = { "controller": { "service": { "annotations": { "a": "b" } }, "kind": "DaemonSet" } }
+
+    updated = resources.topology_aware_values("ingress-nginx", values)
+
+    assert updated["controller"]["service"]["annotations"] == { "a": "b", **resources.TOPOLOGY_ANNOTATIONS }
+    assert updated["controller"]["kind"] == "DaemonSet"
+    assert values["controller"]["service"]["annotations"] == { "a": "b" }
+
+def test_explicit_paths():
+    values = resources.topology_aware_values("custom", {}, paths=[ ("api", "service", "annotations") ])
+    assert values == { "api": { "service": { "annotations": resources.TOPOLOGY_ANNOTATIONS } } }
+
+def test_unknown_chart_warns_and_keeps_the_values(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(pulumi.log, "warn", lambda message, *args, **kwargs: warnings.append(message))
+    values = { "service": {} }
+
+    assert resources.topology_aware_values("grafana", values) is values
+    assert len(warnings) == 1
+    assert "grafana" in warnings[0]
+
+def test_factories_enable_topology_aware_routing(pulumi_mocks, run):
+    run(lambda: releases.ingress_nginx(provider=None, global_rate_limit_enabled=True, topology_aware_routing=True))
+
+    controller_annotations = pulumi_mocks.resources["ingress-nginx"]["values"]["controller"]["service"]["annotations"]
+    assert resources.TOPOLOGY_ANNOTATIONS.items() <= controller_annotations.items()
+    assert "service.beta.kubernetes.io/aws-load-balancer-type" in controller_annotations
+    assert pulumi_mocks.resources["mc-ingress-nginx"]["values"]["service"]["annotations"] == resources.TOPOLOGY_ANNOTATIONS
+
+def test_topology_aware_routing_is_off_by_default(pulumi_mocks, run):
+    run(lambda: releases.ingress_nginx(provider=None))
+
+    annotations = pulumi_mocks.resources["ingress-nginx"]["values"]["controller"]["service"]["annotations"]
+    assert "service.kubernetes.io/topology-mode" not in annotations
@@ -0,0 +1,20 @@
+import yaml
+
+from python_pulumi_helm.helpers import serialization
+from python_pulumi_helm.helpers.values import freeze
+
+def test_same_output_as_yaml_dump():
+    data = { "type": "S3", "config": { "bucket": "b", "endpoint": "s3.eu-west-1.amazonaws.com", "insecure": False }, "list": [ 1, "a" ] }
+
+    assert serialization.dump_yaml(data) == yaml.dump(data, default_flow_style=False)
+
+def test_frozen_trees_are_dumped_as_plain_yaml():
+    data = { "affinity": { "labels": [ "a", "b" ] } }
+
+    assert serialization.dump_yaml(freeze(data)) == yaml.dump(data, default_flow_style=False)
+
+def test_identical_fragments_share_one_string():
+    first = serialization.dump_yaml({ "a": [ 1, 2 ] })
+
+    assert serialization.dump_yaml({ "a": [ 1, 2 ] }) is first
+    assert serialization.dump_yaml({ "a": [ 1, True ] }) != first
@@ -0,0 +1,153 @@
+import pytest
+import yaml
+
+from python_pulumi_helm import releases
+from python_pulumi_helm.helpers import resources, thanos
+
+def _thanos_stack(**kwargs):
+    return releases.thanos_stack(**{
+        "provider": None,
+        "aws_region": "eu-west-1",
+        "ingress_domain": "example.com",
+        "ingress_class_name": "nginx",
+        "storage_class_name": "ebs",
+        "obj_storage_bucket": "metrics",
+        **kwargs,
+    })
+
+def test_response_cache_config():
+    assert thanos.response_cache_config("none") == {}
+    assert thanos.response_cache_config("in-memory", size_mb=128)["config"]["max_size"] == "128MB"
+
+    memcached = thanos.response_cache_config("memcached", memcached_addresses=[ "dnssrv+_memcache._tcp.mc" ])
+    assert memcached["type"] == "MEMCACHED"
+    assert memcached["config"]["addresses"] == [ "dnssrv+_memcache._tcp.mc" ]
+
+def test_disabled_query_frontend_renders_no_settings(pulumi_mocks, run):
+    run(lambda: _thanos_stack())
+
+    query_frontend = pulumi_mocks.resources["thanos"]["values"]["queryFrontend"]
+    assert query_frontend["enabled"] is False
+    assert not { "replicaCount", "resources", "affinity", "extraFlags", "config" } & set(query_frontend)
+
+def test_enabled_query_frontend(pulumi_mocks, run):
+    run(lambda: _thanos_stack(query_frontend_enabled=True, query_frontend_replicas=3, query_frontend_cache_size_mb=256))
+
+    query_frontend = pulumi_mocks.resources["thanos"]["values"]["queryFrontend"]
+    assert query_frontend["enabled"] is True
+    assert query_frontend["replicaCount"] == 3
+    assert query_frontend["resources"]["requests"]["memory"] == "512Mi"
+    assert "--query-range.split-interval=24h" in query_frontend["extraFlags"]
+    assert yaml.safe_load(query_frontend["config"])["type"] == "IN-MEMORY"
+
+def test_memcached_results_cache_is_installed_first(pulumi_mocks, run):
+    def program():
+        with resources.record_releases() as records:
+            _thanos_stack(query_frontend_enabled=True, query_frontend_cache="memcached")
+        return records
+
+    records = { r["name"]: r for r in run(program) }
+
+    assert records["thanos"]["depends_on"] == [ records["mc-thanos-query-frontend"]["release"] ]
+    config = yaml.safe_load(pulumi_mocks.resources["thanos"]["values"]["queryFrontend"]["config"])
+    assert config["config"]["addresses"] == [ "dnssrv+_memcache._tcp.mc-thanos-query-frontend.default.svc.cluster.local" ]
+
+def test_no_misspelled_replica_counts(pulumi_mocks, run):
+    run(lambda: _thanos_stack())
+
+    values = pulumi_mocks.resources["thanos"]["values"]
+    assert "recplicaCount" not in values["queryFrontend"]
+    assert values["bucketweb"]["replicaCount"] == 1
+    assert "recplicaCount" not in values["bucketweb"]
+
+def test_store_gateway_cache_configs():
+    assert thanos.index_cache_config("none") == {}
+    assert thanos.index_cache_config("in-memory", size_mb=100)["config"] == { "max_size": "100MB", "max_item_size": "50MB" }
+    assert thanos.bucket_cache_config("in-memory", size_mb=256)["config"]["max_size"] == "256MB"
+
+    with pytest.raises(ValueError):
+        thanos.index_cache_config("memcached")
+
+def test_store_gateway_memcached_caches(pulumi_mocks, run):
+    run(lambda: _thanos_stack(storegateway_index_cache="memcached", storegateway_chunk_cache="in-memory"))
+
+    assert "mc-thanos-index" in pulumi_mocks.resources
+    assert "mc-thanos-chunks" not in pulumi_mocks.resources
+
+    storegateway = pulumi_mocks.resources["thanos"]["values"]["storegateway"]
+    assert yaml.safe_load(storegateway["config"])["type"] == "MEMCACHED"
+    assert storegateway["extraFlags"][0].startswith("--store.caching-bucket.config=")
+
+def test_store_gateway_caches_are_installed_first(pulumi_mocks, run):
+    def program():
+        with resources.record_releases() as records:
+            _thanos_stack(storegateway_index_cache="memcached", storegateway_chunk_cache="memcached")
+        return records
+
+    records = { r["name"]: r for r in run(program) }
+
+    assert records["thanos"]["depends_on"] == [ records["mc-thanos-index"]["release"], records["mc-thanos-chunks"]["release"] ]
+
+def test_store_gateway_shards():
+    assert thanos.storegateway_shards() == 1
+    assert thanos.storegateway_shards(hash_shards=3, time_partitions=[ { "max": "-2w" }, { "min": "-2w" } ]) == 6
+    assert thanos.storegateway_endpoints("thanos", "monitoring", shards=2) == [
+        "thanos-storegateway-0.monitoring.svc.cluster.local:10901",
+        "thanos-storegateway-1.monitoring.svc.cluster.local:10901",
+    ]
+
+def test_compactor_storage_class_is_opt_in(pulumi_mocks, run):
+    run(lambda: _thanos_stack(compactor_enabled=True))
+    assert "storageClass" not in pulumi_mocks.resources["thanos"]["values"]["compactor"]["persistence"]
+
+def test_compactor_storage_class(pulumi_mocks, run):
+    run(lambda: _thanos_stack(compactor_enabled=True, compactor_storage_class_name="gp3"))
+    assert pulumi_mocks.resources["thanos"]["values"]["compactor"]["persistence"]["storageClass"] == "gp3"
+
+def test_sharded_compactors(pulumi_mocks, run):
+    run(lambda: _thanos_stack(compactor_enabled=True, compactor_shards=3, compactor_concurrency=2))
+
+    assert { "thanos-compactor-1", "thanos-compactor-2" } <= set(pulumi_mocks.resources)
+    assert "thanos-compactor-0" not in pulumi_mocks.resources
+
+    selectors = []
+    for values in [ pulumi_mocks.resources[name]["values"] for name in ("thanos", "thanos-compactor-1", "thanos-compactor-2") ]:
+        flags = values["compactor"]["extraFlags"]
+        assert "--compact.concurrency=2" in flags
+        selectors.append(yaml.safe_load(flags[-1].partition("=")[2]))
+
+    assert [ selector[1]["regex"] for selector in selectors ] == [ "0", "1", "2" ]
+    assert selectors[0][0] == {
+        "action": "hashmod",
+        "source_labels": [ "env", "prometheus_instance", "prometheus_replica" ],
+        "modulus": 3,
+        "target_label": "shard",
+    }
+    assert pulumi_mocks.resources["thanos-compactor-1"]["values"]["storegateway"] == { "enabled": False }
+
+def test_static_store_discovery_by_default(pulumi_mocks, run):
+    run(lambda: _thanos_stack(name_override="thanos-stack", namespace="prometheus"))
+
+    assert pulumi_mocks.resources["thanos"]["values"]["query"]["stores"] == [
+        # The headless discovery service resolves to the sidecar pods, which serve gRPC on 10902
+        "prom-stack-thanos-discovery.prometheus.svc.cluster.local:10902",
+        "thanos-stack-storegateway.prometheus.svc.cluster.local:10901",
+    ]
+
+def test_dnssrv_store_discovery(pulumi_mocks, run):
+    run(lambda: _thanos_stack(store_discovery="dnssrv", storegateway_hash_shards=2))
+
+    assert pulumi_mocks.resources["thanos"]["values"]["query"]["stores"] == [
+        "dnssrv+_grpc._tcp.prom-stack-thanos-discovery.prometheus.svc.cluster.local",
+        "dnssrv+_grpc._tcp.thanos-storegateway-0.default.svc.cluster.local",
+        "dnssrv+_grpc._tcp.thanos-storegateway-1.default.svc.cluster.local",
+    ]
+
+    with pytest.raises(ValueError, match="Unknown store discovery"):
+        thanos.sidecar_endpoint("prom-stack", "prometheus", "dns")
+
+def test_sidecar_endpoint_from_the_prometheus_release_name():
+    assert thanos.prometheus_fullname("prometheus") == "prometheus-kube-prometheus"
+    assert thanos.prometheus_fullname("kube-prometheus-stack") == "kube-prometheus-stack"
+    assert thanos.prometheus_fullname("prometheus", "prom-stack") == "prom-stack"
+    assert thanos.sidecar_endpoint("prom-stack", "prometheus") == "prom-stack-thanos-discovery.prometheus.svc.cluster.local:10902"
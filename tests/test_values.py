@@ -0,0 +1,79 @@
+import copy
+
+import pytest
+
+from python_pulumi_helm.helpers.values import FrozenDict, FrozenList, assoc_in, freeze, memoize, structural_key, thaw, update_in
+
+def test_freeze_is_deep_and_thaw_copies():
+    tree = freeze({ "a": { "b": [ 1, { "c": 2 } ] } })
+
+    assert isinstance(tree["a"], FrozenDict)
+    assert isinstance(tree["a"]["b"], FrozenList)
+    with pytest.raises(TypeError):
+        tree["a"]["b"][1]["c"] = 3
+    with pytest.raises(TypeError):
+        tree["a"]["b"].append(3)
+
+    mutable = thaw(tree)
+    mutable["a"]["b"].append(3)
+    assert type(mutable["a"]) is dict
+    assert tree == { "a": { "b": [ 1, { "c": 2 } ] } }
+
+def test_frozen_trees_are_not_copied():
+    tree = freeze({ "a": [ 1 ] })
+    assert copy.deepcopy(tree) is tree
+
+def test_structural_key_distinguishes_types():
+    assert structural_key({ "a": 1 }) == structural_key({ "a": 1 })
+    assert structural_key({ "a": 1 }) != structural_key({ "a": True })
+    assert structural_key([ 1 ]) != structural_key({ 1: None })
+
+def test_memoize_shares_identical_calls():
+    calls = []
+
+    @memoize()
+    def build(labels: dict, replicas: int = 1):
+        calls.append(labels)
+        return { "labels": labels, "replicas": replicas }
+
+    first = build({ "app": "a" }, replicas=2)
+    second = build({ "app": "a" }, replicas=2)
+
+    assert first is second
+    assert len(calls) == 1
+    assert build({ "app": "b" }, replicas=2) is not first
+    assert build.cache_info()["hits"] == 1
+
+def test_memoize_evicts_least_recently_used():
+    @memoize(maxsize=2)
+    def build(n: int):
+        return { "n": n }
+
+    one = build(1)
+    build(2)
+    build(1)
+    build(3)
+
+    assert build.cache_info()["currsize"] == 2
+    assert build(1) is one
+    assert build.cache_info()["misses"] == 3
+
+def test_memoize_bypasses_unhashable_arguments():
+    class Unhashable:
+        __hash__ = None
+
+    @memoize()
+    def build(value):
+        return { "value": [ 1 ] }
+
+    assert build(Unhashable()) is not build(Unhashable())
+    assert build.cache_info()["currsize"] == 0
+
+def test_update_in_keeps_untouched_branches():
+    tree = freeze({ "a": { "b": 1 }, "c": { "d": 2 } })
+    updated = update_in(tree, ("a", "b"), lambda b: b + 1)
+
+    assert updated == { "a": { "b": 2 }, "c": { "d": 2 } }
+    assert updated["c"] is tree["c"]
+    assert tree["a"]["b"] == 1
+    assert assoc_in({}, ("x", "y"), 3) == { "x": { "y": 3 } }